@@ -1 +1,6 @@
-from .llms import load_llm as load_llm
\ No newline at end of file
+def __getattr__(name):
+    # Imported on first use, so importing the package (e.g. by pytest for backend/tests) does not load the provider SDKs
+    if name == "load_llm":
+        from .llms import load_llm
+        return load_llm
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
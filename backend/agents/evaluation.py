@@ -8,16 +8,17 @@ from agents.utils.messages import _extract_xml_tags_from_text
 
 from agents.utils.images import _multimodal_message
 from agents.utils.messages import return_messages
+from agents.utils.caching import add_cache_breakpoints, cacheable_tools, record_cache_usage
 
 
 async def call_evaluation(load_llm, specialists, pruning_func, state: AgentState):
-	llm = load_llm(state["metadata"], disable_streaming=False)
+	llm = load_llm(state["metadata"], priority="evaluation", disable_streaming=False)
 	specialists_by_name = {specialist.name: specialist for specialist in specialists}
 
 	task = _extract_task_from_message(state["messages"])
 	specialist = task["specialist"]
 
-	model = llm.bind_tools(specialists_by_name[specialist].tools)
+	model = llm.bind_tools(cacheable_tools(specialists_by_name[specialist].tools))
 
 	eval_type = state["next"].split(":")[1]
 	assert eval_type in ["task_eval", "visual_eval", "tool_eval"], f"Invalid evaluation type: {eval_type}"
@@ -53,7 +54,8 @@ async def tool_evaluation(model, input_messages):
 	system_message = HumanMessage(content=tool_eval_prompt.invoke({}).messages[0].content)
 
 	tags = ["node_evaluation_specialist", "tool_eval"]
-	response = await model.ainvoke( [*input_messages, system_message], config={"tags": tags} )
+	response = await model.ainvoke( add_cache_breakpoints([*input_messages, system_message]), config={"tags": tags} )
+	record_cache_usage(response, "tool_eval")
 	response.tags = tags
 	
 	response.tool_calls = []
@@ -65,6 +67,7 @@ async def visual_evaluation(model, input_messages):
 
 	tags = ["node_evaluation_specialist", "visual_eval"]
 	response = await model.ainvoke( [input_messages[0], _multimodal_message(input_messages[-1]), system_message], config={"tags": tags} )
+	record_cache_usage(response, "visual_eval")
 	response.tags = tags
 
 	response.tool_calls = []
@@ -77,7 +80,8 @@ async def task_evaluation(model, input_messages):
 	system_message = HumanMessage(content=task_eval_prompt.invoke({}).messages[0].content)
 	
 	tags = ["node_evaluation_specialist", "task_eval"]
-	response = await model.ainvoke( [*input_messages, system_message], config={"tags": tags} )
+	response = await model.ainvoke( add_cache_breakpoints([*input_messages, system_message]), config={"tags": tags} )
+	record_cache_usage(response, "task_eval")
 	response.tags = tags
 
 	response.tool_calls = []
@@ -10,12 +10,13 @@ from agents.utils.messages import _extract_task_from_message, _extract_workflows
 from agents.utils.messages import _remove_xml_tags_from_messages, _extract_xml_tags_from_text
 
 from agents.utils.messages import return_messages
+from agents.utils.caching import add_cache_breakpoints, cacheable_tools, record_cache_usage
 
 
 def call_research_manager(load_llm, tools, pruning_func, state: AgentState):
 	profile = {"current": "research_manager", "name": "call_research_manager"}
 	try:
-		llm = load_llm(state["metadata"], disable_streaming=False)
+		llm = load_llm(state["metadata"], priority="manager", disable_streaming=False)
 		tools_by_name = {tool.name: tool for tool in tools}
 
 		human_message = HumanMessage(content="""
@@ -27,14 +28,17 @@ def call_research_manager(load_llm, tools, pruning_func, state: AgentState):
 			*_remove_xml_tags_from_messages(state['messages'], ["thinking"]), 
 			human_message
 		])
+		# The conversation up to the fixed instruction is the prefix of the next manager call
+		input_messages = add_cache_breakpoints(input_messages, stable_prefix_end=-2)
 
 		tags = ["node_research_manager"]
 		response = llm.bind_tools(
-			list(tools_by_name.values()), 
+			cacheable_tools(list(tools_by_name.values())), 
 			tool_choice = { "type": "auto", "disable_parallel_tool_use": True }
 		).invoke(
 			input_messages, config={"tags": tags}
 		)
+		record_cache_usage(response, "research_manager")
 		response.tags = tags
 
 		if len(response.tool_calls) == 0:
@@ -56,7 +60,7 @@ def call_specialist(load_llm, tools, pruning_func, state: AgentState):
 	profile = {"current": specialist, "name": "call_specialist"}
 
 	try:
-		llm = load_llm(state["metadata"], disable_streaming=False)
+		llm = load_llm(state["metadata"], priority="specialist", disable_streaming=False)
 		
 		workflows = _extract_workflows_from_messages(state["messages"], specialist, newest=False)
 		historical_workflows, newest_workflow = workflows[:-1], workflows[-1]
@@ -67,11 +71,14 @@ def call_specialist(load_llm, tools, pruning_func, state: AgentState):
 		assert specialist in specialist_prompt_dict, f"Invalid specialist: {specialist}. Only {list(specialist_prompt_dict.keys())} are allowed."
 		system_messages = specialist_prompt_dict[specialist].invoke({}).messages
 		input_messages = pruning_func([ *system_messages, *historical_messages, *newest_messages ])
+		# The whole prompt is the prefix of the next reasoning - tool call iteration
+		input_messages = add_cache_breakpoints(input_messages, stable_prefix_end=-1)
 
 		tags = [specialist]
 		response = llm.bind_tools(
-			tools, tool_choice = { "type": "auto", "disable_parallel_tool_use": True }
+			cacheable_tools(tools), tool_choice = { "type": "auto", "disable_parallel_tool_use": True }
 		).invoke( input_messages, config={ "tags": tags } )
+		record_cache_usage(response, specialist)
 		response.content = response.text
 		response.tags = tags
 
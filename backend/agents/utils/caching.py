@@ -0,0 +1,70 @@
+from langchain_core.messages import AnyMessage, SystemMessage
+from langchain_anthropic.chat_models import convert_to_anthropic_tool
+from collections import defaultdict
+import threading
+
+
+CACHE_CONTROL = {"type": "ephemeral"}
+
+
+def _with_cache_control(message: AnyMessage) -> AnyMessage:
+	"""Copy of `message` with a cache breakpoint on its last content block"""
+	content = message.content
+	if not content:
+		# Anthropic rejects empty text blocks, e.g. of tool-call-only AI messages
+		return message
+	if isinstance(content, str):
+		content = [{"type": "text", "text": content}]
+	content = [*content[:-1], {**content[-1], "cache_control": CACHE_CONTROL}] \
+		if isinstance(content[-1], dict) else [*content[:-1], {"type": "text", "text": content[-1], "cache_control": CACHE_CONTROL}]
+	return message.model_copy(update={"content": content})
+
+
+def add_cache_breakpoints(messages: list[AnyMessage], stable_prefix_end: int = -2) -> list[AnyMessage]:
+	"""
+	Mark the cacheable prefixes of a prompt for Anthropic prompt caching
+
+	Breakpoints go after the last system message (the hub prompt) and after the stable
+	history prefix, i.e. the message at `stable_prefix_end`: the next call of the same
+	node starts with the same messages up to there and reads them from the cache. The
+	tool definitions are marked separately by `cacheable_tools`. Messages are copied,
+	the state is not modified.
+	"""
+	messages = list(messages)
+	system_indices = [i for i, message in enumerate(messages) if isinstance(message, SystemMessage)]
+	breakpoints = {system_indices[-1]} if system_indices else set()
+	if len(messages) >= abs(stable_prefix_end) and len(messages) > 1:
+		breakpoints.add(stable_prefix_end % len(messages))
+
+	for i in breakpoints:
+		messages[i] = _with_cache_control(messages[i])
+	return messages
+
+
+def cacheable_tools(tools: list) -> list:
+	"""Tools in Anthropic format with a cache breakpoint after the last definition"""
+	tools = [convert_to_anthropic_tool(tool) for tool in tools]
+	if tools:
+		tools[-1] = {**tools[-1], "cache_control": CACHE_CONTROL}
+	return tools
+
+
+cache_usage = defaultdict(lambda: {"calls": 0, "input_tokens": 0, "cache_read": 0, "cache_creation": 0})
+cache_usage_lock = threading.Lock()
+
+def record_cache_usage(response, node: str) -> dict:
+	"""Cache read/write tokens of one call, added to the per-node totals and the response metadata"""
+	usage_metadata = getattr(response, "usage_metadata", None) or {}
+	details = usage_metadata.get("input_token_details") or {}
+	usage = {
+		"input_tokens": usage_metadata.get("input_tokens", 0) or 0,
+		"cache_read": details.get("cache_read", 0) or 0,
+		"cache_creation": details.get("cache_creation", 0) or 0,
+	}
+	with cache_usage_lock:
+		totals = cache_usage[node]
+		totals["calls"] += 1
+		for key, value in usage.items():
+			totals[key] += value
+	response.response_metadata = {**(response.response_metadata or {}), "prompt_cache": usage}
+	return usage
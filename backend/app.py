@@ -1,9 +1,9 @@
 from typing import Any, List, Dict, Any, Optional
 from langchain_core.messages import AnyMessage
 from pydantic import BaseModel
-import httpx, json, os
+import httpx, json, os, hmac, hashlib
 
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI, HTTPException, Request
 from langserve import add_routes
 app = FastAPI(
 	title="LangChain Server",
@@ -38,6 +38,60 @@ def node_sciscigpt(agent_state):
 		
 	return agent_state
 
+# Admin and metrics endpoints need `Authorization: Bearer $ADMIN_TOKEN`; without a token they only answer local requests
+admin_token = os.getenv("ADMIN_TOKEN")
+def require_admin(request: Request):
+	if admin_token:
+		if hmac.compare_digest(request.headers.get("authorization", "").encode(), f"Bearer {admin_token}".encode()):
+			return
+	elif request.client and request.client.host in ("127.0.0.1", "::1"):
+		return
+	raise HTTPException(status_code=403, detail="Admin token required")
+
+from tools.sandbox import jupyter_sandbox
+@app.get("/metrics/sandbox", dependencies=[Depends(require_admin)])
+def sandbox_metrics():
+	# Session ids route tool calls to kernels, so only their hashes are reported
+	return {"sessions": {
+		hashlib.sha256(str(session_id).encode()).hexdigest()[:12]: usage
+		for session_id, usage in jupyter_sandbox.usage().items()
+	}}
+
+from func.embedding_cache import caches as embedding_caches
+@app.get("/metrics/embeddings", dependencies=[Depends(require_admin)])
+def embedding_metrics():
+	return {"caches": [cache.stats() for cache in embedding_caches.values()]}
+
+from llms import llm_pool, llm_replay_store, llm_scheduler, llm_latency
+from agents.utils.caching import cache_usage
+@app.get("/metrics/llm", dependencies=[Depends(require_admin)])
+def llm_metrics():
+	return {
+		"pool": llm_pool.stats(),
+		"scheduler": llm_scheduler.stats(),
+		"backends": llm_latency.stats(),
+		"prompt_cache": dict(cache_usage),
+		"replay": llm_replay_store.stats() if llm_replay_store is not None else None,
+	}
+
+from tools.literature import literature_cache
+@app.get("/metrics/literature", dependencies=[Depends(require_admin)])
+def literature_metrics():
+	return literature_cache.stats() if literature_cache else {}
+
+@app.post("/literature/cache/invalidate", dependencies=[Depends(require_admin)])
+def invalidate_literature_cache(corpus_version: Optional[str] = None):
+	"""Hook for corpus index updates: drops cached literature results"""
+	if literature_cache:
+		literature_cache.invalidate(corpus_version)
+	return {"invalidated": literature_cache is not None}
+
+from tools.sql import reference_store
+@app.post("/reference/invalidate", dependencies=[Depends(require_admin)])
+def invalidate_reference_store(db_name: Optional[str] = None):
+	"""Hook for database updates: drops the promoted sql_query results (of `db_name`, or all)"""
+	return {"invalidated": reference_store.invalidate(db_name)}
+
 from langchain_core.runnables.config import RunnableConfig
 config = RunnableConfig(recursion_limit=500, run_name="SciSciGPT")
 
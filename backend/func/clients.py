@@ -0,0 +1,91 @@
+import os, threading
+from contextlib import contextmanager
+from typing import Dict
+
+import httpx
+
+
+class ClientRegistry:
+    def __init__(self, max_connections: int = 32, max_keepalive_connections: int = 16, keepalive_expiry: float = 120,
+                 timeout: float = 60, pinecone_pool_threads: int = 8, endpoint_concurrency: int = 16):
+        """
+        Process-wide registry of pooled clients for embedding and vector-store calls
+
+        Every endpoint gets one `httpx.Client` whose connections are kept alive between
+        calls, so concurrent sessions reuse TLS connections instead of opening new ones.
+        The pool size also caps the concurrent requests to the endpoint. Pinecone
+        indexes are shared per index name (one urllib3 pool per index), and `limit`
+        caps concurrent calls to endpoints whose client is not httpx-based.
+
+        Parameters:
+        max_connections (int): Maximum open connections (and concurrent requests) per endpoint
+        max_keepalive_connections (int): Idle connections kept open per endpoint
+        keepalive_expiry (float): Seconds an idle connection is kept open
+        timeout (float): Request timeout in seconds
+        pinecone_pool_threads (int): Worker threads of each shared Pinecone index
+        endpoint_concurrency (int): Concurrent calls allowed by `limit` per endpoint
+        """
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        # Requests wait for a free pooled connection rather than fail while the endpoint is busy
+        self.timeout = httpx.Timeout(timeout, pool=None)
+        self.pinecone_pool_threads = pinecone_pool_threads
+        self.endpoint_concurrency = endpoint_concurrency
+
+        self.http_clients: Dict[str, httpx.Client] = {}
+        self.pinecone_indexes: Dict[str, object] = {}
+        self.semaphores: Dict[str, threading.BoundedSemaphore] = {}
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "ClientRegistry":
+        return cls(
+            max_connections=int(os.getenv("HTTP_MAX_CONNECTIONS", 32)),
+            max_keepalive_connections=int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", 16)),
+            keepalive_expiry=float(os.getenv("HTTP_KEEPALIVE_EXPIRY", 120)),
+            pinecone_pool_threads=int(os.getenv("PINECONE_POOL_THREADS", 8)),
+            endpoint_concurrency=int(os.getenv("ENDPOINT_CONCURRENCY", 16)),
+        )
+
+    def http_client(self, endpoint: str) -> httpx.Client:
+        """Shared keep-alive client of an endpoint (e.g. "openai")"""
+        with self.lock:
+            if endpoint not in self.http_clients:
+                self.http_clients[endpoint] = httpx.Client(limits=self.limits, timeout=self.timeout)
+            return self.http_clients[endpoint]
+
+    def openai_embeddings(self, model: str, **kwargs):
+        """`OpenAIEmbeddings` on the shared OpenAI connection pool"""
+        from langchain_openai import OpenAIEmbeddings
+        return OpenAIEmbeddings(model=model, http_client=self.http_client("openai"), **kwargs)
+
+    def pinecone_index(self, index_name: str):
+        """Shared Pinecone index client (all namespaces and stores of an index use the same pool)"""
+        with self.lock:
+            if index_name not in self.pinecone_indexes:
+                from pinecone import Pinecone
+                pinecone = Pinecone(api_key=os.getenv("PINECONE_API_KEY"), pool_threads=self.pinecone_pool_threads)
+                self.pinecone_indexes[index_name] = pinecone.Index(index_name, pool_threads=self.pinecone_pool_threads)
+            return self.pinecone_indexes[index_name]
+
+    @contextmanager
+    def limit(self, endpoint: str):
+        """Cap the number of concurrent calls to `endpoint` across all sessions"""
+        with self.lock:
+            if endpoint not in self.semaphores:
+                self.semaphores[endpoint] = threading.BoundedSemaphore(self.endpoint_concurrency)
+            semaphore = self.semaphores[endpoint]
+        with semaphore:
+            yield
+
+    def close(self):
+        with self.lock:
+            for client in self.http_clients.values():
+                client.close()
+            self.http_clients.clear()
+
+
+clients = ClientRegistry.from_env()
@@ -0,0 +1,119 @@
+import re, zlib
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+@lru_cache(maxsize=1)
+def _encoding():
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        return None
+
+def count_tokens(text: str) -> int:
+    """Approximate prompt tokens of `text` (tiktoken if available, ~4 characters per token otherwise)"""
+    encoding = _encoding()
+    if encoding is None:
+        return len(text) // 4 + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+_PRIME = np.uint64((1 << 61) - 1)
+
+class MinHashLSH:
+    def __init__(self, threshold: float = 0.8, num_perm: int = 64, bands: int = 16, shingle_size: int = 5, seed: int = 0):
+        """
+        Near-duplicate detection with MinHash signatures over word shingles and LSH banding
+
+        Texts that share a band are candidates; a candidate is a duplicate if the
+        estimated Jaccard similarity of the signatures is at least `threshold`.
+        """
+        self.threshold = threshold
+        self.bands = bands
+        self.shingle_size = shingle_size
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(1, 1 << 32, size=num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, 1 << 32, size=num_perm, dtype=np.uint64)
+        self.buckets: Dict[tuple, list] = {}
+        self.signatures: list = []
+
+    def signature(self, text: str) -> np.ndarray:
+        words = re.findall(r"\w+", text.lower())
+        shingles = {" ".join(words[i:i + self.shingle_size]) for i in range(max(1, len(words) - self.shingle_size + 1))}
+        hashes = np.array([zlib.crc32(s.encode()) for s in shingles], dtype=np.uint64)
+        # (a * x + b) mod p for all permutations at once (32-bit a, b and x cannot overflow uint64)
+        return ((np.outer(hashes, self.a) + self.b) % _PRIME).min(axis=0)
+
+    def add_if_new(self, text: str) -> bool:
+        """Add `text` unless it is a near-duplicate of a text added before, returns whether it was added"""
+        signature = self.signature(text)
+        rows = len(signature) // self.bands
+        keys = [(band, signature[band * rows:(band + 1) * rows].tobytes()) for band in range(self.bands)]
+        candidates = {i for key in keys for i in self.buckets.get(key, [])}
+        for i in candidates:
+            if np.mean(self.signatures[i] == signature) >= self.threshold:
+                return False
+        for key in keys:
+            self.buckets.setdefault(key, []).append(len(self.signatures))
+        self.signatures.append(signature)
+        return True
+
+
+def pack_sections(df: pd.DataFrame, token_budget: Optional[int] = None, threshold: float = 0.8) -> Tuple[pd.DataFrame, Dict]:
+    """
+    Select the retrieved sections that go into the summarization prompt
+
+    1. Sections retrieved by several queries are kept once, with their `relevance` summed.
+    2. Near-duplicate sections (MinHash/LSH, e.g. a preprint and its published version)
+       are dropped in favour of the more relevant one.
+    3. Sections are added by decreasing relevance while they fit in `token_budget`;
+       the first section of a paper also pays for the paper's BibTeX entry.
+
+    Parameters:
+    df (pd.DataFrame): Retrieved sections with `text`, `url`, `section_id` and `relevance` columns
+    token_budget (int): Maximum prompt tokens of the selected sections (None for no limit)
+    threshold (float): Estimated Jaccard similarity above which sections are near-duplicates
+
+    Returns:
+    tuple: Selected sections (without `relevance`), statistics including the tokens saved
+    """
+    tokens = df["text"].map(count_tokens)
+    tokens_before = int(tokens.sum())
+
+    df = df.assign(tokens=tokens)
+    df["relevance"] = df.groupby(["url", "section_id"], dropna=False)["relevance"].transform("sum")
+    df = df.drop_duplicates(["url", "section_id"]).sort_values("relevance", ascending=False, kind="stable")
+    exact_duplicates = len(tokens) - len(df)
+
+    lsh = MinHashLSH(threshold=threshold)
+    metadata_columns = [c for c in df.columns if c not in ("text", "section_id", "relevance", "tokens")]
+    kept, papers, used, near_duplicates, over_budget = [], set(), 0, 0, 0
+    for index, row in zip(df.index, df.to_dict("records")):
+        if not lsh.add_if_new(row["text"]):
+            near_duplicates += 1
+            continue
+        cost = row["tokens"]
+        if row["url"] not in papers:
+            cost += count_tokens(", ".join(f"{c} = {row[c]}" for c in metadata_columns))
+        if token_budget is not None and used + cost > token_budget:
+            over_budget += 1
+            continue
+        kept.append(index)
+        papers.add(row["url"])
+        used += cost
+
+    selected = df.loc[kept].drop(columns=["relevance", "tokens"])
+    tokens_after = int(df.loc[kept, "tokens"].sum())
+    return selected, {
+        "sections": len(tokens),
+        "exact_duplicates": exact_duplicates,
+        "near_duplicates": near_duplicates,
+        "over_budget": over_budget,
+        "tokens_before": tokens_before,
+        "tokens_after": tokens_after,
+        "tokens_saved": tokens_before - tokens_after,
+    }
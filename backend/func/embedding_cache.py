@@ -0,0 +1,195 @@
+import os, re, json, time, sqlite3, hashlib, threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+
+class CachedEmbeddings(Embeddings):
+    def __init__(self, embeddings: Embeddings, model: str, path: str, capacity: int = 100_000, dimensions: int = None):
+        """
+        Persistent LRU cache around an embedding client
+
+        Vectors are stored as float32 in a memory-mapped file with one slot per cached
+        text; a SQLite table maps text hashes to slots and records when each was last
+        used. When the cache is full the least recently used slot is reused. Each model
+        (and output dimension) has its own directory, so vectors of different models are
+        never mixed.
+
+        Several processes (e.g. API server workers) can share a cache directory: slots
+        are allocated, written and read inside SQLite write transactions, so the table
+        on disk is the only state and no process reads a slot while another reuses it.
+
+        Parameters:
+        embeddings (Embeddings): Embedding client to cache (e.g. `OpenAIEmbeddings`)
+        model (str): Name of the embedding model (part of the cache key)
+        path (str): Root directory of the cache
+        capacity (int): Maximum number of cached vectors
+        dimensions (int): Output dimension requested from the model (part of the cache key, None for the default)
+        """
+        self.embeddings = embeddings
+        self.model = model
+        self.dimensions = dimensions
+        self.capacity = capacity
+        name = f"{model}-{dimensions}" if dimensions else model
+        self.path = os.path.join(path, re.sub(r"[^A-Za-z0-9_.-]", "_", name))
+        os.makedirs(self.path, exist_ok=True)
+
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        # Transactions are managed explicitly (autocommit otherwise)
+        self.db = sqlite3.connect(os.path.join(self.path, "index.sqlite"), timeout=60, isolation_level=None, check_same_thread=False)
+        self.db.execute("CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, slot INTEGER, last_used INTEGER)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used)")
+
+        self.vectors: Optional[np.memmap] = None
+        with self._transaction():
+            self._load_vectors()
+
+    @contextmanager
+    def _transaction(self):
+        """Hold this process' lock and the database write lock (shared by all processes)"""
+        with self.lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                yield
+            except BaseException:
+                self.db.execute("ROLLBACK")
+                raise
+            self.db.execute("COMMIT")
+
+    def _load_vectors(self):
+        """Open the vector file if this or another process has created it"""
+        meta_path = os.path.join(self.path, "meta.json")
+        if self.vectors is None and os.path.exists(meta_path):
+            with open(meta_path) as f:
+                meta = json.load(f)
+            self._open_vectors(meta["dim"], meta["capacity"])
+
+    def _open_vectors(self, dim: int, capacity: int):
+        vectors_path = os.path.join(self.path, "vectors.f32")
+        mode = "r+" if os.path.exists(vectors_path) else "w+"
+        self.vectors = np.memmap(vectors_path, dtype=np.float32, mode=mode, shape=(capacity, dim))
+        # The file keeps the capacity it was created with
+        self.capacity = capacity
+        with open(os.path.join(self.path, "meta.json"), "w") as f:
+            json.dump({"model": self.model, "dim": dim, "capacity": capacity}, f)
+
+    @staticmethod
+    def key(text: str) -> str:
+        return hashlib.sha1(text.encode()).hexdigest()
+
+    def _slots(self, keys: List[str]) -> Dict[str, int]:
+        """Slots of the cached `keys` (call inside a transaction)"""
+        keys, slots = list(dict.fromkeys(keys)), {}
+        for i in range(0, len(keys), 500):
+            batch = keys[i:i + 500]
+            slots.update(self.db.execute(
+                f"SELECT key, slot FROM entries WHERE key IN ({', '.join('?' * len(batch))})", batch))
+        return slots
+
+    def _lookup(self, keys: List[str]) -> Dict[str, List[float]]:
+        with self._transaction():
+            self._load_vectors()
+            if self.vectors is None:
+                return {}
+            slots = self._slots(keys)
+            found = {key: self.vectors[slot].tolist() for key, slot in slots.items()}
+            now = time.time_ns()
+            self.db.executemany("UPDATE entries SET last_used = ? WHERE key = ?", [(now, key) for key in slots])
+        return found
+
+    def _store(self, keys: List[str], vectors: List[List[float]]):
+        with self._transaction():
+            self._load_vectors()
+            if self.vectors is None:
+                self._open_vectors(len(vectors[0]), self.capacity)
+            if len(vectors[0]) != self.vectors.shape[1]:
+                raise ValueError(f"Embedding cache {self.path} holds {self.vectors.shape[1]}-dimensional vectors, got {len(vectors[0])}")
+
+            # Another process may have stored some of the texts meanwhile
+            cached = self._slots(keys)
+            new = [(key, vector) for key, vector in dict(zip(keys, vectors)).items() if key not in cached][-self.capacity:]
+            if not new:
+                return
+            size = self.db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+            slots = list(range(size, min(size + len(new), self.capacity)))
+            if len(slots) < len(new):
+                evicted = self.db.execute("SELECT key, slot FROM entries ORDER BY last_used LIMIT ?", (len(new) - len(slots),)).fetchall()
+                self.db.executemany("DELETE FROM entries WHERE key = ?", [(key,) for key, _ in evicted])
+                slots += [slot for _, slot in evicted]
+
+            for slot, (_, vector) in zip(slots, new):
+                self.vectors[slot] = np.asarray(vector, dtype=np.float32)
+            self.vectors.flush()
+            # Later texts of a batch count as more recently used
+            now = time.time_ns()
+            self.db.executemany("INSERT INTO entries VALUES (?, ?, ?)", [(key, slot, now + i) for i, (slot, (key, _)) in enumerate(zip(slots, new))])
+
+    def _partition(self, texts: List[str]):
+        keys = [self.key(text) for text in texts]
+        found = self._lookup(keys)
+        missing = list({key: text for key, text in zip(keys, texts) if key not in found}.items())
+        with self.lock:
+            self.hits += len(texts) - sum(key not in found for key in keys)
+            self.misses += sum(key not in found for key in keys)
+        return keys, found, missing
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys, found, missing = self._partition(texts)
+        if missing:
+            vectors = self.embeddings.embed_documents([text for _, text in missing])
+            self._store([key for key, _ in missing], vectors)
+            found.update({key: vector for (key, _), vector in zip(missing, vectors)})
+        return [found[key] for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys, found, missing = self._partition(texts)
+        if missing:
+            vectors = await self.embeddings.aembed_documents([text for _, text in missing])
+            self._store([key for key, _ in missing], vectors)
+            found.update({key: vector for (key, _), vector in zip(missing, vectors)})
+        return [found[key] for key in keys]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return (await self.aembed_documents([text]))[0]
+
+    def stats(self) -> Dict:
+        """Hit-rate metrics of the cache"""
+        with self.lock:
+            requests = self.hits + self.misses
+            return {
+                "model": self.model,
+                "dimensions": self.dimensions,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / requests, 4) if requests else None,
+                "size": self.db.execute("SELECT COUNT(*) FROM entries").fetchone()[0],
+                "capacity": self.capacity,
+            }
+
+
+caches: Dict[Tuple[str, Optional[int]], CachedEmbeddings] = {}
+
+def cached_embeddings(embeddings: Embeddings, model: str, dimensions: int = None) -> Embeddings:
+    """
+    Wrap an embedding client in the cache configured by `EMBEDDING_CACHE_PATH`
+
+    One cache is shared by all clients of the same model and output dimension (taken
+    from the client's `dimensions` if not given). Returns `embeddings` unchanged if no
+    cache path is configured.
+    """
+    path = os.getenv("EMBEDDING_CACHE_PATH")
+    if not path:
+        return embeddings
+    dimensions = dimensions or getattr(embeddings, "dimensions", None)
+    if (model, dimensions) not in caches:
+        capacity = int(os.getenv("EMBEDDING_CACHE_SIZE", 100_000))
+        caches[model, dimensions] = CachedEmbeddings(embeddings, model, path, capacity=capacity, dimensions=dimensions)
+    return caches[model, dimensions]
@@ -1,21 +1,302 @@
-from jupyter_client import KernelManager
 from queue import Empty
-import time, uuid, re
+import time, uuid, re, os, hmac, shutil, hashlib, logging, tempfile, threading
+from contextlib import contextmanager
+from collections import deque
 from IPython.core.ultratb import FormattedTB
-from typing import Dict, Optional
+from typing import Callable, Dict, Optional
 import asyncio
 
+from func.kernels import KernelProvider, LocalKernelProvider
+
+kernel_helpers_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "kernel_helpers.py")
+
+logger = logging.getLogger(__name__)
+
+
+def _utf8_len(text: str) -> int:
+    return len(text.encode())
+
+
+def _utf8_head(text: str, n_bytes: int) -> str:
+    """Longest prefix of `text` that fits in `n_bytes` UTF-8 bytes"""
+    return text.encode()[:max(n_bytes, 0)].decode(errors="ignore")
+
+
+def _utf8_tail(text: str, n_bytes: int) -> str:
+    """Longest suffix of `text` that fits in `n_bytes` UTF-8 bytes"""
+    return text.encode()[len(text.encode()) - max(n_bytes, 0):].decode(errors="ignore")
+
+
+class OutputCapture:
+    def __init__(self, max_bytes: int, spill_dir: str):
+        """
+        Bounded capture of cell output: keeps the head and the tail of the text output
+        and spills the complete output to a file once `max_bytes` is exceeded
+
+        Sizes are UTF-8 bytes; cuts never split a character, so a chunk may keep a few
+        bytes less than its share. Non-text outputs (images) do not count against the
+        cap; after an overflow they are kept in order with the tail, and dropped with the
+        text around them if newer text pushes them out of it.
+        
+        Parameters:
+        max_bytes (int): Maximum number of text bytes kept in memory (split between head and tail)
+        spill_dir (str): Directory for the spill file
+        """
+        self.head_bytes = max_bytes // 2
+        self.tail_bytes = max_bytes - self.head_bytes
+        self.spill_dir = spill_dir
+
+        self.head: list[dict] = []
+        self.tail: deque[dict] = deque()
+        self.head_size = 0
+        self.tail_size = 0
+        self.total_size = 0
+        self.spill_path: Optional[str] = None
+        self.spill_file = None
+
+    def add(self, output: dict) -> list[dict]:
+        """
+        Add an output to the capture
+        
+        Returns:
+        list: Outputs that should be forwarded to a live stream (the kept head, non-text
+            outputs, or a one-time overflow notice)
+        """
+        if output['type'] != 'text':
+            if self.spill_file is None:
+                self.head.append(output)
+            else:
+                self.spill_file.write(f"\n[{output['type']} output]\n")
+                self.tail.append(output)
+            return [output]
+
+        text = output['text']
+        size = _utf8_len(text)
+        self.total_size += size
+
+        if self.spill_file is None:
+            if self.head_size + size <= self.head_bytes:
+                self.head.append(output)
+                self.head_size += size
+                return [output]
+
+            kept = _utf8_head(text, self.head_bytes - self.head_size)
+            if kept:
+                self.head.append(output | {'text': kept})
+                self.head_size += _utf8_len(kept)
+            self._start_spill()
+            self.spill_file.write(text[len(kept):])
+            self._add_to_tail(text[len(kept):])
+            notice = {'type': 'text', 'text': f"{kept}\n... [output exceeds {self.head_bytes + self.tail_bytes} bytes, the complete output is written to {self.spill_path}] ...\n"}
+            return [notice]
+
+        self.spill_file.write(text)
+        self._add_to_tail(text)
+        return []
+
+    def _start_spill(self):
+        os.makedirs(self.spill_dir, exist_ok=True)
+        self.spill_path = os.path.join(self.spill_dir, f"cell_output_{uuid.uuid4()}.txt")
+        self.spill_file = open(self.spill_path, "w", encoding="utf-8")
+        self.spill_file.write("".join(o['text'] if o['type'] == 'text' else f"\n[{o['type']} output]\n" for o in self.head))
+
+    def _add_to_tail(self, text: str):
+        text = _utf8_tail(text, self.tail_bytes)
+        if not text:
+            return
+        self.tail.append({'type': 'text', 'text': text})
+        self.tail_size += _utf8_len(text)
+
+        # Drop (or trim) the oldest chunks until the tail fits
+        while self.tail_size > self.tail_bytes:
+            excess = self.tail_size - self.tail_bytes
+            oldest = self.tail[0]
+            if oldest['type'] != 'text':
+                self.tail.popleft()
+                continue
+            size = _utf8_len(oldest['text'])
+            if size <= excess:
+                self.tail.popleft()
+                self.tail_size -= size
+            else:
+                oldest['text'] = _utf8_tail(oldest['text'], size - excess)
+                self.tail_size -= size - _utf8_len(oldest['text'])
+
+    def outputs(self) -> list[dict]:
+        """Close the spill file and return the captured outputs"""
+        if self.spill_file is None:
+            return self.head
+
+        self.spill_file.close()
+        omitted = self.total_size - self.head_size - self.tail_size
+        marker = {'type': 'text', 'text': (
+            f"\n\n... [{omitted} bytes omitted. The complete output ({self.total_size} bytes) "
+            f"was saved to {self.spill_path}; read it in slices, e.g. `open(path).read()[start:end]`] ...\n\n"
+        )}
+        return self.head + [marker] + list(self.tail)
+
+
 class JupyterSandbox:
-    def __init__(self, working_dir: str, kernel_name: str=None):
-        """Initialize the session manager to handle multiple Jupyter kernels"""
+    def __init__(self, working_dir: str, kernel_name: str=None, snapshot_dir: str=None, prewarm: int=0, max_output_bytes: int=50_000,
+                 provider: KernelProvider=None, reference_dir: str=None, snapshot_secret: bytes=None):
+        """
+        Initialize the session manager to handle multiple Jupyter kernels
+        
+        Parameters:
+        working_dir (str): Working directory of the kernels
+        kernel_name (str): Jupyter kernel spec to start (default kernel if None)
+        snapshot_dir (str): Directory for namespace snapshots of evicted sessions, outside `working_dir` (disabled if None)
+        prewarm (int): Number of initialized kernels kept ready for new sessions
+        max_output_bytes (int): Text output (UTF-8 bytes) kept per cell; longer output is truncated and spilled to a file
+        provider (KernelProvider): Where kernels run (local child processes if None)
+        reference_dir (str): Directory of the shared `ReferenceStore` kernels can attach to
+        snapshot_secret (bytes): Key of the snapshot signatures (random if None, so snapshots do not survive a restart)
+        """
+        # Kernels run as the server's user, so code in any session can still write to `snapshot_dir`: a snapshot
+        # is only restored if it carries the server's HMAC over its files and session (see `_sign_snapshot`)
+        if snapshot_dir and os.path.commonpath([os.path.realpath(snapshot_dir), os.path.realpath(working_dir)]) == os.path.realpath(working_dir):
+            raise ValueError(f"snapshot_dir ({snapshot_dir}) must be outside of working_dir ({working_dir})")
+
         self.working_dir = working_dir
         self.kernel_name = kernel_name
+        self.snapshot_dir = snapshot_dir
+        self.snapshot_secret = snapshot_secret or os.urandom(32)
+        self.snapshot_timeout = 300
+        self.prewarm = prewarm
+        self.max_output_bytes = max_output_bytes
+        self.provider = provider if provider is not None else LocalKernelProvider()
+        self.reference_dir = reference_dir
         self.sessions: Dict[str, Dict] = {}
+        self.warm_pool: list[Dict] = []
+        self.lock = threading.Lock()
+        # Held while a session runs code, is created or is closed; the reaper skips sessions whose lock is taken.
+        # session_id -> [lock, number of holders and waiters]; entries are dropped when nobody uses them
+        self.session_locks: Dict[str, list] = {}
         self.tb_formatter = FormattedTB(mode='Plain')
 
+        if self.prewarm > 0:
+            self.refill_warm_pool(background=True)
+
+    def _start_kernel(self, session_id: str = None) -> Dict:
+        """Start a kernel through the provider and run the sandbox setup code in it"""
+        kernel = self.provider.start_kernel(self.kernel_name, session_id=session_id)
+
+        setup_code = [
+            "%load_ext rpy2.ipython",
+            "from juliacall import Main as jl",
+            f"import os; os.chdir('{self.working_dir}')",
+            "import sys, importlib.util as _ilu; "
+            f"_spec = _ilu.spec_from_file_location('sciscigpt_kernel', {kernel_helpers_path!r}); "
+            "_sciscigpt_kernel = sys.modules['sciscigpt_kernel'] = _ilu.module_from_spec(_spec); "
+            "_spec.loader.exec_module(_sciscigpt_kernel); del _spec, _ilu",
+            f"_sciscigpt_kernel.reference_path = {self.reference_dir!r}",
+            "from sciscigpt_kernel import load_arrow, load_reference, list_references, to_r, from_r, to_julia, from_julia",
+            "_sciscigpt_kernel.register_magics()",
+            "_sciscigpt_kernel.mark_baseline()",
+        ]
+        for code in setup_code:
+            self._run_code(kernel['kc'], code, timeout=120)
+
+        kernel['last_used'] = time.time()
+        return kernel
+
+    def refill_warm_pool(self, background: bool = False):
+        """
+        Start kernels until the warm pool holds `prewarm` initialized kernels
+        
+        Parameters:
+        background (bool): Start the kernels in a daemon thread
+        """
+        if background:
+            threading.Thread(target=self.refill_warm_pool, daemon=True).start()
+            return
+
+        while True:
+            with self.lock:
+                if len(self.warm_pool) >= self.prewarm:
+                    return
+            kernel = self._start_kernel()
+            with self.lock:
+                self.warm_pool.append(kernel)
+
+    def _take_kernel(self, session_id: str) -> Dict:
+        """Take a pre-warmed kernel if one is available, otherwise start a new one"""
+        preferred_host = self.provider.preferred_host(session_id)
+        with self.lock:
+            candidates = [k for k in self.warm_pool if preferred_host is None or k['host'] == preferred_host]
+            kernel = candidates[0] if candidates else None
+            if kernel is not None:
+                self.warm_pool.remove(kernel)
+
+        if kernel is None:
+            return self._start_kernel(session_id)
+
+        self.provider.bind(session_id, kernel)
+        self.refill_warm_pool(background=True)
+        return kernel
+
+    def _snapshot_path(self, session_id: str) -> Optional[str]:
+        if not self.snapshot_dir:
+            return None
+        return os.path.join(self.snapshot_dir, hashlib.sha256(str(session_id).encode()).hexdigest())
+
+    def _sign_snapshot(self, session_id: str, path: str) -> str:
+        """HMAC of the session and the content of every file of a snapshot directory"""
+        digest = hmac.new(self.snapshot_secret, str(session_id).encode(), hashlib.sha256)
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for file_name in sorted(files):
+                file_path = os.path.join(root, file_name)
+                if file_path == os.path.join(path, "signature"):
+                    continue
+                with open(file_path, "rb") as f:
+                    digest.update(os.path.relpath(file_path, path).encode() + b"\0" + hashlib.file_digest(f, "sha256").digest())
+        return digest.hexdigest()
+
+    def _claim_snapshot(self, session_id: str) -> Optional[str]:
+        """
+        Move the snapshot of a session to a private directory and check its signature
+
+        Returns:
+        str: Directory to restore from (remove it afterwards), None if there is no valid snapshot
+        """
+        snapshot_path = self._snapshot_path(session_id)
+        if not snapshot_path or not os.path.exists(os.path.join(snapshot_path, "manifest.json")):
+            return None
+        restore_dir = tempfile.mkdtemp(prefix=".restore-", dir=self.snapshot_dir)
+        restore_path = os.path.join(restore_dir, "snapshot")
+        os.rename(snapshot_path, restore_path)
+        try:
+            with open(os.path.join(restore_path, "signature")) as f:
+                signature = f.read().strip()
+        except FileNotFoundError:
+            signature = ""
+        if not hmac.compare_digest(signature, self._sign_snapshot(session_id, restore_path)):
+            logger.warning("Discarding snapshot of session %s: missing or invalid signature", session_id)
+            shutil.rmtree(restore_dir, ignore_errors=True)
+            return None
+        return restore_path
+
+    @contextmanager
+    def _session_lock(self, session_id: str, blocking: bool = True):
+        """Hold the lock of a session; yields whether it was acquired (always with `blocking`)"""
+        with self.lock:
+            entry = self.session_locks.setdefault(session_id, [threading.Lock(), 0])
+            entry[1] += 1
+        acquired = entry[0].acquire(blocking=blocking)
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                entry[0].release()
+            with self.lock:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self.session_locks[session_id]
+
     def get_or_create_session(self, session_id: str) -> Dict:
         """
-        Get an existing session or create a new one
+        Get an existing session or create a new one (call with the session lock held)
         
         Parameters:
         session_id (str): Unique identifier for the session
@@ -23,32 +304,28 @@ class JupyterSandbox:
         Returns:
         dict: Session information containing kernel manager and client
         """
-        if session_id not in self.sessions:
-            # Create new kernel and client
-            km = KernelManager(kernel_name=self.kernel_name) if self.kernel_name else KernelManager()
-            km.start_kernel()
-            kc = km.client()
-            kc.start_channels()
-            # Wait for kernel to be ready
-            kc.wait_for_ready()
-            
-            self.sessions[session_id] = {
-                'km': km,
-                'kc': kc,
-                'last_used': time.time()
-            }
+        with self.lock:
+            session = self.sessions.get(session_id)
+        if session is None:
+            # Create new kernel and client (or reuse a pre-warmed one)
+            session = self._take_kernel(session_id)
+            session['last_used'] = time.time()
+            session['pending_outputs'] = []
 
-            self.execute_code(
-                "%load_ext rpy2.ipython", session_id=session_id, cell_id=str(uuid.uuid4()), timeout=120)
-            self.execute_code(
-                "from juliacall import Main as jl", session_id=session_id, cell_id=str(uuid.uuid4()), timeout=120)
-            self.execute_code(
-                f"import os; os.chdir('{self.working_dir}')", session_id=session_id, cell_id=str(uuid.uuid4()), timeout=120)
+            # Rehydrate the namespace of a previously evicted session
+            restore_path = self._claim_snapshot(session_id)
+            if restore_path:
+                session['pending_outputs'] = self._run_code(
+                    session['kc'], f"_sciscigpt_kernel.restore_and_report({restore_path!r})", timeout=self.snapshot_timeout)
+                shutil.rmtree(os.path.dirname(restore_path), ignore_errors=True)
+
+            with self.lock:
+                self.sessions[session_id] = session
         else:
             # Update last used timestamp
-            self.sessions[session_id]['last_used'] = time.time()
+            session['last_used'] = time.time()
 
-        return self.sessions[session_id]
+        return session
 
     def format_traceback(self, traceback_list):
         """
@@ -66,7 +343,7 @@ class JupyterSandbox:
         
         return '\n'.join(cleaned_traceback)
 
-    def execute_code(self, code: str, session_id: str, cell_id: str, timeout: int = 120):
+    def execute_code(self, code: str, session_id: str, cell_id: str, timeout: int = 120, on_output: Callable[[dict], None] = None):
         """
         Execute Python code in a specific session and return results
         
@@ -74,6 +351,7 @@ class JupyterSandbox:
         code (str): Python code to execute
         session_id (str): Session identifier for persistent variables
         timeout (int): Execution timeout in seconds
+        on_output (callable): Called with every output as soon as it arrives from the kernel
         
         Returns:
         list: List of output results, each element could be:
@@ -81,11 +359,83 @@ class JupyterSandbox:
             - Image output: {'type': 'image_url', 'image_url': {'url': base64_image}}
             - Error output: {'type': 'text', 'text': error_message}
         """
+        with self._session_lock(session_id):
+            return self._execute_code(code, session_id, cell_id, timeout, on_output)
+
+    def _execute_code(self, code: str, session_id: str, cell_id: str, timeout: int, on_output: Callable[[dict], None]):
         session = self.get_or_create_session(session_id)
-        kc = session['kc']
+
+        def emit(output: dict):
+            if on_output is not None:
+                on_output(output | {'cell_id': cell_id, 'session_id': session_id})
+
+        pending_outputs = session.pop('pending_outputs', [])
+        for output in pending_outputs:
+            emit(output)
+
+        usage_before = self._kernel_usage(session)
+        outputs = pending_outputs + self._run_code(session['kc'], code, timeout, on_output=emit)
+        usage_after = self._kernel_usage(session)
+        session['last_used'] = time.time()
+
+        # Resource usage of this cell (CPU) and of the session so far (memory)
+        if usage_after.get('cpu_seconds') is not None and usage_before.get('cpu_seconds') is not None:
+            session['cell_usage'] = {
+                'cpu_seconds': round(usage_after['cpu_seconds'] - usage_before['cpu_seconds'], 2),
+                'session_cpu_seconds': usage_after['cpu_seconds'],
+                'peak_rss_mb': usage_after.get('peak_rss_mb'),
+            }
+
+        outputs = [o | {'cell_id': cell_id, 'session_id': session_id} for o in outputs]
+        return outputs
+
+    def _kernel_usage(self, session: Dict) -> Dict:
+        try:
+            return self.provider.usage(session)
+        except Exception:
+            return {}
+
+    def cell_usage(self, session_id: str) -> Optional[Dict]:
+        """Resource usage of the last cell executed in a session (None if not available)"""
+        with self.lock:
+            session = self.sessions.get(session_id)
+        return session.get('cell_usage') if session else None
+
+    def usage(self) -> Dict[str, Dict]:
+        """
+        Resource usage of every active session
+        
+        Returns:
+        dict: session_id -> {'host', 'cpu_seconds', 'rss_mb', 'peak_rss_mb', 'unenforced', 'idle_seconds'}
+        """
+        current_time = time.time()
+        with self.lock:
+            sessions = list(self.sessions.items())
+        return {
+            session_id: {'host': session.get('host')} | self._kernel_usage(session) | {'idle_seconds': round(current_time - session['last_used'], 1)}
+            for session_id, session in sessions
+        }
+
+    def _run_code(self, kc, code: str, timeout: int = 120, on_output: Callable[[dict], None] = None) -> list:
+        """
+        Run code on a kernel client and collect its outputs until the kernel goes idle
         
+        Parameters:
+        kc: Kernel client to execute the code on
+        code (str): Code to execute
+        timeout (int): Execution timeout in seconds
+        on_output (callable): Called with every output as soon as it arrives
+        
+        Returns:
+        list: List of output results (see `execute_code`)
+        """
         msg_id = kc.execute(code)
-        outputs = []
+        capture = OutputCapture(self.max_output_bytes, self.working_dir)
+
+        def append(output: dict):
+            for streamed in capture.add(output):
+                if on_output is not None:
+                    on_output(streamed)
         
         start_time = time.time()
         while True:
@@ -96,14 +446,14 @@ class JupyterSandbox:
                 
                 if msg_type == 'stream':
                     # Text output
-                    outputs.append({
+                    append({
                         'type': 'text',
                         'text': content['text']
                     })
                     
                 elif msg_type == 'execute_result':
                     # Execution result as text output
-                    outputs.append({
+                    append({
                         'type': 'text',
                         'text': str(content['data'].get('text/plain', ''))
                     })
@@ -115,14 +465,14 @@ class JupyterSandbox:
                         # Ensure base64 string has correct prefix
                         if not image_data.startswith('data:image/png;base64,'):
                             image_data = 'data:image/png;base64,' + image_data
-                        outputs.append({
+                        append({
                             'type': 'image_url',
                             'image_url': {
                                 'url': image_data
                             }
                         })
                     elif 'text/plain' in content['data']:
-                        outputs.append({
+                        append({
                             'type': 'text',
                             'text': content['data']['text/plain']
                         })
@@ -130,7 +480,7 @@ class JupyterSandbox:
                 elif msg_type == 'error':
                     # Error message as text output
                     formatted_error = self.format_traceback(content['traceback'])
-                    outputs.append({
+                    append({
                         'type': 'text',
                         'text': formatted_error
                     })
@@ -140,42 +490,111 @@ class JupyterSandbox:
                     
             except Empty:
                 if time.time() - start_time > timeout:
-                    outputs.append({
+                    append({
                         'type': 'text',
                         'text': f'Execution timeout after {timeout} seconds'
                     })
                     break
                 continue
-        outputs = [o | {'cell_id': cell_id, 'session_id': session_id} for o in outputs]
-        return outputs
+        return capture.outputs()
 
-    def close_session(self, session_id: str):
+    def snapshot_session(self, session_id: str) -> Optional[str]:
+        """
+        Serialize the user namespace of a session to disk so it can be restored later
+        (call with the session lock held)
+        
+        Parameters:
+        session_id (str): Session identifier to snapshot
+        
+        Returns:
+        str: Path of the signed snapshot, None if snapshots are disabled or the snapshot failed
+        """
+        snapshot_path = self._snapshot_path(session_id)
+        with self.lock:
+            session = self.sessions.get(session_id)
+        if not snapshot_path or session is None:
+            return None
+
+        os.makedirs(self.snapshot_dir, mode=0o700, exist_ok=True)
+        shutil.rmtree(snapshot_path, ignore_errors=True)
+        self._run_code(
+            session['kc'], f"_sciscigpt_kernel.snapshot_namespace({snapshot_path!r})", timeout=self.snapshot_timeout)
+        if not os.path.exists(os.path.join(snapshot_path, "manifest.json")):
+            return None
+        signature = self._sign_snapshot(session_id, snapshot_path)
+        with open(os.path.join(snapshot_path, "signature"), "w") as f:
+            f.write(signature)
+        return snapshot_path
+
+    def close_session(self, session_id: str, snapshot: bool = False):
         """
         Close a specific session and clean up its resources
         
         Parameters:
         session_id (str): Session identifier to close
+        snapshot (bool): Snapshot the user namespace before shutting the kernel down
         """
-        if session_id in self.sessions:
-            session = self.sessions[session_id]
-            session['kc'].stop_channels()
-            session['km'].shutdown_kernel()
-            del self.sessions[session_id]
+        with self._session_lock(session_id):
+            self._close_session(session_id, snapshot)
+
+    def _close_session(self, session_id: str, snapshot: bool):
+        with self.lock:
+            if session_id not in self.sessions:
+                return
+        if snapshot:
+            try:
+                self.snapshot_session(session_id)
+            except Exception:
+                logger.exception("Failed to snapshot session %s", session_id)
+        with self.lock:
+            session = self.sessions.pop(session_id)
+        self.provider.shutdown_kernel(session)
 
-    def close_all_sessions(self):
+    def close_all_sessions(self, snapshot: bool = False):
         """Close all active sessions and clean up resources"""
-        for session_id in list(self.sessions.keys()):
-            self.close_session(session_id)
+        with self.lock:
+            session_ids = list(self.sessions.keys())
+        for session_id in session_ids:
+            self.close_session(session_id, snapshot=snapshot)
+        with self.lock:
+            warm_pool, self.warm_pool = self.warm_pool, []
+        for kernel in warm_pool:
+            self.provider.shutdown_kernel(kernel)
 
     def cleanup_inactive_sessions(self, max_idle_time: int = 3600):
         """
         Clean up sessions that have been inactive for longer than max_idle_time
+
+        Sessions that are running code (or being created or closed) are skipped until the next pass.
         
         Parameters:
         max_idle_time (int): Maximum idle time in seconds before session cleanup
         """
-        current_time = time.time()
-        for session_id in list(self.sessions.keys()):
-            session = self.sessions[session_id]
-            if current_time - session['last_used'] > max_idle_time:
-                self.close_session(session_id)
\ No newline at end of file
+        with self.lock:
+            session_ids = list(self.sessions.keys())
+        for session_id in session_ids:
+            with self._session_lock(session_id, blocking=False) as acquired:
+                if not acquired:
+                    continue
+                with self.lock:
+                    session = self.sessions.get(session_id)
+                if session is not None and time.time() - session['last_used'] > max_idle_time:
+                    self._close_session(session_id, snapshot=self.snapshot_dir is not None)
+
+    def start_reaper(self, max_idle_time: int = 3600, interval: int = 60):
+        """
+        Periodically evict idle sessions in a daemon thread (snapshotting them if enabled)
+        
+        Parameters:
+        max_idle_time (int): Maximum idle time in seconds before session cleanup
+        interval (int): Seconds between two cleanup passes
+        """
+        def reap():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.cleanup_inactive_sessions(max_idle_time)
+                except Exception:
+                    logger.exception("Failed to clean up inactive sessions")
+
+        threading.Thread(target=reap, daemon=True).start()
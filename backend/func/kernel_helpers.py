@@ -0,0 +1,406 @@
+"""
+Helpers that run *inside* the sandbox kernels.
+
+This module is loaded into every kernel by `JupyterSandbox` under the name
+`sciscigpt_kernel`, so it must only depend on packages that are available in the
+sandbox environment (see `requirements-sandbox-python.txt`).
+"""
+import os, json, time, types, pickle, importlib
+
+try:
+    import dill as _pickler
+except ImportError:
+    _pickler = pickle
+
+_BASELINE: dict = {}
+reference_path = None  # set by `JupyterSandbox` when a reference store is configured
+
+
+def _user_namespace() -> dict:
+    return get_ipython().user_ns  # noqa: F821 (provided by IPython)
+
+
+def _hidden_names() -> set:
+    return set(getattr(get_ipython(), "user_ns_hidden", {}))  # noqa: F821
+
+
+def mark_baseline():
+    """Remember the objects created by the sandbox setup so snapshots skip them"""
+    _BASELINE.clear()
+    _BASELINE.update({k: v for k, v in _user_namespace().items() if not k.startswith("_")})
+
+
+def _is_user_variable(name: str, value, hidden: set) -> bool:
+    if name.startswith("_") or name in hidden:
+        return False
+    if name in _BASELINE and _BASELINE[name] is value:
+        return False
+    return True
+
+
+def snapshot_namespace(path: str) -> dict:
+    """
+    Serialize the user namespace of the current kernel to `path`
+
+    DataFrames are written as Parquet, modules are recorded by name and every other
+    object goes through dill (or pickle). Objects that cannot be serialized are listed
+    in the manifest so the agent knows what has to be recomputed.
+
+    Parameters:
+    path (str): Directory to write the snapshot to
+
+    Returns:
+    dict: The snapshot manifest
+    """
+    import pandas as pd
+
+    os.makedirs(path, exist_ok=True)
+    manifest = {"created": time.time(), "dataframes": {}, "objects": {}, "modules": {}, "unpicklable": []}
+    hidden = _hidden_names()
+
+    for i, (name, value) in enumerate(list(_user_namespace().items())):
+        if not _is_user_variable(name, value, hidden):
+            continue
+
+        if isinstance(value, types.ModuleType):
+            manifest["modules"][name] = value.__name__
+            continue
+
+        if isinstance(value, pd.DataFrame):
+            file_name = f"{i}.parquet"
+            try:
+                value.to_parquet(os.path.join(path, file_name))
+                manifest["dataframes"][name] = file_name
+                continue
+            except Exception:
+                pass  # e.g. mixed-type object columns, fall back to pickling
+
+        file_name = f"{i}.pkl"
+        try:
+            data = _pickler.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+            with open(os.path.join(path, file_name), "wb") as f:
+                f.write(data)
+            manifest["objects"][name] = file_name
+        except Exception:
+            manifest["unpicklable"].append(name)
+
+    # The manifest is written last so a partially written snapshot is never restored
+    with open(os.path.join(path, "manifest.json"), "w") as f:
+        json.dump(manifest, f)
+    return manifest
+
+
+def restore_namespace(path: str) -> dict:
+    """
+    Load a snapshot written by `snapshot_namespace` into the current kernel
+
+    Parameters:
+    path (str): Directory containing the snapshot
+
+    Returns:
+    dict: {"restored": [...], "failed": [...], "unpicklable": [...]}
+    """
+    import pandas as pd
+
+    with open(os.path.join(path, "manifest.json")) as f:
+        manifest = json.load(f)
+
+    namespace = _user_namespace()
+    restored, failed = [], []
+
+    for name, module_name in manifest["modules"].items():
+        try:
+            namespace[name] = importlib.import_module(module_name)
+        except Exception:
+            failed.append(name)
+
+    for name, file_name in manifest["dataframes"].items():
+        try:
+            namespace[name] = pd.read_parquet(os.path.join(path, file_name))
+            restored.append(name)
+        except Exception:
+            failed.append(name)
+
+    for name, file_name in manifest["objects"].items():
+        try:
+            with open(os.path.join(path, file_name), "rb") as f:
+                namespace[name] = _pickler.loads(f.read())
+            restored.append(name)
+        except Exception:
+            failed.append(name)
+
+    return {"restored": restored, "failed": failed, "unpicklable": manifest["unpicklable"]}
+
+
+def restore_and_report(path: str):
+    """Restore a snapshot and print a short note for the agent"""
+    summary = restore_namespace(path)
+    lines = []
+    if summary["restored"]:
+        lines.append(f"[sandbox] Session state restored from a previous snapshot: {', '.join(summary['restored'])}")
+    lost = summary["failed"] + summary["unpicklable"]
+    if lost:
+        lines.append(f"[sandbox] These variables could not be restored and need to be recomputed: {', '.join(lost)}")
+    if lines:
+        print("\n".join(lines))
+
+
+def load_arrow(path: str, dtype_backend: str = "numpy", as_table: bool = False):
+    """
+    Memory-map an uncompressed Arrow IPC (Feather v2) file, e.g. the `.arrow` file of a `sql_query` result
+
+    The file is not parsed or copied into the kernel: the columns point into the page
+    cache, which is shared by every kernel that maps the same file.
+
+    Parameters:
+    path (str): Path of the Arrow file
+    dtype_backend (str): "numpy" converts to NumPy dtypes (zero-copy for numeric columns without nulls),
+        "pyarrow" keeps every column Arrow-backed (zero-copy for all columns)
+    as_table (bool): Return the `pyarrow.Table` instead of a DataFrame
+
+    Returns:
+    pandas.DataFrame or pyarrow.Table
+    """
+    import pyarrow as pa
+    import pandas as pd
+
+    with pa.memory_map(path, "r") as source:
+        table = pa.ipc.open_file(source).read_all()
+
+    if as_table:
+        return table
+    if dtype_backend == "pyarrow":
+        return table.to_pandas(types_mapper=pd.ArrowDtype)
+    return table.to_pandas(split_blocks=True)
+
+
+def _reference_index() -> dict:
+    if reference_path is None:
+        raise RuntimeError("No reference data store is configured for this sandbox")
+    try:
+        with open(os.path.join(reference_path, "index.json")) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def list_references():
+    """
+    List the shared reference tables available to this kernel
+
+    Returns:
+    pandas.DataFrame: name, source, columns and originating SQL query of every table
+    """
+    import pandas as pd
+
+    index = _reference_index()
+    return pd.DataFrame([
+        {"name": name, "source": entry["source"], "columns": ", ".join(entry["columns"]), "query": entry.get("query")}
+        for name, entry in index.items()
+    ], columns=["name", "source", "columns", "query"])
+
+
+def load_reference(name: str, dtype_backend: str = "pyarrow", as_table: bool = False):
+    """
+    Attach a shared reference table read-only
+
+    All kernels map the same file, so the table is stored once in memory no matter how
+    many sessions use it. Copy it (`df.copy()`) before modifying it in place.
+
+    Parameters:
+    name (str): Name of the table (see `list_references()`)
+    dtype_backend (str): "pyarrow" (no copy) or "numpy" (see `load_arrow`)
+    as_table (bool): Return the `pyarrow.Table` instead of a DataFrame
+    """
+    index = _reference_index()
+    if name not in index:
+        raise KeyError(f"Unknown reference table: {name}. Available: {list(index)}")
+    return load_arrow(os.path.join(reference_path, index[name]["file"]), dtype_backend=dtype_backend, as_table=as_table)
+
+
+def _exchange_path(name: str) -> str:
+    """Temporary Arrow file for a cross-language hand-off (in shared memory when available)"""
+    import uuid, tempfile
+
+    exchange_dir = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+    return os.path.join(exchange_dir, f"sciscigpt-{name}-{uuid.uuid4().hex}.arrow")
+
+
+def _write_arrow(df, path: str):
+    import pyarrow as pa
+    import pyarrow.feather as feather
+
+    table = df if isinstance(df, pa.Table) else pa.Table.from_pandas(df, preserve_index=False)
+    feather.write_feather(table, path, compression="uncompressed")
+
+
+def to_r(df, name: str, as_data_frame: bool = True):
+    """
+    Move a pandas DataFrame (or pyarrow Table) into the R session as `name` through an Arrow buffer
+
+    Parameters:
+    df: pandas.DataFrame or pyarrow.Table
+    name (str): Name of the R variable
+    as_data_frame (bool): Convert to an R data.frame (False keeps a memory-mapped Arrow Table)
+    """
+    from rpy2 import robjects
+
+    path = _exchange_path(name)
+    _write_arrow(df, path)
+    try:
+        robjects.r(f'{name} <- arrow::read_feather("{path}", mmap = TRUE, as_data_frame = {"TRUE" if as_data_frame else "FALSE"})')
+    finally:
+        os.remove(path)  # an existing mapping stays valid after unlinking
+
+
+def from_r(name: str, dtype_backend: str = "numpy"):
+    """Return the R data.frame (or Arrow Table) `name` as a pandas DataFrame through an Arrow buffer"""
+    from rpy2 import robjects
+
+    path = _exchange_path(name)
+    try:
+        robjects.r(f'arrow::write_feather({name}, "{path}", compression = "uncompressed")')
+        return load_arrow(path, dtype_backend=dtype_backend)
+    finally:
+        os.remove(path)
+
+
+def to_julia(df, name: str):
+    """Move a pandas DataFrame (or pyarrow Table) into Julia `Main` as the DataFrame `name` through an Arrow buffer"""
+    from juliacall import Main as jl
+
+    path = _exchange_path(name)
+    _write_arrow(df, path)
+    try:
+        jl.seval(f'using Arrow, DataFrames; {name} = DataFrame(Arrow.Table("{path}"); copycols = false)')
+    finally:
+        os.remove(path)
+
+
+def from_julia(name: str, dtype_backend: str = "numpy"):
+    """Return the Julia table `name` as a pandas DataFrame through an Arrow buffer"""
+    from juliacall import Main as jl
+
+    path = _exchange_path(name)
+    try:
+        jl.seval(f'using Arrow; Arrow.write("{path}", {name})')
+        return load_arrow(path, dtype_backend=dtype_backend)
+    finally:
+        os.remove(path)
+
+
+def register_magics():
+    """
+    Register the `%to_r`, `%from_r`, `%to_julia` and `%from_julia` line magics
+
+    `%to_r df [r_name]` / `%to_julia df [jl_name]` send a Python DataFrame,
+    `%from_r r_name [py_name]` / `%from_julia jl_name [py_name]` fetch a table back.
+    """
+    ip = get_ipython()  # noqa: F821
+
+    def _parse(line: str):
+        args = line.split()
+        if not args:
+            raise ValueError("Usage: %magic source_name [target_name]")
+        return args[0], args[1] if len(args) > 1 else args[0]
+
+    def to_r_magic(line):
+        source, target = _parse(line)
+        to_r(ip.user_ns[source], target)
+
+    def from_r_magic(line):
+        source, target = _parse(line)
+        ip.user_ns[target] = from_r(source)
+
+    def to_julia_magic(line):
+        source, target = _parse(line)
+        to_julia(ip.user_ns[source], target)
+
+    def from_julia_magic(line):
+        source, target = _parse(line)
+        ip.user_ns[target] = from_julia(source)
+
+    ip.register_magic_function(to_r_magic, "line", "to_r")
+    ip.register_magic_function(from_r_magic, "line", "from_r")
+    ip.register_magic_function(to_julia_magic, "line", "to_julia")
+    ip.register_magic_function(from_julia_magic, "line", "from_julia")
+
+
+def benchmark_exchange(n_rows: int = 1_000_000, repeat: int = 3):
+    """
+    Compare the Arrow hand-off with the default rpy2 / juliacall conversions
+
+    Parameters:
+    n_rows (int): Rows of the synthetic table (int, float, string and bool columns)
+    repeat (int): Runs per method (the best run is reported)
+
+    Returns:
+    pandas.DataFrame: Seconds per direction and method
+    """
+    import numpy as np
+    import pandas as pd
+
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({
+        "paper_id": np.arange(n_rows, dtype="int64"),
+        "citations": rng.poisson(10, n_rows).astype("float64"),
+        "field": rng.choice(["Physics", "Biology", "Economics", "Sociology"], n_rows),
+        "is_oa": rng.random(n_rows) < 0.5,
+    })
+
+    def best_of(func):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - start)
+        return min(timings)
+
+    results = []
+
+    try:
+        from rpy2 import robjects
+        from rpy2.robjects import pandas2ri, conversion, default_converter
+
+        def rpy2_to_r():
+            with (default_converter + pandas2ri.converter).context():
+                robjects.globalenv["bench_df"] = conversion.get_conversion().py2rpy(df)
+
+        def rpy2_from_r():
+            with (default_converter + pandas2ri.converter).context():
+                conversion.get_conversion().rpy2py(robjects.globalenv["bench_df"])
+
+        results += [
+            {"direction": "Python -> R", "method": "rpy2 pandas2ri", "seconds": best_of(rpy2_to_r)},
+            {"direction": "Python -> R", "method": "Arrow", "seconds": best_of(lambda: to_r(df, "bench_df"))},
+            {"direction": "R -> Python", "method": "rpy2 pandas2ri", "seconds": best_of(rpy2_from_r)},
+            {"direction": "R -> Python", "method": "Arrow", "seconds": best_of(lambda: from_r("bench_df"))},
+        ]
+        robjects.r("rm(bench_df)")
+    except ImportError:
+        pass
+
+    try:
+        from juliacall import Main as jl
+
+        jl.seval("using DataFrames, PythonCall")
+        py_to_julia = jl.seval("x -> DataFrame(PyTable(x))")
+        julia_to_py = jl.seval("x -> pytable(x, :pandas)")
+
+        def juliacall_to_julia():
+            jl.bench_df = py_to_julia(df)
+
+        results += [
+            {"direction": "Python -> Julia", "method": "juliacall PyTable", "seconds": best_of(juliacall_to_julia)},
+            {"direction": "Python -> Julia", "method": "Arrow", "seconds": best_of(lambda: to_julia(df, "bench_df"))},
+            {"direction": "Julia -> Python", "method": "juliacall pytable", "seconds": best_of(lambda: julia_to_py(jl.bench_df))},
+            {"direction": "Julia -> Python", "method": "Arrow", "seconds": best_of(lambda: from_julia("bench_df"))},
+        ]
+    except ImportError:
+        pass
+
+    return pd.DataFrame(results)
+
+
+if __name__ == "__main__":
+    print(benchmark_exchange().to_string(index=False))
@@ -0,0 +1,337 @@
+from jupyter_client import KernelManager, BlockingKernelClient
+from multiprocessing.connection import Listener, Client
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Dict, Optional
+import os, sys, time, uuid, signal, socket, threading, subprocess, argparse
+
+from func.resources import ResourceLimits, usage
+
+
+class KernelProvider(ABC):
+    """
+    Starts and stops the kernels behind `JupyterSandbox`
+
+    A started kernel is a dict that holds at least the kernel client `kc` (with
+    channels started and the kernel ready) and the `host` it runs on. Everything
+    else in the dict is private to the provider.
+    """
+
+    @abstractmethod
+    def start_kernel(self, kernel_name: str = None, session_id: str = None) -> Dict:
+        """Start a kernel (for `session_id`, if given) and wait until it is ready"""
+
+    @abstractmethod
+    def shutdown_kernel(self, kernel: Dict):
+        """Stop a kernel returned by `start_kernel`"""
+
+    def usage(self, kernel: Dict) -> Dict:
+        """CPU seconds and memory (current and peak RSS) used by a kernel since it started"""
+        return {}
+
+    def preferred_host(self, session_id: str) -> Optional[str]:
+        """Host a session should preferably run on (None if any host is fine)"""
+        return None
+
+    def bind(self, session_id: str, kernel: Dict):
+        """Record that `session_id` now runs on `kernel` (used for session affinity)"""
+        pass
+
+    def close(self):
+        pass
+
+
+class LocalKernelProvider(KernelProvider):
+    def __init__(self, limits: ResourceLimits = None):
+        """
+        Runs kernels as child processes of the current process
+
+        Parameters:
+        limits (ResourceLimits): CPU/memory/process limits applied to every kernel (none if None)
+        """
+        self.limits = limits
+
+    def launch(self, kernel_name: str = None, ip: str = None) -> tuple[KernelManager, Dict]:
+        """Start a kernel process under the resource limits, returns the manager and the resource handle"""
+        km = KernelManager(kernel_name=kernel_name) if kernel_name else KernelManager()
+        if ip:
+            km.ip = ip
+        km.start_kernel()
+
+        pid = km.provisioner.pid
+        try:
+            resources = self.limits.apply(pid) if self.limits else {"pid": pid, "cgroup": None}
+        except Exception:
+            km.shutdown_kernel(now=True)
+            raise
+        return km, resources
+
+    def start_kernel(self, kernel_name: str = None, session_id: str = None) -> Dict:
+        km, resources = self.launch(kernel_name)
+        kc = km.client()
+        kc.start_channels()
+        # Wait for kernel to be ready
+        kc.wait_for_ready()
+        return {'km': km, 'kc': kc, 'host': 'localhost', 'resources': resources}
+
+    def shutdown_kernel(self, kernel: Dict):
+        kernel['kc'].stop_channels()
+        kernel['km'].shutdown_kernel()
+        if self.limits:
+            self.limits.release(kernel['resources'])
+
+    def usage(self, kernel: Dict) -> Dict:
+        return usage(kernel['resources'])
+
+
+class KernelWorker:
+    def __init__(self, address: tuple, authkey: bytes, kernel_ip: str = "127.0.0.1", limits: ResourceLimits = None):
+        """
+        Worker process that launches kernels on its host for a `RemoteKernelProvider`
+
+        The API server talks to the kernels directly over the Jupyter kernel protocol
+        (ZMQ); the worker only starts, stops and reports on them. Kernels use the same
+        working directory path as the API server, so it must be on shared storage.
+
+        Parameters:
+        address (tuple): (host, port) the worker listens on
+        authkey (bytes): Shared secret for the control connection
+        kernel_ip (str): Interface the kernels bind to (loopback by default; use an interface the
+            API server can reach when the worker runs on another host)
+        limits (ResourceLimits): Resource limits of the kernels on this worker
+        """
+        self.address = address
+        self.authkey = authkey
+        self.kernel_ip = kernel_ip
+        self.provider = LocalKernelProvider(limits)
+        self.kernels: Dict[str, tuple[KernelManager, Dict]] = {}
+        self.lock = threading.Lock()
+
+    def handle(self, request: tuple):
+        op, *args = request
+
+        if op == "start":
+            km, resources = self.provider.launch(args[0], ip=self.kernel_ip)
+            kernel_id = str(uuid.uuid4())
+            with self.lock:
+                self.kernels[kernel_id] = (km, resources)
+            return {"kernel_id": kernel_id, "connection_info": km.get_connection_info()}
+
+        elif op == "shutdown":
+            with self.lock:
+                km, resources = self.kernels.pop(args[0], (None, None))
+            if km is not None:
+                km.shutdown_kernel(now=True)
+                if self.provider.limits:
+                    self.provider.limits.release(resources)
+            return True
+
+        elif op == "usage":
+            with self.lock:
+                _, resources = self.kernels.get(args[0], (None, None))
+            return usage(resources) if resources else {}
+
+        elif op == "load":
+            with self.lock:
+                n_kernels = len(self.kernels)
+            return {"kernels": n_kernels, "cpus": os.cpu_count() or 1, "loadavg": os.getloadavg()[0]}
+
+        raise ValueError(f"Unknown request: {op}")
+
+    def _serve_connection(self, conn):
+        with conn:
+            try:
+                request = conn.recv()
+                try:
+                    conn.send(("ok", self.handle(request)))
+                except Exception as e:
+                    conn.send(("error", "{}: {}".format(type(e).__name__, str(e))))
+            except EOFError:
+                pass
+
+    def close(self):
+        """Shut down every kernel started by this worker"""
+        with self.lock:
+            kernel_ids = list(self.kernels)
+        for kernel_id in kernel_ids:
+            self.handle(("shutdown", kernel_id))
+
+    def serve_forever(self):
+        try:
+            with Listener(self.address, authkey=self.authkey) as listener:
+                while True:
+                    conn = listener.accept()
+                    threading.Thread(target=self._serve_connection, args=(conn,), daemon=True).start()
+        finally:
+            self.close()
+
+
+class RemoteKernelProvider(KernelProvider):
+    def __init__(self, workers: list[tuple], authkey: bytes, timeout: float = 60, load_ttl: float = 2.0, max_affinity: int = 10_000):
+        """
+        Runs kernels on a pool of `KernelWorker` hosts
+
+        New sessions are placed on the least-loaded worker; a session that comes back
+        (e.g. after eviction) is placed on the worker it ran on before if it is alive.
+        Worker loads are polled at most once per `load_ttl` seconds, and kernels started
+        or stopped in between are counted locally. Only the `max_affinity` most recently
+        bound sessions remember their worker.
+
+        Parameters:
+        workers (list): (host, port) addresses of the workers
+        authkey (bytes): Shared secret for the worker control connections
+        timeout (float): Seconds to wait for a remote kernel to become ready
+        load_ttl (float): Seconds a polled worker load is reused for placement
+        max_affinity (int): Maximum number of sessions whose worker is remembered
+        """
+        self.workers = [tuple(w) for w in workers]
+        self.authkey = authkey
+        self.timeout = timeout
+        self.load_ttl = load_ttl
+        self.max_affinity = max_affinity
+        self.affinity: OrderedDict[str, tuple] = OrderedDict()
+        self.loads: Dict[tuple, dict] = {}
+        self.loads_time = 0.0
+        self.lock = threading.Lock()
+
+    def _call(self, worker: tuple, *request):
+        with Client(worker, authkey=self.authkey) as conn:
+            conn.send(request)
+            status, result = conn.recv()
+        if status != "ok":
+            raise RuntimeError(f"Kernel worker {worker[0]}:{worker[1]} failed: {result}")
+        return result
+
+    def load(self) -> Dict[tuple, dict]:
+        """Current load of every reachable worker"""
+        loads = {}
+        for worker in self.workers:
+            try:
+                loads[worker] = self._call(worker, "load")
+            except (OSError, EOFError, RuntimeError):
+                continue
+        return loads
+
+    def _recent_load(self) -> Dict[tuple, dict]:
+        """Worker loads, polled again only if the last poll is older than `load_ttl`"""
+        with self.lock:
+            if time.time() - self.loads_time < self.load_ttl:
+                return {worker: dict(load) for worker, load in self.loads.items()}
+        loads = self.load()
+        with self.lock:
+            self.loads, self.loads_time = loads, time.time()
+            return {worker: dict(load) for worker, load in loads.items()}
+
+    def _count_kernel(self, worker: tuple, delta: int):
+        with self.lock:
+            if worker in self.loads:
+                self.loads[worker]["kernels"] = max(self.loads[worker]["kernels"] + delta, 0)
+
+    def _select_worker(self, session_id: str = None) -> tuple:
+        loads = self._recent_load()
+        if not loads:
+            with self.lock:
+                self.loads_time = 0.0
+            raise RuntimeError("No kernel worker is reachable")
+
+        with self.lock:
+            preferred = self.affinity.get(session_id)
+        if preferred in loads:
+            return preferred
+        return min(loads, key=lambda w: (loads[w]["kernels"] / loads[w]["cpus"], loads[w]["loadavg"] / loads[w]["cpus"]))
+
+    def start_kernel(self, kernel_name: str = None, session_id: str = None) -> Dict:
+        worker = self._select_worker(session_id)
+        try:
+            started = self._call(worker, "start", kernel_name)
+        except (OSError, EOFError):
+            # The worker went away since the last poll
+            with self.lock:
+                self.loads_time = 0.0
+            raise
+        self._count_kernel(worker, 1)
+
+        connection_info = dict(started["connection_info"])
+        connection_info["ip"] = socket.gethostbyname(worker[0])
+        kc = BlockingKernelClient()
+        kc.load_connection_info(connection_info)
+        kc.start_channels()
+        kc.wait_for_ready(timeout=self.timeout)
+
+        kernel = {'kc': kc, 'kernel_id': started["kernel_id"], 'worker': worker, 'host': f"{worker[0]}:{worker[1]}"}
+        if session_id is not None:
+            self.bind(session_id, kernel)
+        return kernel
+
+    def shutdown_kernel(self, kernel: Dict):
+        kernel['kc'].stop_channels()
+        self._call(kernel['worker'], "shutdown", kernel['kernel_id'])
+        self._count_kernel(kernel['worker'], -1)
+
+    def usage(self, kernel: Dict) -> Dict:
+        return self._call(kernel['worker'], "usage", kernel['kernel_id'])
+
+    def preferred_host(self, session_id: str) -> Optional[str]:
+        with self.lock:
+            worker = self.affinity.get(session_id)
+        return f"{worker[0]}:{worker[1]}" if worker else None
+
+    def bind(self, session_id: str, kernel: Dict):
+        with self.lock:
+            self.affinity[session_id] = kernel['worker']
+            self.affinity.move_to_end(session_id)
+            while len(self.affinity) > self.max_affinity:
+                self.affinity.popitem(last=False)
+
+
+class LocalMultiProcessKernelProvider(RemoteKernelProvider):
+    def __init__(self, n_workers: int = 2, base_port: int = 9500, authkey: bytes = None):
+        """
+        `RemoteKernelProvider` backed by worker processes on this machine
+
+        Stands in for a pool of worker hosts in tests and local development.
+
+        Parameters:
+        n_workers (int): Number of worker processes to spawn
+        base_port (int): Port of the first worker (the others use the following ports)
+        authkey (bytes): Shared secret (random if None)
+        """
+        authkey = authkey or os.urandom(16)
+        workers = [("127.0.0.1", base_port + i) for i in range(n_workers)]
+        super().__init__(workers, authkey)
+
+        backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        env = os.environ | {"SANDBOX_WORKER_AUTHKEY": authkey.hex()}
+        self.processes = [
+            subprocess.Popen(
+                [sys.executable, "-m", "func.kernels", "--host", host, "--port", str(port), "--kernel-ip", "127.0.0.1"],
+                cwd=backend_dir, env=env)
+            for host, port in workers
+        ]
+
+        # Wait until every worker accepts connections
+        deadline = time.time() + 30
+        while len(self.load()) < n_workers:
+            if time.time() > deadline:
+                self.close()
+                raise RuntimeError("Local kernel workers failed to start")
+            time.sleep(0.2)
+
+    def close(self):
+        # Workers shut their kernels down on SIGTERM
+        for process in self.processes:
+            process.terminate()
+        for process in self.processes:
+            process.wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a sandbox kernel worker")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9500)
+    parser.add_argument("--kernel-ip", default="127.0.0.1", help="Interface the kernels bind to (must be reachable from the API server)")
+    args = parser.parse_args()
+
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    authkey = bytes.fromhex(os.environ["SANDBOX_WORKER_AUTHKEY"])
+    KernelWorker((args.host, args.port), authkey, kernel_ip=args.kernel_ip, limits=ResourceLimits.from_env()).serve_forever()
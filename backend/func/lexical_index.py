@@ -0,0 +1,151 @@
+import os, re, json, argparse
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+from func.local_index import MetadataFilter
+
+
+STOPWORDS = set("""
+a an and are as at be but by can do does for from has have how i in into is it its of on or our
+should such that the their them there these they this to was we were what when which who will with
+would you your about also more most other than then all any each between both
+""".split())
+
+def tokenize(text: str) -> List[str]:
+    return [token for token in re.findall(r"\w+", text.lower()) if token not in STOPWORDS]
+
+
+class BM25Index:
+    def __init__(self, path: str, k1: float = 1.5, b: float = 0.75, store=None):
+        """
+        On-disk BM25 inverted index over corpus sections
+
+        Postings (document ids and term frequencies, grouped by term) are memory-mapped
+        numpy arrays, so only the vocabulary and the section records are held in memory.
+        Metadata filters use the same Pinecone-style syntax as the vector stores.
+
+        Parameters:
+        path (str): Index directory (see `build`)
+        k1 (float): BM25 term-frequency saturation
+        b (float): BM25 length normalization
+        store (LocalVectorStore): Local replica the index was built from; its section
+            records and metadata filter are shared instead of loading a second copy
+        """
+        self.path = path
+        self.k1 = k1
+        self.b = b
+
+        with open(os.path.join(path, "vocab.json")) as f:
+            self.vocab: Dict[str, list] = json.load(f)
+        self.doc_ids = np.load(os.path.join(path, "doc_ids.npy"), mmap_mode="r")
+        self.tfs = np.load(os.path.join(path, "tfs.npy"), mmap_mode="r")
+        self.doc_len = np.load(os.path.join(path, "doc_len.npy"))
+        self.avg_len = float(self.doc_len.mean()) if len(self.doc_len) else 0.0
+
+        if store is not None:
+            if len(store.texts) != len(self.doc_len):
+                raise ValueError(f"The lexical index has {len(self.doc_len)} sections, the local replica {len(store.texts)}")
+            self.texts, self.metadata, self.filter = store.texts, store.metadata, store.filter
+            return
+
+        self.texts, self.metadata = [], []
+        with open(os.path.join(path, "records.jsonl")) as f:
+            for line in f:
+                record = json.loads(line)
+                self.texts.append(record["text"])
+                self.metadata.append(record["metadata"])
+        self.filter = MetadataFilter(self.metadata)
+
+    @staticmethod
+    def build(path: str, texts: List[str], metadata: List[dict]):
+        """Write an index directory from section texts and metadata (rows in the same order)"""
+        os.makedirs(path, exist_ok=True)
+        postings: Dict[str, list] = defaultdict(list)
+        doc_len = np.zeros(len(texts), dtype=np.int32)
+        for doc_id, text in enumerate(texts):
+            counts = Counter(tokenize(text))
+            doc_len[doc_id] = sum(counts.values())
+            for term, tf in counts.items():
+                postings[term].append((doc_id, tf))
+
+        vocab, doc_ids, tfs, offset = {}, [], [], 0
+        for term in sorted(postings):
+            entries = postings[term]
+            vocab[term] = [offset, offset + len(entries)]
+            doc_ids.extend(doc_id for doc_id, _ in entries)
+            tfs.extend(min(tf, 65535) for _, tf in entries)
+            offset += len(entries)
+
+        np.save(os.path.join(path, "doc_ids.npy"), np.array(doc_ids, dtype=np.int32))
+        np.save(os.path.join(path, "tfs.npy"), np.array(tfs, dtype=np.uint16))
+        np.save(os.path.join(path, "doc_len.npy"), doc_len)
+        with open(os.path.join(path, "vocab.json"), "w") as f:
+            json.dump(vocab, f)
+        with open(os.path.join(path, "records.jsonl"), "w") as f:
+            for text, entry in zip(texts, metadata):
+                f.write(json.dumps({"text": text, "metadata": entry}) + "\n")
+
+    def search(self, query: str, k: int = 10, filter: Optional[dict] = None) -> List[Tuple[int, float]]:
+        """Row ids and BM25 scores of the `k` best-matching sections that match `filter`"""
+        n_docs = len(self.doc_len)
+        scores = np.zeros(n_docs, dtype=np.float32)
+        for term in set(tokenize(query)):
+            if term not in self.vocab:
+                continue
+            start, end = self.vocab[term]
+            doc_ids = self.doc_ids[start:end]
+            tf = self.tfs[start:end].astype(np.float32)
+            idf = np.log(1 + (n_docs - (end - start) + 0.5) / ((end - start) + 0.5))
+            norm = self.k1 * (1 - self.b + self.b * self.doc_len[doc_ids] / self.avg_len)
+            scores[doc_ids] += idf * tf * (self.k1 + 1) / (tf + norm)
+
+        mask = self.filter.mask(filter)
+        if mask is not None:
+            scores[~mask] = 0
+        matched = np.flatnonzero(scores > 0)
+        if len(matched) == 0:
+            return []
+        top = matched[np.argsort(-scores[matched], kind="stable")[:k]]
+        return [(int(row), float(scores[row])) for row in top]
+
+    def similarity_search_with_score(self, query: str, k: int = 10, filter: Optional[dict] = None) -> List[Tuple[Document, float]]:
+        return [
+            (Document(page_content=self.texts[row], metadata=self.metadata[row]), score)
+            for row, score in self.search(query, k=k, filter=filter)
+        ]
+
+
+def reciprocal_rank_fusion(rankings: List[List[Document]], k: int = None, c: int = 60) -> List[Document]:
+    """
+    Merge ranked lists of sections with reciprocal-rank fusion (score = sum of 1 / (c + rank))
+
+    Sections are identified by (url, section_id), falling back to their text.
+    Returns the `k` best sections (all if None).
+    """
+    scores: Dict[tuple, float] = defaultdict(float)
+    documents: Dict[tuple, Document] = {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking):
+            key = (doc.metadata.get("url"), doc.metadata.get("section_id")) if "url" in doc.metadata else (doc.page_content,)
+            scores[key] += 1 / (c + rank + 1)
+            documents.setdefault(key, doc)
+    ranked = sorted(scores, key=scores.get, reverse=True)
+    return [documents[key] for key in ranked[:k]]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build a BM25 index over the sections of a local SciSciCorpus replica")
+    parser.add_argument("--replica", default=os.getenv("SCISCICORPUS_LOCAL_PATH"), help="Replica directory (see func.local_index)")
+    parser.add_argument("--path", default=os.getenv("SCISCICORPUS_LEXICAL_PATH"))
+    args = parser.parse_args()
+
+    texts, metadata = [], []
+    with open(os.path.join(args.replica, "records.jsonl")) as f:
+        for line in f:
+            record = json.loads(line)
+            texts.append(record["text"])
+            metadata.append(record["metadata"])
+    BM25Index.build(args.path, texts, metadata)
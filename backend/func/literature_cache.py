@@ -0,0 +1,74 @@
+import re, json, threading
+from typing import Any, Dict, Optional
+
+from cachetools import TTLCache
+
+
+class LiteratureCache:
+    def __init__(self, maxsize: int = 1024, retrieval_ttl: float = 24 * 3600, summary_ttl: float = 24 * 3600, corpus_version: str = ""):
+        """
+        Two-level cache of `search_literature` results
+
+        - retrieval: formatted search results, keyed on the normalized HyDE sections,
+          the search constraints and the retrieval settings
+        - summary: final literature reviews, keyed on the normalized query, the search
+          constraints, the retrieval settings and the model
+
+        Retrieval settings are everything besides the query that changes which sections
+        reach the summary, e.g. k, HyDE, hybrid search and the context token budget.
+
+        Keys include the corpus version, so `invalidate` (called when the corpus index
+        is updated) makes every earlier entry unreachable as well as clearing the caches.
+
+        Parameters:
+        maxsize (int): Maximum number of entries per level
+        retrieval_ttl (float): Seconds a retrieval result stays valid
+        summary_ttl (float): Seconds a summary stays valid
+        corpus_version (str): Version of the corpus index
+        """
+        self.retrieval = TTLCache(maxsize=maxsize, ttl=retrieval_ttl)
+        self.summary = TTLCache(maxsize=maxsize, ttl=summary_ttl)
+        self.corpus_version = corpus_version
+        self.lock = threading.Lock()
+        self.counts = {"retrieval": {"hits": 0, "misses": 0}, "summary": {"hits": 0, "misses": 0}}
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        return re.sub(r"\s+", " ", text).strip().lower()
+
+    @staticmethod
+    def _canonical(value: dict) -> str:
+        return json.dumps(value, sort_keys=True, default=str)
+
+    def retrieval_key(self, hypo_ys: list[str], search_constraints: dict, settings: dict) -> tuple:
+        return (self.corpus_version, tuple(self.normalize(y) for y in hypo_ys),
+                self._canonical(search_constraints), self._canonical(settings))
+
+    def summary_key(self, query: str, search_constraints: dict, settings: dict, model: str) -> tuple:
+        return (self.corpus_version, self.normalize(query),
+                self._canonical(search_constraints), self._canonical(settings), model)
+
+    def get(self, level: str, key: tuple) -> Optional[Any]:
+        cache = getattr(self, level)
+        with self.lock:
+            value = cache.get(key)
+            self.counts[level]["hits" if value is not None else "misses"] += 1
+        return value
+
+    def put(self, level: str, key: tuple, value: Any):
+        with self.lock:
+            getattr(self, level)[key] = value
+
+    def invalidate(self, corpus_version: str = None):
+        """Drop all cached results, e.g. after the corpus index was updated"""
+        with self.lock:
+            self.retrieval.clear()
+            self.summary.clear()
+            if corpus_version is not None:
+                self.corpus_version = corpus_version
+
+    def stats(self) -> Dict:
+        with self.lock:
+            return {"corpus_version": self.corpus_version} | {
+                level: counts | {"size": len(getattr(self, level))} for level, counts in self.counts.items()
+            }
@@ -0,0 +1,204 @@
+import re, time
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+
+def dict_to_bibtex(entry: Dict) -> str:
+    """
+    Render one entry as BibTeX
+
+    Produces the same text as bibtexparser's `BibTexWriter` with a tab indent and no
+    entry ordering: `ENTRYTYPE` and `ID` form the key line, the other fields follow in
+    alphabetical order, lists are joined with ", " and all values are braced strings.
+    """
+    fields = "".join(
+        f",\n\t{field} = {{{', '.join(value) if type(value) == list else value}}}"
+        for field, value in sorted(entry.items())
+        if field not in ("ENTRYTYPE", "ID")
+    )
+    return f"@{entry['ENTRYTYPE']}{{{entry['ID']}{fields}\n}}\n"
+
+
+def group_sections(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Merge the retrieved sections of each paper into one row
+
+    Rows are ordered by url and section id. Texts are joined with newlines and section
+    ids are listed. The other columns take the first non-null value of the paper. Group
+    boundaries come from one pass over the sorted urls instead of per-group lambdas.
+    """
+    df = df[df["url"].notna()].sort_values(["url", "section_id"])
+    urls = df["url"].to_numpy()
+    starts = np.flatnonzero(np.r_[True, urls[1:] != urls[:-1]]) if len(urls) else np.array([], dtype=int)
+    ends = np.r_[starts[1:], len(urls)].astype(int)
+
+    texts = df["text"].tolist()
+    section_ids = df["section_id"].tolist()
+    grouped = df.drop(columns=["text", "section_id"]).groupby("url", sort=False).first().reset_index()
+    grouped.insert(0, "section_id", [", ".join([str(int(i)) for i in section_ids[s:e]]) for s, e in zip(starts, ends)])
+    grouped.insert(0, "text", ["\n".join(texts[s:e]) for s, e in zip(starts, ends)])
+    return grouped
+
+
+def format_output_df_as_prompt(df: pd.DataFrame) -> List[Dict]:
+    prompt = []
+    for row in df.to_dict("records"):
+        text = row.pop("text")
+        prompt.append({
+            "text": text,
+            "bibtex": dict_to_bibtex(row)
+        })
+    return prompt
+
+
+def format_reference(ref: str) -> Optional[str]:
+    """Markdown line of one <reference> block (None if it has no id or text)"""
+    id_match = re.search(r'<id>(.*?)</id>', ref)
+    ref_text_match = re.search(r'<ref>(.*?)</ref>', ref) 
+    url_match = re.search(r'<url>(.*?)</url>', ref)
+    
+    if id_match and ref_text_match:
+        ref_id = id_match.group(1).strip().replace('[', '').replace(']', '')
+        ref_text = ref_text_match.group(1).strip()
+        ref_url = url_match.group(1).strip() if url_match else ""
+        
+        if ref_url:
+            return f"{ref_id}. [{ref_text}]({ref_url})"
+        else:
+            return f"{ref_id}. {ref_text}"
+    return None
+
+
+class ReviewStreamParser:
+    """
+    Incremental parser of the post-retrieval response
+
+    `feed` returns (section, text) pieces as tokens arrive: the text inside <thinking>
+    and <summary> as it grows, and one formatted line per completed <reference>.
+    """
+    sections = ("thinking", "summary", "references")
+
+    def __init__(self):
+        self.buffer, self.pos, self.section = "", 0, None
+
+    def feed(self, chunk: str) -> list[tuple[str, str]]:
+        self.buffer += chunk
+        pieces = []
+        while True:
+            if self.section is None:
+                starts = [(self.buffer.find(f"<{s}>", self.pos), s) for s in self.sections]
+                starts = [(i, s) for i, s in starts if i >= 0]
+                if not starts:
+                    # Keep enough of the tail to match an opening tag split across chunks
+                    self.pos = max(self.pos, len(self.buffer) - len("<references>"))
+                    return pieces
+                start, self.section = min(starts)
+                self.pos = start + len(self.section) + 2
+
+            elif self.section == "references":
+                end = self.buffer.find("</reference>", self.pos)
+                close = self.buffer.find("</references>", self.pos)
+                if end >= 0 and (close < 0 or end < close):
+                    ref = self.buffer[self.pos:end].split("<reference>")[-1]
+                    formatted_ref = format_reference(ref)
+                    if formatted_ref:
+                        pieces.append(("references", formatted_ref + "\n"))
+                    self.pos = end + len("</reference>")
+                elif close >= 0:
+                    self.pos, self.section = close + len("</references>"), None
+                else:
+                    return pieces
+
+            else:
+                tag = f"</{self.section}>"
+                end = self.buffer.find(tag, self.pos)
+                section = self.section
+                if end >= 0:
+                    text = self.buffer[self.pos:end]
+                    self.pos, self.section = end + len(tag), None
+                else:
+                    # Hold back what could be the start of the closing tag
+                    safe = max(self.pos, len(self.buffer) - len(tag) + 1)
+                    text, self.pos = self.buffer[self.pos:safe], safe
+                if text:
+                    pieces.append((section, text))
+                if end < 0:
+                    return pieces
+
+
+def benchmark(ks=(10, 25, 50, 100, 200), n_queries: int = 4, repeat: int = 5, seed: int = 0) -> List[Dict]:
+    """
+    Compare the formatter with the previous implementation (groupby lambdas and one
+    `BibTexWriter` per row) on synthetic retrieval results of `n_queries` HyDE sections
+    """
+    from bibtexparser.bwriter import BibTexWriter
+    from bibtexparser.bibdatabase import BibDatabase
+
+    def legacy_dict_to_bibtex(entry):
+        entry_2 = {}
+        for k, v in entry.items():
+            if type(v) == list:
+                v = ', '.join(v)
+            entry_2[k] = str(v)
+        db = BibDatabase()
+        db.entries = [entry_2]
+        writer = BibTexWriter()
+        writer.indent = '\t'
+        writer.order_entries_by = None
+        return writer.write(db)
+
+    def legacy(df):
+        df = df.sort_values(['url', 'section_id'])
+        df = df.groupby("url").agg({
+            "text": lambda x: "\n".join(x),
+            "section_id": lambda x: ", ".join([str(int(i)) for i in x])
+        } | {k: "first" for k in df.columns if k not in ["text", "section_id"]}).\
+            reset_index(drop=True)
+        prompt = []
+        for index, row in df.iterrows():
+            row = row.to_dict()
+            text = row.pop('text')
+            prompt.append({"text": text, "bibtex": legacy_dict_to_bibtex(row)})
+        return prompt
+
+    def current(df):
+        return format_output_df_as_prompt(group_sections(df))
+
+    rng = np.random.default_rng(seed)
+    results = []
+    for k in ks:
+        n_rows = k * n_queries
+        papers = rng.integers(0, max(1, n_rows // 2), size=n_rows)
+        df = pd.DataFrame({
+            "ENTRYTYPE": "article",
+            "ID": [f"paper{p}" for p in papers],
+            "url": [f"https://doi.org/10.1000/{p}" for p in papers],
+            "section_id": rng.integers(0, 30, size=n_rows).astype(float),
+            "title": [f"Title of paper {p}" for p in papers],
+            "authors": [[f"Author {p}", f"Author {p + 1}"] for p in papers],
+            "year": 1990 + papers % 35,
+            "venue": [f"Venue {p % 20}" for p in papers],
+            "section_category": rng.choice(["Abstract", "Introduction", "Results"], size=n_rows),
+            "text": [" ".join(["lorem ipsum"] * 150)] * n_rows,
+        })
+
+        assert current(df) == legacy(df)
+        timings = {}
+        for name, fn in [("legacy", legacy), ("current", current)]:
+            start = time.perf_counter()
+            for _ in range(repeat):
+                fn(df)
+            timings[name] = (time.perf_counter() - start) / repeat
+        results.append({
+            "k": k, "rows": n_rows,
+            "legacy_ms": round(timings["legacy"] * 1000, 2),
+            "current_ms": round(timings["current"] * 1000, 2),
+            "speedup": round(timings["legacy"] / timings["current"], 1),
+        })
+    return results
+
+
+if __name__ == "__main__":
+    print(pd.DataFrame(benchmark()).to_string(index=False))
@@ -0,0 +1,259 @@
+import time, queue, asyncio, threading, contextvars
+from collections import defaultdict, deque
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models.chat_models import BaseChatModel, agenerate_from_stream, generate_from_stream
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatGenerationChunk, ChatResult
+
+from func.llm_replay import as_chunk
+from func.llm_scheduler import ScheduledChatModel, child_config, on_admitted
+
+
+# Queue marker of the sync path: the primary was admitted by its scheduler
+ADMITTED = object()
+
+
+class LatencyTracker:
+    def __init__(self, window: int = 1000):
+        """
+        Per-backend latency samples and hedging outcomes
+
+        Keeps the last `window` samples of each metric ("first_token", "total") per
+        backend and reports their percentiles, to tune the hedging threshold.
+        """
+        self.samples = defaultdict(lambda: defaultdict(lambda: deque(maxlen=window)))
+        self.counts = defaultdict(lambda: {"requests": 0, "wins": 0, "hedged": 0, "cancelled": 0, "failed": 0})
+        self.lock = threading.Lock()
+
+    def record(self, backend: str, metric: str, seconds: float):
+        with self.lock:
+            self.samples[backend][metric].append(seconds)
+
+    def count(self, backend: str, event: str):
+        with self.lock:
+            self.counts[backend][event] += 1
+
+    @staticmethod
+    def percentiles(samples) -> Dict:
+        values = sorted(samples)
+        at = lambda q: round(values[min(len(values) - 1, int(round(q * (len(values) - 1))))], 3)
+        return {"n": len(values)} | ({"p50": at(0.5), "p90": at(0.9), "p99": at(0.99)} if values else {})
+
+    def stats(self) -> Dict:
+        with self.lock:
+            return {
+                backend: dict(counts) | {metric: self.percentiles(samples) for metric, samples in self.samples[backend].items()}
+                for backend, counts in self.counts.items()
+            }
+
+
+class HedgedChatModel(BaseChatModel):
+    """
+    Chat model that hedges slow calls on an alternate backend
+
+    The request goes to `primary`. If no first token arrives within `threshold` seconds
+    of the primary's admission by its scheduler (or the primary fails before its first
+    token), the same request is sent to `alternate`; the backend whose first token
+    arrives first is streamed and the other is cancelled. While the primary is queued,
+    or its scope is paused after a rate limit, no hedge is sent. Async calls cancel the losing request outright; sync calls stop
+    reading the losing stream at its next chunk. For non-streaming models the first
+    token is the full response. Both backends run as child runs tagged `BACKEND_TAG`.
+    """
+
+    primary: Any
+    alternate: Any
+    primary_name: str
+    alternate_name: str
+    threshold: float
+    tracker: Any
+
+    @property
+    def _llm_type(self) -> str:
+        return "hedged"
+
+    def bind_tools(self, tools: list, *, tool_choice: Any = None, **kwargs):
+        return self.model_copy(update={
+            "primary": self.primary.bind_tools(tools, tool_choice=tool_choice, **kwargs),
+            "alternate": self.alternate.bind_tools(tools, tool_choice=tool_choice, **kwargs),
+        })
+
+    @property
+    def backends(self) -> Dict[str, Any]:
+        return {self.primary_name: self.primary, self.alternate_name: self.alternate}
+
+    def _won(self, winner: str, started: Dict[str, float], losers: List[str]):
+        self.tracker.count(winner, "wins")
+        self.tracker.record(winner, "first_token", time.perf_counter() - started[winner])
+        for name in losers:
+            self.tracker.count(name, "cancelled")
+
+    def _admission_clock(self) -> bool:
+        """Whether the threshold runs from the primary's admission by its scheduler (else from the call)"""
+        return isinstance(self.primary, ScheduledChatModel)
+
+    def _primary_blocked(self) -> bool:
+        return self._admission_clock() and self.primary.scheduler.blocked(self.primary.scope)
+
+    @staticmethod
+    def _pump(name: str, model: Any, messages: List[BaseMessage], config: dict, stop: Optional[List[str]], kwargs: dict,
+              out: queue.Queue, cancelled: threading.Event):
+        try:
+            for chunk in model.stream(messages, config=config, stop=stop, **kwargs):
+                if cancelled.is_set():
+                    # Leaving the loop closes the stream (and its connection)
+                    return
+                out.put((name, chunk, None))
+            out.put((name, None, None))
+        except Exception as e:
+            out.put((name, None, e))
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs) -> Iterator[ChatGenerationChunk]:
+        out, started, cancelled, errors = queue.Queue(), {}, {}, {}
+
+        def start(name: str):
+            self.tracker.count(name, "requests")
+            started[name], cancelled[name] = time.perf_counter(), threading.Event()
+            # The worker thread runs in a copy of this context, with the admission signal for the primary only
+            context = contextvars.copy_context()
+            context.run(on_admitted.set, (lambda: out.put((name, ADMITTED, None))) if name == self.primary_name else None)
+            threading.Thread(
+                target=context.run,
+                args=(self._pump, name, self.backends[name], messages, child_config(run_manager), stop, kwargs, out, cancelled[name]),
+                daemon=True,
+            ).start()
+
+        start(self.primary_name)
+        admitted_at = None if self._admission_clock() else started[self.primary_name]
+        try:
+            winner = None
+            while winner is None:
+                hedged = self.alternate_name in started
+                timeout = None if hedged or admitted_at is None else max(0.0, self.threshold - (time.perf_counter() - admitted_at))
+                try:
+                    name, chunk, error = out.get(timeout=timeout)
+                except queue.Empty:
+                    if self._primary_blocked():
+                        # Rate limited: a second request now would add load where it hurts most
+                        admitted_at = time.perf_counter()
+                        continue
+                    self.tracker.count(self.primary_name, "hedged")
+                    start(self.alternate_name)
+                    continue
+                if chunk is ADMITTED:
+                    if admitted_at is None:
+                        admitted_at = time.perf_counter()
+                    continue
+                if error is None:
+                    winner = name
+                    continue
+                errors[name] = error
+                self.tracker.count(name, "failed")
+                if not hedged:
+                    start(self.alternate_name)
+                elif len(errors) == len(started):
+                    raise errors[self.primary_name]
+
+            losers = [name for name in started if name != winner and name not in errors]
+            for name in losers:
+                cancelled[name].set()
+            self._won(winner, started, losers)
+
+            while chunk is not None:
+                yield ChatGenerationChunk(message=as_chunk(chunk))
+                name, chunk, error = out.get()
+                while name != winner or chunk is ADMITTED:
+                    name, chunk, error = out.get()
+                if error is not None:
+                    raise error
+            self.tracker.record(winner, "total", time.perf_counter() - started[winner])
+        finally:
+            for event in cancelled.values():
+                event.set()
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager: Optional[AsyncCallbackManagerForLLMRun] = None, **kwargs) -> AsyncIterator[ChatGenerationChunk]:
+        streams, firsts, started, errors = {}, {}, {}, {}
+        loop, admitted = asyncio.get_running_loop(), asyncio.Event()
+
+        def start(name: str):
+            self.tracker.count(name, "requests")
+            started[name] = time.perf_counter()
+            streams[name] = self.backends[name].astream(messages, config=child_config(run_manager), stop=stop, **kwargs)
+            # The task copies the context at creation, with the admission signal for the primary only
+            token = on_admitted.set((lambda: loop.call_soon_threadsafe(admitted.set)) if name == self.primary_name else None)
+            try:
+                firsts[name] = asyncio.ensure_future(anext(streams[name]))
+            finally:
+                on_admitted.reset(token)
+
+        async def cancel(name: str):
+            firsts[name].cancel()
+            await asyncio.gather(firsts[name], return_exceptions=True)
+            await streams[name].aclose()
+
+        start(self.primary_name)
+        admitted_at = None if self._admission_clock() else started[self.primary_name]
+        admission = asyncio.ensure_future(admitted.wait())
+        try:
+            winner, chunk = None, None
+            while winner is None:
+                hedged = self.alternate_name in started
+                timeout = None if hedged or admitted_at is None else max(0.0, self.threshold - (time.perf_counter() - admitted_at))
+                waiting = [future for name, future in firsts.items() if name not in errors]
+                done, _ = await asyncio.wait(
+                    waiting + ([admission] if admitted_at is None and not hedged else []),
+                    timeout=timeout, return_when=asyncio.FIRST_COMPLETED,
+                )
+                if not done:
+                    if self._primary_blocked():
+                        # Rate limited: a second request now would add load where it hurts most
+                        admitted_at = time.perf_counter()
+                        continue
+                    self.tracker.count(self.primary_name, "hedged")
+                    start(self.alternate_name)
+                    continue
+                if admission in done and admitted_at is None:
+                    admitted_at = time.perf_counter()
+                for name, future in firsts.items():
+                    if future not in done:
+                        continue
+                    error = future.exception()
+                    if error is None or isinstance(error, StopAsyncIteration):
+                        winner, chunk = name, future.result() if error is None else None
+                        break
+                    errors[name] = error
+                    self.tracker.count(name, "failed")
+                if winner is None and any(future in done for future in firsts.values()):
+                    if not hedged:
+                        start(self.alternate_name)
+                    elif len(errors) == len(started):
+                        raise errors[self.primary_name]
+
+            losers = [name for name in started if name != winner and name not in errors]
+            for name in losers:
+                await cancel(name)
+            self._won(winner, started, losers)
+
+            if chunk is not None:
+                yield ChatGenerationChunk(message=as_chunk(chunk))
+                async for chunk in streams[winner]:
+                    yield ChatGenerationChunk(message=as_chunk(chunk))
+            self.tracker.record(winner, "total", time.perf_counter() - started[winner])
+        finally:
+            admission.cancel()
+            for name, future in firsts.items():
+                if not future.done():
+                    await cancel(name)
+            for stream in streams.values():
+                await stream.aclose()
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs) -> ChatResult:
+        return generate_from_stream(self._stream(messages, stop=stop, run_manager=run_manager, **kwargs))
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Optional[AsyncCallbackManagerForLLMRun] = None, **kwargs) -> ChatResult:
+        return await agenerate_from_stream(self._astream(messages, stop=stop, run_manager=run_manager, **kwargs))
@@ -0,0 +1,284 @@
+import os, re, json, time, sqlite3, hashlib, logging, threading
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import (
+    AIMessage, AIMessageChunk, BaseMessage, BaseMessageChunk, ToolMessage,
+    message_chunk_to_message, message_to_dict, messages_from_dict,
+)
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+from func.llm_scheduler import child_config
+
+
+MODES = ("off", "record", "replay", "auto")
+MATCHES = ("strict", "fuzzy", "nearest")
+
+logger = logging.getLogger(__name__)
+
+
+def _request_payload(messages: List[BaseMessage], fuzzy: bool) -> List[dict]:
+    """
+    Canonical form of a conversation for hashing
+
+    Strict payloads keep every content block and tool call id. Fuzzy payloads collapse
+    whitespace, drop ids and cache breakpoints, and replace inline (base64) data by its
+    hash, so requests that differ only in such details share a key.
+    """
+    payload = []
+    for message in messages:
+        blocks = [message.content] if isinstance(message.content, str) else message.content
+        content = []
+        for block in blocks:
+            block = {"type": "text", "text": block} if isinstance(block, str) else dict(block)
+            if fuzzy:
+                block.pop("cache_control", None)
+                block.pop("id", None)
+                if isinstance(block.get("text"), str):
+                    block["text"] = " ".join(block["text"].split())
+                block = json.loads(re.sub(
+                    r'"[A-Za-z0-9+/=]{512,}"',
+                    lambda m: json.dumps(hashlib.sha1(m.group().encode()).hexdigest()),
+                    json.dumps(block, sort_keys=True, default=str),
+                ))
+            if not (fuzzy and block.get("type") == "text" and not block.get("text")):
+                content.append(block)
+
+        item = {"type": message.type, "content": content}
+        tool_calls = getattr(message, "tool_calls", None)
+        if tool_calls:
+            item["tool_calls"] = [
+                {"name": call["name"], "args": call["args"]} | ({} if fuzzy else {"id": call.get("id")})
+                for call in tool_calls
+            ]
+        if isinstance(message, ToolMessage) and not fuzzy:
+            item["tool_call_id"] = message.tool_call_id
+        payload.append(item)
+    return payload
+
+
+def as_chunk(message: BaseMessage) -> BaseMessageChunk:
+    """Stream chunk of a complete AI message (e.g. from a model that does not stream)"""
+    if isinstance(message, BaseMessageChunk):
+        return message
+    return AIMessageChunk(
+        content=message.content,
+        additional_kwargs=message.additional_kwargs,
+        response_metadata=message.response_metadata,
+        usage_metadata=message.usage_metadata,
+        id=message.id,
+        tool_call_chunks=[
+            {"name": call["name"], "args": json.dumps(call["args"]), "id": call.get("id"), "index": i}
+            for i, call in enumerate(message.tool_calls)
+        ],
+    )
+
+
+def _digest(value: Any) -> str:
+    return hashlib.sha256(json.dumps(value, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _shingles(text: str, size: int = 3) -> set:
+    words = re.findall(r"\w+", text.lower())
+    return {" ".join(words[i:i + size]) for i in range(max(len(words) - size + 1, 1))}
+
+
+class LLMRecordStore:
+    def __init__(self, path: str, similarity: float = 0.9, candidates: int = 200):
+        """
+        On-disk store of recorded chat model calls
+
+        Every record holds the strict key (exact request), the fuzzy key (normalized
+        request), the scope (model, bound tools and call options) and the response.
+        Fuzzy lookups fall back to the fuzzy key. Nearest lookups (opt-in, as they can
+        replay the answer to a different request) then also try the most similar of the
+        `candidates` latest conversations of the same scope (Jaccard similarity of word
+        shingles of at least `similarity`).
+
+        Parameters:
+        path (str): Directory of the store
+        similarity (float): Minimum similarity of a nearest-conversation match
+        candidates (int): Number of recent records of the scope compared by a nearest lookup
+        """
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.similarity = similarity
+        self.candidates = candidates
+        self.lock = threading.Lock()
+        self.counts = {"strict": 0, "fuzzy": 0, "nearest": 0, "misses": 0, "recorded": 0}
+
+        self.db = sqlite3.connect(os.path.join(path, "records.sqlite"), check_same_thread=False)
+        self.db.execute("""CREATE TABLE IF NOT EXISTS records (
+            key TEXT PRIMARY KEY, fuzzy_key TEXT, scope TEXT, text TEXT, response TEXT, created REAL)""")
+        self.db.execute("CREATE INDEX IF NOT EXISTS records_fuzzy ON records (fuzzy_key)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS records_scope ON records (scope)")
+        self.db.commit()
+
+    def put(self, key: str, fuzzy_key: str, scope: str, text: str, response: AIMessage):
+        with self.lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO records VALUES (?, ?, ?, ?, ?, ?)",
+                (key, fuzzy_key, scope, text, json.dumps(message_to_dict(response)), time.time()),
+            )
+            self.db.commit()
+            self.counts["recorded"] += 1
+
+    def _nearest(self, scope: str, text: str) -> Optional[tuple]:
+        """Key and similarity of the most similar recent record of the scope, if similar enough"""
+        with self.lock:
+            candidates = self.db.execute(
+                "SELECT key, text FROM records WHERE scope = ? ORDER BY created DESC LIMIT ?",
+                (scope, self.candidates),
+            ).fetchall()
+        query = _shingles(text)
+        best = None
+        for candidate_key, candidate_text in candidates:
+            candidate = _shingles(candidate_text)
+            score = len(query & candidate) / max(len(query | candidate), 1)
+            if score >= (best[1] if best else self.similarity):
+                best = (candidate_key, score)
+        return best
+
+    def get(self, key: str, fuzzy_key: str, scope: str, text: str, match: str = "strict") -> Optional[AIMessage]:
+        with self.lock:
+            row = self.db.execute("SELECT key, response FROM records WHERE key = ?", (key,)).fetchone()
+            stage, score = "strict", 1.0
+            if row is None and match in ("fuzzy", "nearest"):
+                row = self.db.execute(
+                    "SELECT key, response FROM records WHERE fuzzy_key = ? AND scope = ? ORDER BY created DESC LIMIT 1",
+                    (fuzzy_key, scope),
+                ).fetchone()
+                stage = "fuzzy"
+
+        if row is None and match == "nearest":
+            nearest = self._nearest(scope, text)
+            if nearest is not None:
+                with self.lock:
+                    row = self.db.execute("SELECT key, response FROM records WHERE key = ?", (nearest[0],)).fetchone()
+                stage, score = "nearest", nearest[1]
+
+        with self.lock:
+            self.counts[stage if row is not None else "misses"] += 1
+        if row is None:
+            return None
+        if stage != "strict":
+            logger.info("Replaying record %s for request %s (%s match, similarity %.2f)", row[0][:12], key[:12], stage, score)
+        return messages_from_dict([json.loads(row[1])])[0]
+
+    def stats(self) -> Dict:
+        with self.lock:
+            records = self.db.execute("SELECT COUNT(*) FROM records").fetchone()[0]
+            return {"path": self.path, "records": records} | self.counts
+
+
+class ReplayChatModel(BaseChatModel):
+    """
+    Chat model that records the calls of a live model or replays them from disk
+
+    - record: call `llm` and store every request/response pair
+    - replay: answer from the store only (no live model needed); a miss raises `LookupError`
+    - auto: answer from the store, call and record `llm` on a miss
+
+    Requests are keyed by a hash of the model name, the messages, the bound tools and the
+    call options. `match="fuzzy"` also accepts normalized matches and `match="nearest"`
+    also the most similar recorded conversation (see `LLMRecordStore`). The live model
+    runs as a child run tagged `llm_backend`. Streaming callers get the live stream while recording and the
+    recorded message as a single chunk while replaying.
+    """
+
+    llm: Optional[Any] = None
+    store: Any
+    model_name: str
+    mode: str = "replay"
+    match: str = "strict"
+    tools: List[dict] = []
+    call_options: Dict[str, Any] = {}
+
+    @property
+    def _llm_type(self) -> str:
+        return "replay"
+
+    def bind_tools(self, tools: list, *, tool_choice: Any = None, **kwargs):
+        llm = self.llm.bind_tools(tools, tool_choice=tool_choice, **kwargs) if self.llm is not None else None
+        return self.model_copy(update={
+            "llm": llm,
+            "tools": [convert_to_openai_tool(tool) for tool in tools],
+            "call_options": self.call_options | kwargs | {"tool_choice": tool_choice},
+        })
+
+    def _keys(self, messages: List[BaseMessage], stop: Optional[List[str]]) -> tuple:
+        scope = _digest({"model": self.model_name, "tools": self.tools, "options": self.call_options, "stop": stop})
+        fuzzy_payload = _request_payload(messages, fuzzy=True)
+        key = _digest([scope, _request_payload(messages, fuzzy=False)])
+        text = " ".join(block.get("text", "") for item in fuzzy_payload for block in item["content"])
+        return key, _digest([scope, fuzzy_payload]), scope, text
+
+    def _lookup(self, keys: tuple) -> Optional[AIMessage]:
+        if self.mode == "record":
+            return None
+        response = self.store.get(*keys, match=self.match)
+        if response is None and self.mode == "replay":
+            raise LookupError(f"No recorded response for request {keys[0][:12]} of {self.model_name} ({self.match} match)")
+        return response
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs) -> ChatResult:
+        keys = self._keys(messages, stop)
+        response = self._lookup(keys)
+        if response is None:
+            response = self.llm.invoke(messages, config=child_config(run_manager), stop=stop, **kwargs)
+            self.store.put(*keys, response)
+        return ChatResult(generations=[ChatGeneration(message=response)])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Optional[AsyncCallbackManagerForLLMRun] = None, **kwargs) -> ChatResult:
+        keys = self._keys(messages, stop)
+        response = self._lookup(keys)
+        if response is None:
+            response = await self.llm.ainvoke(messages, config=child_config(run_manager), stop=stop, **kwargs)
+            self.store.put(*keys, response)
+        return ChatResult(generations=[ChatGeneration(message=response)])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs) -> Iterator[ChatGenerationChunk]:
+        keys = self._keys(messages, stop)
+        response = self._lookup(keys)
+        if response is not None:
+            yield ChatGenerationChunk(message=as_chunk(response))
+            return
+        aggregate = None
+        for chunk in self.llm.stream(messages, config=child_config(run_manager), stop=stop, **kwargs):
+            aggregate = chunk if aggregate is None else aggregate + chunk
+            yield ChatGenerationChunk(message=chunk)
+        if aggregate is not None:
+            self.store.put(*keys, message_chunk_to_message(aggregate))
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager: Optional[AsyncCallbackManagerForLLMRun] = None, **kwargs) -> AsyncIterator[ChatGenerationChunk]:
+        keys = self._keys(messages, stop)
+        response = self._lookup(keys)
+        if response is not None:
+            yield ChatGenerationChunk(message=as_chunk(response))
+            return
+        aggregate = None
+        async for chunk in self.llm.astream(messages, config=child_config(run_manager), stop=stop, **kwargs):
+            aggregate = chunk if aggregate is None else aggregate + chunk
+            yield ChatGenerationChunk(message=chunk)
+        if aggregate is not None:
+            self.store.put(*keys, message_chunk_to_message(aggregate))
+
+
+def replay_store_from_env() -> Optional[LLMRecordStore]:
+    """Record store configured by LLM_CACHE_MODE / LLM_CACHE_PATH, or None if recording is off"""
+    mode = os.getenv("LLM_CACHE_MODE", "off")
+    if mode not in MODES:
+        raise ValueError(f"LLM_CACHE_MODE must be one of {MODES}, got '{mode}'")
+    if mode == "off":
+        return None
+    return LLMRecordStore(
+        os.getenv("LLM_CACHE_PATH", "./.llm_cache"),
+        similarity=float(os.getenv("LLM_CACHE_SIMILARITY", 0.9)),
+        candidates=int(os.getenv("LLM_CACHE_CANDIDATES", 200)),
+    )
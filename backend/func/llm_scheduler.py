@@ -0,0 +1,403 @@
+import os, time, heapq, random, asyncio, itertools, threading
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Union
+
+from langchain_core.callbacks import AsyncCallbackManager, AsyncCallbackManagerForLLMRun, CallbackManager, CallbackManagerForLLMRun
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+
+# Lower values are admitted first: user-facing manager turns before background evaluations
+PRIORITIES = {"manager": 0, "specialist": 1, "literature": 2, "evaluation": 3}
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504, 529}
+RATE_LIMIT_STATUS = {429, 529}
+
+# Tag of the runs of models wrapped by another chat model. Their stream events repeat the
+# wrapper's, so clients skip them (e.g. `astream_events(..., exclude_tags=[BACKEND_TAG])`).
+BACKEND_TAG = "llm_backend"
+
+
+# Called whenever a scheduled call is admitted, e.g. to start a hedging timer (see `func.llm_hedging`)
+on_admitted: ContextVar[Optional[Callable[[], None]]] = ContextVar("on_admitted", default=None)
+
+
+def _admitted():
+    callback = on_admitted.get()
+    if callback is not None:
+        callback()
+
+
+def child_config(run_manager) -> dict:
+    """Config of a wrapped model's call: a child run of the wrapper, tagged `BACKEND_TAG`"""
+    if run_manager is None:
+        return {"tags": [BACKEND_TAG]}
+    # LLM run managers have no `get_child`; this builds the same child manager
+    manager_class = AsyncCallbackManager if isinstance(run_manager, AsyncCallbackManagerForLLMRun) else CallbackManager
+    manager = manager_class(handlers=[], parent_run_id=run_manager.run_id)
+    manager.set_handlers(run_manager.inheritable_handlers)
+    manager.add_tags(run_manager.inheritable_tags)
+    manager.add_metadata(run_manager.inheritable_metadata)
+    manager.add_tags([BACKEND_TAG], inherit=False)
+    return {"callbacks": manager}
+
+
+def estimate_tokens(messages: List[BaseMessage]) -> int:
+    """Rough input tokens of a request (~4 characters per token, ~1600 tokens per image)"""
+    tokens = 0
+    for message in messages:
+        blocks = [message.content] if isinstance(message.content, str) else message.content
+        for block in blocks:
+            if isinstance(block, str):
+                tokens += len(block) // 4
+            elif block.get("type") == "text":
+                tokens += len(block.get("text", "")) // 4
+            elif block.get("type") in ("image", "image_url"):
+                tokens += 1600
+            else:
+                tokens += len(str(block)) // 4
+    return tokens
+
+
+def error_status(error: Exception) -> Optional[int]:
+    """HTTP status of a provider error (Anthropic `status_code`, Google API `code`)"""
+    for attribute in ("status_code", "code"):
+        status = getattr(error, attribute, None)
+        if isinstance(status, int):
+            return status
+    return None
+
+
+def retry_after(error: Exception) -> float:
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after", 0))
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class TokenBucket:
+    def __init__(self, per_minute: float):
+        """Bucket refilled at `per_minute` units per minute, holding at most one minute of budget (0: unlimited)"""
+        self.per_minute = per_minute
+        self.level = per_minute
+        self.updated = time.monotonic()
+
+    def refill(self, now: float, scale: float):
+        if self.per_minute:
+            self.level = min(self.per_minute, self.level + (now - self.updated) * self.per_minute * scale / 60)
+        self.updated = now
+
+    def wait(self, amount: float, scale: float) -> float:
+        """Seconds until `amount` (at most a full bucket) is available"""
+        amount = min(amount, self.per_minute)
+        if not self.per_minute or self.level >= amount:
+            return 0.0
+        return (amount - self.level) * 60 / (self.per_minute * scale)
+
+    def take(self, amount: float):
+        # Requests larger than the bucket take all of it and leave a debt
+        if self.per_minute:
+            self.level -= amount
+
+
+class _Scope:
+    def __init__(self, requests_per_minute: float, tokens_per_minute: float):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.scale = 1.0
+        self.blocked_until = 0.0
+        self.waiting: List[tuple] = []
+        self.counts = {"admitted": 0, "retries": 0, "rate_limited": 0, "failed": 0}
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+
+class LLMScheduler:
+    def __init__(self, requests_per_minute: float = 0, tokens_per_minute: float = 0, max_retries: int = 4,
+                 backoff_base: float = 1.0, backoff_max: float = 60.0):
+        """
+        Central admission control for chat model calls
+
+        Every scope (provider, model and API key) has a request bucket and an input token
+        bucket. Callers queue by priority (see `PRIORITIES`) and are admitted in order
+        when both buckets have budget. Rate limit errors (429/529) pause the whole scope
+        for the retry-after time or a jittered backoff and halve its admission rate; the
+        rate recovers by 10% per successful call. Other transient errors are retried with
+        the same backoff.
+
+        Queued callers sleep until the queue changes (a call is admitted, leaves the
+        queue or a new call arrives); only the first in line wakes up by itself, when its
+        budget will be available.
+
+        Parameters:
+        requests_per_minute (float): Request budget per scope (0: unlimited)
+        tokens_per_minute (float): Input token budget per scope (0: unlimited)
+        max_retries (int): Retries of a call after transient errors
+        backoff_base (float): Backoff of the first retry in seconds (doubles per attempt)
+        backoff_max (float): Maximum backoff in seconds
+        """
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.scopes: Dict[str, _Scope] = {}
+        self.lock = threading.Lock()
+        self.changed = threading.Condition(self.lock)
+        # Wake-up events of queued async callers: ticket -> (loop, event)
+        self.async_waiters: Dict[tuple, tuple] = {}
+        self.sequence = itertools.count()
+
+    @classmethod
+    def from_env(cls) -> "LLMScheduler":
+        return cls(
+            requests_per_minute=float(os.getenv("LLM_REQUESTS_PER_MINUTE", 0)),
+            tokens_per_minute=float(os.getenv("LLM_INPUT_TOKENS_PER_MINUTE", 0)),
+            max_retries=int(os.getenv("LLM_MAX_RETRIES", 4)),
+            backoff_base=float(os.getenv("LLM_BACKOFF_BASE", 1.0)),
+            backoff_max=float(os.getenv("LLM_BACKOFF_MAX", 60.0)),
+        )
+
+    def _scope(self, scope: str) -> _Scope:
+        if scope not in self.scopes:
+            self.scopes[scope] = _Scope(self.requests_per_minute, self.tokens_per_minute)
+        return self.scopes[scope]
+
+    def _notify(self):
+        """Wake all queued callers to re-check their place (lock held)"""
+        self.changed.notify_all()
+        for loop, event in self.async_waiters.values():
+            loop.call_soon_threadsafe(event.set)
+
+    def _enqueue(self, scope: str, priority: int) -> tuple:
+        ticket = (priority, next(self.sequence))
+        heapq.heappush(self._scope(scope).waiting, ticket)
+        self._notify()
+        return ticket
+
+    def _dequeue(self, scope: str, ticket: tuple):
+        waiting = self._scope(scope).waiting
+        if ticket in waiting:
+            waiting.remove(ticket)
+            heapq.heapify(waiting)
+            self._notify()
+
+    def _admit(self, scope: str, ticket: tuple, tokens: int, enqueued: float) -> Optional[float]:
+        """
+        Admit `ticket` if it is first in line and the budget allows (lock held)
+
+        Returns:
+        float: 0 if admitted, the seconds until the budget allows if first in line, or
+        None if other calls are ahead
+        """
+        state = self._scope(scope)
+        if state.waiting[0] != ticket:
+            return None
+        now = time.monotonic()
+        state.requests.refill(now, state.scale)
+        state.tokens.refill(now, state.scale)
+        wait = max(state.blocked_until - now, state.requests.wait(1, state.scale), state.tokens.wait(tokens, state.scale))
+        if wait > 0:
+            return wait
+
+        heapq.heappop(state.waiting)
+        state.requests.take(1)
+        state.tokens.take(tokens)
+        state.counts["admitted"] += 1
+        state.wait_seconds += now - enqueued
+        state.max_wait_seconds = max(state.max_wait_seconds, now - enqueued)
+        self._notify()
+        return 0.0
+
+    def acquire(self, scope: str, priority: int, tokens: int):
+        """Block until the call is admitted"""
+        enqueued = time.monotonic()
+        with self.changed:
+            ticket = self._enqueue(scope, priority)
+            try:
+                while (wait := self._admit(scope, ticket, tokens, enqueued)) != 0:
+                    self.changed.wait(timeout=wait)
+            except BaseException:
+                self._dequeue(scope, ticket)
+                raise
+
+    async def aacquire(self, scope: str, priority: int, tokens: int):
+        """Wait (without blocking the event loop) until the call is admitted"""
+        enqueued = time.monotonic()
+        event = asyncio.Event()
+        with self.lock:
+            ticket = self._enqueue(scope, priority)
+            self.async_waiters[ticket] = (asyncio.get_running_loop(), event)
+        try:
+            while True:
+                with self.lock:
+                    wait = self._admit(scope, ticket, tokens, enqueued)
+                    if wait == 0:
+                        return
+                    # Cleared under the lock, so a change after this check still wakes us
+                    event.clear()
+                try:
+                    await asyncio.wait_for(event.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+        except BaseException:
+            with self.lock:
+                self._dequeue(scope, ticket)
+            raise
+        finally:
+            with self.lock:
+                self.async_waiters.pop(ticket, None)
+
+    def blocked(self, scope: str) -> bool:
+        """Whether `scope` is paused after a rate limit error"""
+        with self.lock:
+            return scope in self.scopes and self.scopes[scope].blocked_until > time.monotonic()
+
+    def succeeded(self, scope: str, estimated_tokens: int, response: Any = None):
+        """Settle the token estimate with the reported usage and recover the admission rate"""
+        usage = getattr(response, "usage_metadata", None) or {}
+        with self.lock:
+            state = self._scope(scope)
+            if usage.get("input_tokens"):
+                state.tokens.take(usage["input_tokens"] - estimated_tokens)
+            state.scale = min(1.0, state.scale + 0.1)
+            self._notify()
+
+    def failed(self, scope: str, attempt: int, error: Exception) -> Optional[float]:
+        """Seconds to wait before retrying after `error`, or None if the call should fail"""
+        status = error_status(error)
+        with self.lock:
+            state = self._scope(scope)
+            if status not in RETRYABLE_STATUS or attempt >= self.max_retries:
+                state.counts["failed"] += 1
+                return None
+            delay = max(retry_after(error), random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt)))
+            state.counts["retries"] += 1
+            if status in RATE_LIMIT_STATUS:
+                state.counts["rate_limited"] += 1
+                state.scale = max(0.1, state.scale / 2)
+                state.blocked_until = max(state.blocked_until, time.monotonic() + delay)
+                self._notify()
+            return delay
+
+    def stats(self) -> Dict:
+        names = {value: name for name, value in PRIORITIES.items()}
+        with self.lock:
+            return {
+                scope: {
+                    "queue_depth": len(state.waiting),
+                    "queued_by_priority": {
+                        names.get(priority, str(priority)): sum(1 for p, _ in state.waiting if p == priority)
+                        for priority in sorted({p for p, _ in state.waiting})
+                    },
+                    "rate_scale": round(state.scale, 3),
+                    "blocked_for": round(max(0.0, state.blocked_until - time.monotonic()), 3),
+                    "mean_wait": round(state.wait_seconds / max(state.counts["admitted"], 1), 4),
+                    "max_wait": round(state.max_wait_seconds, 4),
+                } | state.counts
+                for scope, state in self.scopes.items()
+            }
+
+
+def priority_value(priority: Union[str, int]) -> int:
+    if isinstance(priority, int):
+        return priority
+    if priority not in PRIORITIES:
+        raise ValueError(f"Unknown priority '{priority}', expected one of {list(PRIORITIES)}")
+    return PRIORITIES[priority]
+
+
+class ScheduledChatModel(BaseChatModel):
+    """
+    Chat model whose calls are admitted by an `LLMScheduler` and retried on transient errors
+
+    Streaming calls are retried only if the error arrives before the first chunk. The
+    wrapped model runs as a child run tagged `BACKEND_TAG`.
+    """
+
+    llm: Any
+    scheduler: Any
+    scope: str
+    priority: int = PRIORITIES["specialist"]
+
+    @property
+    def _llm_type(self) -> str:
+        return "scheduled"
+
+    def bind_tools(self, tools: list, *, tool_choice: Any = None, **kwargs):
+        return self.model_copy(update={"llm": self.llm.bind_tools(tools, tool_choice=tool_choice, **kwargs)})
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs) -> ChatResult:
+        tokens = estimate_tokens(messages)
+        for attempt in itertools.count():
+            self.scheduler.acquire(self.scope, self.priority, tokens)
+            _admitted()
+            try:
+                response = self.llm.invoke(messages, config=child_config(run_manager), stop=stop, **kwargs)
+            except Exception as e:
+                delay = self.scheduler.failed(self.scope, attempt, e)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                continue
+            self.scheduler.succeeded(self.scope, tokens, response)
+            return ChatResult(generations=[ChatGeneration(message=response)])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Optional[AsyncCallbackManagerForLLMRun] = None, **kwargs) -> ChatResult:
+        tokens = estimate_tokens(messages)
+        for attempt in itertools.count():
+            await self.scheduler.aacquire(self.scope, self.priority, tokens)
+            _admitted()
+            try:
+                response = await self.llm.ainvoke(messages, config=child_config(run_manager), stop=stop, **kwargs)
+            except Exception as e:
+                delay = self.scheduler.failed(self.scope, attempt, e)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                continue
+            self.scheduler.succeeded(self.scope, tokens, response)
+            return ChatResult(generations=[ChatGeneration(message=response)])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs) -> Iterator[ChatGenerationChunk]:
+        tokens = estimate_tokens(messages)
+        for attempt in itertools.count():
+            self.scheduler.acquire(self.scope, self.priority, tokens)
+            _admitted()
+            aggregate = None
+            try:
+                for chunk in self.llm.stream(messages, config=child_config(run_manager), stop=stop, **kwargs):
+                    aggregate = chunk if aggregate is None else aggregate + chunk
+                    yield ChatGenerationChunk(message=chunk)
+            except Exception as e:
+                delay = self.scheduler.failed(self.scope, attempt, e) if aggregate is None else None
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                continue
+            self.scheduler.succeeded(self.scope, tokens, aggregate)
+            return
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager: Optional[AsyncCallbackManagerForLLMRun] = None, **kwargs) -> AsyncIterator[ChatGenerationChunk]:
+        tokens = estimate_tokens(messages)
+        for attempt in itertools.count():
+            await self.scheduler.aacquire(self.scope, self.priority, tokens)
+            _admitted()
+            aggregate = None
+            try:
+                async for chunk in self.llm.astream(messages, config=child_config(run_manager), stop=stop, **kwargs):
+                    aggregate = chunk if aggregate is None else aggregate + chunk
+                    yield ChatGenerationChunk(message=chunk)
+            except Exception as e:
+                delay = self.scheduler.failed(self.scope, attempt, e) if aggregate is None else None
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                continue
+            self.scheduler.succeeded(self.scope, tokens, aggregate)
+            return
@@ -0,0 +1,307 @@
+import os, json, time, argparse
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+try:
+    import hnswlib
+except ImportError:
+    hnswlib = None
+
+
+class MetadataFilter:
+    def __init__(self, metadata: List[dict]):
+        """
+        Evaluates Pinecone-style metadata filters over a list of metadata dicts
+
+        Each field is stored column-wise (row ids and values of the rows that have it), so
+        a filter becomes a boolean mask over all rows. Supports `$and`, `$or`, `$eq`, `$ne`,
+        `$gt`, `$gte`, `$lt`, `$lte`, `$in`, `$nin`, `$exists` and plain equality; as in
+        Pinecone, a list-valued field matches if any of its elements matches.
+        """
+        self.size = len(metadata)
+        fields: Dict[str, Tuple[list, list]] = {}
+        for i, entry in enumerate(metadata):
+            for field, value in entry.items():
+                rows, values = fields.setdefault(field, ([], []))
+                rows.append(i)
+                values.append(value)
+
+        self.fields = {}
+        for field, (rows, values) in fields.items():
+            values = np.array(values, dtype=object) if any(isinstance(v, list) for v in values) else np.array(values)
+            self.fields[field] = (np.array(rows, dtype=np.int64), values)
+
+    def _compare(self, field: str, op: str, operand) -> np.ndarray:
+        mask = np.zeros(self.size, dtype=bool)
+        if field not in self.fields:
+            if (op == "$exists" and not operand) or op in ("$ne", "$nin"):
+                mask[:] = True
+            return mask
+        rows, values = self.fields[field]
+
+        if op == "$exists":
+            mask[rows] = True
+            return ~mask if not operand else mask
+
+        compare = {
+            "$eq": lambda v: v == operand,
+            "$ne": lambda v: v == operand,
+            "$gt": lambda v: v > operand,
+            "$gte": lambda v: v >= operand,
+            "$lt": lambda v: v < operand,
+            "$lte": lambda v: v <= operand,
+            "$in": lambda v: np.isin(v, operand),
+            "$nin": lambda v: np.isin(v, operand),
+        }[op]
+
+        if values.dtype == object:
+            matched = np.array([
+                any(compare(np.asarray(x))) if isinstance(x, list) else bool(compare(np.asarray(x)))
+                for x in values], dtype=bool)
+        else:
+            matched = np.asarray(compare(values), dtype=bool)
+        mask[rows] = matched
+
+        # Negations also match rows without the field
+        return ~mask if op in ("$ne", "$nin") else mask
+
+    def mask(self, filter: Optional[dict]) -> Optional[np.ndarray]:
+        """Boolean mask of the rows matching `filter` (None if there is no filter)"""
+        if not filter:
+            return None
+        mask = np.ones(self.size, dtype=bool)
+        for key, condition in filter.items():
+            if key == "$and":
+                for sub_filter in condition:
+                    mask &= self.mask(sub_filter)
+            elif key == "$or":
+                any_mask = np.zeros(self.size, dtype=bool)
+                for sub_filter in condition:
+                    any_mask |= self.mask(sub_filter)
+                mask &= any_mask
+            elif isinstance(condition, dict):
+                for op, operand in condition.items():
+                    mask &= self._compare(key, op, operand)
+            else:
+                mask &= self._compare(key, "$eq", condition)
+        return mask
+
+
+class LocalVectorStore(VectorStore):
+    def __init__(self, path: str, embedding: Embeddings, ef: int = 200, exact_below: int = 20_000, exact_fraction: float = 0.05):
+        """
+        Read-only local replica of a vector index (e.g. SciSciCorpus exported from Pinecone)
+
+        The replica directory holds `vectors.npy` (normalized float32), `records.jsonl`
+        (text and metadata per row) and, if hnswlib is installed, an HNSW graph
+        `hnsw.bin`. Without hnswlib, or when a filter leaves fewer than `exact_below`
+        rows (or less than `exact_fraction` of the index), search is an exact dot product
+        over the matching rows. A selective filter would otherwise leave the HNSW search
+        with fewer than `k` matches within `ef`, so that case also falls back to exact
+        search. Scores are cosine similarities, as in the remote index.
+
+        Parameters:
+        path (str): Replica directory (see `build` and `export_pinecone`)
+        embedding (Embeddings): Embedding client of the model the index was built with
+        ef (int): HNSW search breadth (higher is slower and more accurate)
+        exact_below (int): Use exact search when a filter matches fewer rows than this
+        exact_fraction (float): Use exact search when a filter matches less than this share of the rows
+        """
+        self.path = path
+        self.embedding = embedding
+        self.exact_below = exact_below
+        self.exact_fraction = exact_fraction
+
+        self.vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r")
+        self.texts, self.metadata = [], []
+        with open(os.path.join(path, "records.jsonl")) as f:
+            for line in f:
+                record = json.loads(line)
+                self.texts.append(record["text"])
+                self.metadata.append(record["metadata"])
+        self.filter = MetadataFilter(self.metadata)
+
+        self.hnsw = None
+        hnsw_path = os.path.join(path, "hnsw.bin")
+        if hnswlib is not None and os.path.exists(hnsw_path):
+            self.hnsw = hnswlib.Index(space="ip", dim=self.vectors.shape[1])
+            self.hnsw.load_index(hnsw_path, max_elements=self.vectors.shape[0])
+            self.hnsw.set_ef(ef)
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self.embedding
+
+    @staticmethod
+    def build(path: str, vectors: np.ndarray, texts: List[str], metadata: List[dict], M: int = 32, ef_construction: int = 200):
+        """Write a replica directory from vectors, texts and metadata (rows in the same order)"""
+        os.makedirs(path, exist_ok=True)
+        vectors = np.asarray(vectors, dtype=np.float32)
+        vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        np.save(os.path.join(path, "vectors.npy"), vectors)
+        with open(os.path.join(path, "records.jsonl"), "w") as f:
+            for text, entry in zip(texts, metadata):
+                f.write(json.dumps({"text": text, "metadata": entry}) + "\n")
+
+        if hnswlib is not None:
+            index = hnswlib.Index(space="ip", dim=vectors.shape[1])
+            index.init_index(max_elements=vectors.shape[0], M=M, ef_construction=ef_construction)
+            index.add_items(vectors, np.arange(vectors.shape[0]))
+            index.save_index(os.path.join(path, "hnsw.bin"))
+
+    def search(self, vector: List[float], k: int = 4, filter: Optional[dict] = None, exact: bool = False) -> List[Tuple[int, float]]:
+        """Row ids and scores of the `k` nearest rows that match `filter`"""
+        query = np.asarray(vector, dtype=np.float32)
+        query = query / max(np.linalg.norm(query), 1e-12)
+        mask = self.filter.mask(filter)
+        candidates = np.flatnonzero(mask) if mask is not None else None
+        n_candidates = len(candidates) if candidates is not None else self.vectors.shape[0]
+        if n_candidates == 0:
+            return []
+
+        n_rows = self.vectors.shape[0]
+        if exact or self.hnsw is None or n_candidates < max(self.exact_below, self.exact_fraction * n_rows):
+            return self._exact_search(query, k, candidates)
+
+        try:
+            labels, distances = self.hnsw.knn_query(
+                query, k=min(k, n_candidates), filter=(lambda i: bool(mask[i])) if mask is not None else None)
+        except RuntimeError:
+            # hnswlib raises when the graph walk finds fewer than k matching rows within ef
+            return self._exact_search(query, k, candidates)
+        # The inner-product space returns 1 - similarity
+        return [(int(row), float(1 - distance)) for row, distance in zip(labels[0], distances[0])]
+
+    def _exact_search(self, query: np.ndarray, k: int, candidates: Optional[np.ndarray]) -> List[Tuple[int, float]]:
+        vectors = self.vectors[candidates] if candidates is not None else self.vectors
+        scores = vectors @ query
+        top = np.argpartition(-scores, min(k, len(scores)) - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        rows = candidates[top] if candidates is not None else top
+        return [(int(row), float(scores[i])) for row, i in zip(rows, top)]
+
+    def _document(self, row: int) -> Document:
+        return Document(page_content=self.texts[row], metadata=self.metadata[row])
+
+    def similarity_search_by_vector_with_score(
+            self, embedding: List[float], k: int = 4, filter: Optional[dict] = None, namespace: Optional[str] = None
+        ) -> List[Tuple[Document, float]]:
+        return [(self._document(row), score) for row, score in self.search(embedding, k=k, filter=filter)]
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, filter: Optional[dict] = None, **kwargs) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_by_vector_with_score(embedding, k=k, filter=filter)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, filter: Optional[dict] = None, **kwargs) -> List[Tuple[Document, float]]:
+        return self.similarity_search_by_vector_with_score(self.embedding.embed_query(query), k=k, filter=filter)
+
+    def similarity_search(self, query: str, k: int = 4, filter: Optional[dict] = None, **kwargs) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k=k, filter=filter)]
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None, **kwargs: Any) -> List[str]:
+        raise NotImplementedError("LocalVectorStore is a read-only replica, rebuild it with `LocalVectorStore.build`")
+
+    @classmethod
+    def from_texts(cls, texts: List[str], embedding: Embeddings, metadatas: Optional[List[dict]] = None, path: str = None, **kwargs: Any) -> "LocalVectorStore":
+        metadatas = metadatas or [{} for _ in texts]
+        cls.build(path, embedding.embed_documents(texts), texts, metadatas)
+        return cls(path, embedding, **kwargs)
+
+
+def export_pinecone(index, namespace: str, path: str, text_key: str = "text", batch_size: int = 100):
+    """
+    Export all vectors of a Pinecone namespace into a local replica directory
+
+    Parameters:
+    index: `pinecone.Index` of the remote index (serverless, as `list` is used to page through ids)
+    namespace (str): Namespace to export
+    path (str): Replica directory to write
+    text_key (str): Metadata key holding the text (as in `PineconeVectorStore`)
+    """
+    vectors, texts, metadata = [], [], []
+    for ids in index.list(namespace=namespace, limit=batch_size):
+        fetched = index.fetch(ids=list(ids), namespace=namespace).vectors
+        for vector_id in ids:
+            record = fetched[vector_id]
+            entry = dict(record.metadata or {})
+            vectors.append(record.values)
+            texts.append(entry.pop(text_key, ""))
+            metadata.append(entry)
+    LocalVectorStore.build(path, np.array(vectors, dtype=np.float32), texts, metadata)
+
+
+def benchmark(store: LocalVectorStore, index, namespace: str, n_queries: int = 100, k: int = 10, filter: dict = None, seed: int = 0) -> Dict:
+    """
+    Recall and latency of the local replica against the remote Pinecone index
+
+    Query vectors are perturbed corpus vectors, so no embedding calls are needed.
+    Recall@k of the local search is measured against exact local search (`recall_vs_exact`)
+    and against the remote results, matched by text (`recall_vs_remote`).
+    """
+    rng = np.random.default_rng(seed)
+    rows = rng.choice(store.vectors.shape[0], size=min(n_queries, store.vectors.shape[0]), replace=False)
+    queries = store.vectors[rows] + rng.normal(scale=0.02, size=(len(rows), store.vectors.shape[1])).astype(np.float32)
+
+    latencies = {"local": [], "exact": [], "remote": []}
+    recall_exact, recall_remote = [], []
+    for query in queries:
+        start = time.perf_counter()
+        local = store.search(query, k=k, filter=filter)
+        latencies["local"].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        exact = store.search(query, k=k, filter=filter, exact=True)
+        latencies["exact"].append(time.perf_counter() - start)
+
+        local_rows = {row for row, _ in local}
+        if exact:
+            recall_exact.append(len(local_rows & {row for row, _ in exact}) / len(exact))
+
+        if index is not None:
+            start = time.perf_counter()
+            remote = index.query(vector=query.tolist(), top_k=k, filter=filter, namespace=namespace, include_metadata=True)
+            latencies["remote"].append(time.perf_counter() - start)
+            remote_texts = {match.metadata.get("text") for match in remote.matches}
+            if remote_texts:
+                recall_remote.append(len({store.texts[row] for row in local_rows} & remote_texts) / len(remote_texts))
+
+    def percentiles(values):
+        if not values:
+            return None
+        return {"p50_ms": round(float(np.percentile(values, 50)) * 1000, 2), "p95_ms": round(float(np.percentile(values, 95)) * 1000, 2)}
+
+    return {
+        "queries": len(queries), "k": k, "filter": filter, "hnsw": store.hnsw is not None,
+        "recall_vs_exact": round(float(np.mean(recall_exact)), 4) if recall_exact else None,
+        "recall_vs_remote": round(float(np.mean(recall_remote)), 4) if recall_remote else None,
+        "latency": {name: percentiles(values) for name, values in latencies.items()},
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export and benchmark a local replica of SciSciCorpus")
+    parser.add_argument("command", choices=["export", "benchmark"])
+    parser.add_argument("--path", default=os.getenv("SCISCICORPUS_LOCAL_PATH"))
+    parser.add_argument("--index", default=os.getenv("SCISCICORPUS_INDEX"))
+    parser.add_argument("--namespace", default=os.getenv("SCISCICORPUS_NAMESPACE"))
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--min-year", type=int, default=None)
+    parser.add_argument("--local-only", action="store_true", help="Skip the remote index in the benchmark")
+    args = parser.parse_args()
+
+    index = None
+    if args.command == "export" or not args.local_only:
+        from pinecone import Pinecone
+        index = Pinecone(api_key=os.getenv("PINECONE_API_KEY")).Index(args.index)
+
+    if args.command == "export":
+        export_pinecone(index, args.namespace, args.path)
+    else:
+        store = LocalVectorStore(args.path, embedding=None)
+        filters = [None] + ([{"$and": [{"year": {"$gte": args.min_year}}]}] if args.min_year else [])
+        for filter in filters:
+            print(json.dumps(benchmark(store, index, args.namespace, n_queries=args.queries, k=args.k, filter=filter), indent=1))
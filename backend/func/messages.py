@@ -12,6 +12,9 @@ def convert_to_langchain_messages(data, format: Literal["events", "messages"]) -
 		messages = []
 		for event_str in loads(data):
 			output = loads(loads(event_str)["data"])
+			# Streaming events (e.g. `sandbox_output`) carry no messages
+			if not isinstance(output, dict) or "messages" not in output:
+				continue
 			
 			for message in output["messages"]:
 				message.metadata = { "current": output.get("current", None), "next": output.get("next", None), "name": output.get("name", None) }
@@ -0,0 +1,153 @@
+import os, re, json, threading, unicodedata
+from collections import defaultdict, OrderedDict
+from difflib import SequenceMatcher
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from func.local_index import MetadataFilter
+
+
+def normalize_name(name: str) -> str:
+    """Case-, accent- and punctuation-insensitive key of a name"""
+    name = unicodedata.normalize("NFKD", str(name))
+    name = "".join(c for c in name if not unicodedata.combining(c)).lower().replace("&", " and ")
+    name = re.sub(r"[^\w\s]", " ", name)
+    name = re.sub(r"^the\s+", "", re.sub(r"\s+", " ", name).strip())
+    return name
+
+def trigrams(key: str) -> set:
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class NameIndex:
+    def __init__(self, records: List[dict], key: str, vectors: np.ndarray = None, embedding: Embeddings = None,
+                 confident_score: float = 0.9, n_candidates: int = 50, memo_size: int = 4096):
+        """
+        In-process index of a name vocabulary (e.g. all institution or field names)
+
+        A lookup tries, in order, an exact match on the normalized name, a trigram
+        candidate search re-ranked by edit-distance similarity, and (if name vectors and
+        an embedding client are given) a vector search over the snapshot. `lookup`
+        returns None when the exact and fuzzy stages are not confident, so the caller can
+        embed the names in one batch for `vector_search` or fall back to the remote store.
+        Answers are memoized, so repeated lookups are dictionary hits.
+
+        Parameters:
+        records (list): Metadata of every name (same fields as the remote store)
+        key (str): Field holding the name (e.g. "institution_name")
+        vectors (np.ndarray): Normalized name vectors, one row per record (optional)
+        embedding (Embeddings): Embedding client of the model the vectors were built with
+        confident_score (float): Minimum fuzzy similarity to answer without vectors
+        n_candidates (int): Trigram candidates re-ranked by edit distance
+        memo_size (int): Number of memoized lookups
+        """
+        self.records = records
+        self.key = key
+        self.vectors = vectors
+        self.embedding = embedding
+        self.confident_score = confident_score
+        self.n_candidates = n_candidates
+        self.filter = MetadataFilter(records)
+        self.memo: OrderedDict = OrderedDict()
+        self.memo_size = memo_size
+        self.memo_lock = threading.Lock()
+
+        self.keys = [normalize_name(record.get(key, "")) for record in records]
+        self.exact: Dict[str, List[int]] = defaultdict(list)
+        postings: Dict[str, list] = defaultdict(list)
+        for i, name_key in enumerate(self.keys):
+            self.exact[name_key].append(i)
+            for gram in trigrams(name_key):
+                postings[gram].append(i)
+        self.postings = {gram: np.array(rows, dtype=np.int32) for gram, rows in postings.items()}
+        self.n_trigrams = np.array([len(trigrams(name_key)) for name_key in self.keys], dtype=np.int32)
+
+    @classmethod
+    def from_snapshot(cls, path: str, key: str, embedding: Embeddings = None, **kwargs) -> "NameIndex":
+        """
+        Load a snapshot directory in the `func.local_index` replica format (`records.jsonl`
+        and optionally `vectors.npy`), e.g. written by
+        `python -m func.local_index export --index $NAME_SEARCH_INDEX --namespace institution_name --path ...`
+        """
+        records = []
+        with open(os.path.join(path, "records.jsonl")) as f:
+            for line in f:
+                record = json.loads(line)
+                records.append(record["metadata"] if record["metadata"].get(key) is not None else record["metadata"] | {key: record["text"]})
+        vectors_path = os.path.join(path, "vectors.npy")
+        vectors = np.load(vectors_path, mmap_mode="r") if os.path.exists(vectors_path) else None
+        return cls(records, key, vectors=vectors, embedding=embedding, **kwargs)
+
+    def _fuzzy(self, name_key: str, mask: Optional[np.ndarray]) -> List[Tuple[int, float]]:
+        grams = trigrams(name_key)
+        counts = np.zeros(len(self.records), dtype=np.int32)
+        for gram in grams:
+            rows = self.postings.get(gram)
+            if rows is not None:
+                counts[rows] += 1
+        if mask is not None:
+            counts[~mask] = 0
+        matched = np.flatnonzero(counts)
+        if len(matched) == 0:
+            return []
+
+        dice = 2 * counts[matched] / (len(grams) + self.n_trigrams[matched])
+        candidates = matched[np.argsort(-dice, kind="stable")[:self.n_candidates]]
+        scored = [(int(i), SequenceMatcher(None, name_key, self.keys[i]).ratio()) for i in candidates]
+        return sorted(scored, key=lambda x: -x[1])
+
+    def _vector(self, vector: List[float], k: int, mask: Optional[np.ndarray]) -> List[Tuple[int, float]]:
+        query = np.asarray(vector, dtype=np.float32)
+        scores = np.asarray(self.vectors @ (query / max(np.linalg.norm(query), 1e-12)))
+        if mask is not None:
+            scores = np.where(mask, scores, -np.inf)
+        top = np.argsort(-scores, kind="stable")[:k]
+        return [(int(i), float(scores[i])) for i in top if np.isfinite(scores[i])]
+
+    def lookup(self, name: str, k: int = 10, filter: Optional[dict] = None) -> Optional[Tuple[List[dict], str]]:
+        """
+        Best-matching records of `name` from the exact and fuzzy stages
+
+        Returns:
+        tuple: Records (best first) and the stage that answered ("exact" or "fuzzy"),
+        or None if neither is confident
+        """
+        name_key = normalize_name(name)
+        memo_key = (name_key, k, json.dumps(filter, sort_keys=True))
+        with self.memo_lock:
+            if memo_key in self.memo:
+                self.memo.move_to_end(memo_key)
+                return self.memo[memo_key]
+
+        mask = self.filter.mask(filter)
+        exact = [i for i in self.exact.get(name_key, []) if mask is None or mask[i]]
+        fuzzy = self._fuzzy(name_key, mask)
+        if not exact and not (fuzzy and fuzzy[0][1] >= self.confident_score):
+            return None
+
+        rows = list(dict.fromkeys(exact + [i for i, _ in fuzzy]))[:k]
+        result = [self.records[i] for i in rows], "exact" if exact else "fuzzy"
+        with self.memo_lock:
+            self.memo[memo_key] = result
+            if len(self.memo) > self.memo_size:
+                self.memo.popitem(last=False)
+        return result
+
+    @property
+    def has_vectors(self) -> bool:
+        return self.vectors is not None and self.embedding is not None
+
+    def vector_search(self, vector: List[float], k: int = 10, filter: Optional[dict] = None) -> List[dict]:
+        """Records nearest to an embedding of the name (e.g. from a batched embedding call)"""
+        return [self.records[i] for i, _ in self._vector(vector, k, self.filter.mask(filter))]
+
+
+def load_name_indexes(path: str, columns: List[str], embedding: Embeddings = None) -> Dict[str, NameIndex]:
+    """Name indexes of the `columns` whose snapshot exists under `path` (one subdirectory per column)"""
+    return {
+        column: NameIndex.from_snapshot(os.path.join(path, column), column, embedding=embedding)
+        for column in columns if os.path.exists(os.path.join(path, column, "records.jsonl"))
+    }
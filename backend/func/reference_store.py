@@ -0,0 +1,200 @@
+import os, re, hmac, json, time, shutil, hashlib, threading
+from collections import Counter
+from typing import Dict, Optional, Tuple
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+
+class ReferenceStore:
+    def __init__(self, path: str, promote_after: int = 3, ttl: float = 3600, secret: bytes = None):
+        """
+        Shared, read-only store of reference tables as uncompressed Arrow files
+
+        Kernels memory-map the files (see `load_reference` in `func/kernel_helpers.py`),
+        so every session that uses a reference table shares one copy in the page cache.
+        Tables are published explicitly (e.g. reference tables of the schema) or promoted
+        automatically once the same SQL query has been run `promote_after` times on the
+        same database. Promoted results expire after `ttl` seconds (then the query runs
+        against the database again) or when `invalidate` is called.
+
+        Kernels run as the server's user and can write to the store, so the server only
+        serves a table whose index entry carries a valid HMAC (keyed by `secret`, which
+        kernels never see) and whose file still has the SHA-256 recorded at publication.
+        Entries signed with another secret (e.g. before a restart with a random secret)
+        are treated as unpublished.
+
+        Parameters:
+        path (str): Directory of the store (shared with the kernels, outside their working directory)
+        promote_after (int): Number of identical `sql_query` runs before a result is published
+        ttl (float): Seconds a promoted query result is served (0: until invalidated)
+        secret (bytes): Key of the index entry signatures (random if None; share it between server processes)
+        """
+        self.path = path
+        self.promote_after = promote_after
+        self.ttl = ttl
+        self.secret = secret or os.urandom(32)
+        self.index_path = os.path.join(path, "index.json")
+        self.query_counts: Counter = Counter()
+        self.lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+
+    @staticmethod
+    def query_key(query: str, db_name: str) -> str:
+        normalized = re.sub(r"\s+", " ", query).strip().rstrip(";").strip()
+        return hashlib.sha1(f"{db_name}\n{normalized}".encode()).hexdigest()[:16]
+
+    def _expired(self, entry: dict) -> bool:
+        return entry["source"] == "query" and self.ttl > 0 and time.time() - entry["created"] > self.ttl
+
+    def index(self) -> Dict[str, dict]:
+        """Metadata of all published tables, by name"""
+        try:
+            with open(self.index_path) as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _save_index(self, index: Dict[str, dict]):
+        temp_path = f"{self.index_path}.{os.getpid()}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump(index, f, indent=1)
+        os.replace(temp_path, self.index_path)
+
+    def _signature(self, name: str, entry: dict) -> str:
+        fields = {key: value for key, value in entry.items() if key != "signature"}
+        return hmac.new(self.secret, json.dumps([name, fields], sort_keys=True).encode(), hashlib.sha256).hexdigest()
+
+    def entry(self, name: str) -> Optional[dict]:
+        """Index entry of `name` if it was published by this store (valid signature), else None"""
+        entry = self.index().get(name)
+        if not isinstance(entry, dict) or not hmac.compare_digest(str(entry.get("signature", "")), self._signature(name, entry)):
+            return None
+        return entry
+
+    def get(self, query: str, db_name: str) -> Optional[str]:
+        """Name of the published table holding the result of `query` on `db_name`, None if it is not published or expired"""
+        name = f"query_{self.query_key(query, db_name)}"
+        entry = self.entry(name)
+        return name if entry and not self._expired(entry) else None
+
+    def read(self, name: str) -> Optional[Tuple[str, pd.DataFrame]]:
+        """
+        Path and content of a published table, checked against the signed index entry
+
+        Returns:
+        tuple: Path of the file and the table, None if the table is not published (anymore)
+        or its file was modified
+        """
+        entry = self.entry(name)
+        if entry is None:
+            return None
+        file_path = os.path.join(self.path, entry["file"])
+        try:
+            with open(file_path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        # The checked bytes are parsed, so the file cannot change between the check and the read
+        if not hmac.compare_digest(hashlib.sha256(data).hexdigest(), entry["sha256"]):
+            return None
+        return file_path, feather.read_table(pa.BufferReader(data)).to_pandas()
+
+    def lookup(self, query: str, db_name: str) -> Optional[Tuple[str, str, pd.DataFrame]]:
+        """Name, path and content of the published result of `query` on `db_name` (None if not served)"""
+        name = self.get(query, db_name)
+        result = self.read(name) if name else None
+        return (name, *result) if result else None
+
+    def publish(self, name: str, data, source: str, query: str = None, db_name: str = None) -> str:
+        """
+        Publish a table under `name` (replacing an older version)
+
+        Parameters:
+        name (str): Name kernels use to load the table
+        data: pandas DataFrame, pyarrow Table or the path of an uncompressed Arrow file
+        source (str): Where the table comes from (e.g. "table" or "query")
+        query (str): SQL query that produced the table
+        db_name (str): Database the query ran on
+
+        Returns:
+        str: Path of the published file
+        """
+        file_name = f"{name}-{int(time.time() * 1000)}.arrow"
+        file_path = os.path.join(self.path, file_name)
+
+        if isinstance(data, str):
+            shutil.copyfile(data, file_path)
+            schema = feather.read_table(file_path, memory_map=True).schema
+        else:
+            table = data if isinstance(data, pa.Table) else pa.Table.from_pandas(data, preserve_index=False)
+            feather.write_feather(table, file_path, compression="uncompressed")
+            schema = table.schema
+        os.chmod(file_path, 0o444)
+        with open(file_path, "rb") as f:
+            sha256 = hashlib.file_digest(f, "sha256").hexdigest()
+
+        entry = {
+            "file": file_name, "source": source, "query": query, "db_name": db_name,
+            "columns": schema.names, "created": time.time(), "sha256": sha256,
+        }
+        entry["signature"] = self._signature(name, entry)
+        with self.lock:
+            old_entry = self.entry(name)
+            index = self.index()
+            index[name] = entry
+            self._save_index(index)
+
+        # Kernels that already mapped the old file keep their mapping after the unlink
+        if old_entry:
+            try:
+                os.remove(os.path.join(self.path, old_entry["file"]))
+            except FileNotFoundError:
+                pass
+        return file_path
+
+    def record_query(self, query: str, db_name: str, arrow_path: str) -> Optional[str]:
+        """
+        Count a `sql_query` run and publish its result once it is popular enough
+
+        An expired result is replaced by the fresh one once the query is popular again.
+
+        Returns:
+        str: Name of the published table, None if the result was not published
+        """
+        key = self.query_key(query, db_name)
+        with self.lock:
+            self.query_counts[key] += 1
+            count = self.query_counts[key]
+
+        if count >= self.promote_after and self.get(query, db_name) is None:
+            name = f"query_{key}"
+            self.publish(name, arrow_path, source="query", query=query, db_name=db_name)
+            with self.lock:
+                self.query_counts.pop(key, None)
+            return name
+        return None
+
+    def invalidate(self, db_name: str = None) -> int:
+        """
+        Hook for database updates: drop the promoted query results (of `db_name`, or all)
+
+        Returns:
+        int: Number of dropped tables
+        """
+        with self.lock:
+            index = self.index()
+            dropped = {
+                name: entry for name, entry in ((name, self.entry(name)) for name in index)
+                if entry and entry["source"] == "query" and (db_name is None or entry["db_name"] == db_name)
+            }
+            self._save_index({name: entry for name, entry in index.items() if name not in dropped})
+            self.query_counts.clear()
+
+        for entry in dropped.values():
+            try:
+                os.remove(os.path.join(self.path, entry["file"]))
+            except FileNotFoundError:
+                pass
+        return len(dropped)
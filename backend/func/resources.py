@@ -0,0 +1,185 @@
+import os, time, uuid, logging, resource
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class ResourceLimits:
+    def __init__(self, cpus: float = None, memory_mb: int = None, pids: int = None, cpu_weight: int = 100,
+                 cgroup_root: str = "/sys/fs/cgroup/sciscigpt", rlimit_memory: bool = False):
+        """
+        Per-kernel resource limits, enforced with cgroups v2 when available and rlimits otherwise
+
+        With cgroups every kernel gets its own group with a CPU quota (`cpu.max`), a fair
+        CPU share (`cpu.weight`), a memory cap (`memory.max`) and a process cap (`pids.max`).
+        The rlimit fallback lowers the priority of low-weight kernels; it cannot enforce a
+        CPU quota. It caps processes with `RLIMIT_NPROC`, which counts every process of the
+        kernel's user rather than of the kernel alone. It only caps memory if `rlimit_memory`
+        is set: `RLIMIT_AS` limits the address space, which also counts the virtual memory
+        reserved (not used) by e.g. Julia or jemalloc in pyarrow, so such kernels fail well
+        below the cap. Limits that could not be applied are logged and listed under
+        `unenforced` in the handle and in `usage`.
+
+        Parameters:
+        cpus (float): CPU cores a kernel may use (None for no quota)
+        memory_mb (int): Memory cap in MB (None for no cap)
+        pids (int): Maximum number of processes/threads (None for no cap)
+        cpu_weight (int): Relative CPU share under contention (cgroup `cpu.weight`, 1-10000)
+        cgroup_root (str): Parent cgroup of the kernel groups (must be writable)
+        rlimit_memory (bool): Without cgroups, cap `memory_mb` of address space with `RLIMIT_AS`
+        """
+        self.cpus = cpus
+        self.memory_mb = memory_mb
+        self.pids = pids
+        self.cpu_weight = cpu_weight
+        self.cgroup_root = cgroup_root
+        self.rlimit_memory = rlimit_memory
+        self._cgroups_available: Optional[bool] = None
+        self._warned = set()
+
+    @classmethod
+    def from_env(cls) -> Optional["ResourceLimits"]:
+        """Limits configured by the `SANDBOX_KERNEL_*` environment variables (None if none is set)"""
+        def env(name, cast):
+            value = os.getenv(name)
+            return cast(value) if value else None
+        names = ["SANDBOX_KERNEL_CPUS", "SANDBOX_KERNEL_MEMORY_MB", "SANDBOX_KERNEL_PIDS", "SANDBOX_KERNEL_CPU_WEIGHT"]
+        if not any(os.getenv(name) for name in names):
+            return None
+        return cls(
+            cpus=env("SANDBOX_KERNEL_CPUS", float),
+            memory_mb=env("SANDBOX_KERNEL_MEMORY_MB", int),
+            pids=env("SANDBOX_KERNEL_PIDS", int),
+            cpu_weight=env("SANDBOX_KERNEL_CPU_WEIGHT", int) or 100,
+            rlimit_memory=os.getenv("SANDBOX_KERNEL_RLIMIT_AS", "false").lower() == "true",
+        )
+
+    def cgroups_available(self) -> bool:
+        """Check (once) that a cgroups v2 hierarchy with the needed controllers can be created"""
+        if self._cgroups_available is None:
+            # The parent must be a cgroup2 mount (v1 and hybrid hierarchies are not supported)
+            if not os.path.exists(os.path.join(os.path.dirname(self.cgroup_root), "cgroup.controllers")):
+                self._cgroups_available = False
+                return False
+            try:
+                os.makedirs(self.cgroup_root, exist_ok=True)
+                for path in [os.path.dirname(self.cgroup_root), self.cgroup_root]:
+                    with open(os.path.join(path, "cgroup.subtree_control"), "w") as f:
+                        f.write("+cpu +memory +pids")
+                self._cgroups_available = True
+            except OSError:
+                self._cgroups_available = False
+        return self._cgroups_available
+
+    def apply(self, pid: int) -> Dict:
+        """
+        Put the process `pid` under these limits
+
+        Returns:
+        dict: Handle for `usage` and `release`
+        """
+        if self.cgroups_available():
+            cgroup = os.path.join(self.cgroup_root, f"kernel-{uuid.uuid4().hex[:12]}")
+            os.makedirs(cgroup)
+            settings = {
+                "cpu.weight": self.cpu_weight,
+                "cpu.max": f"{int(self.cpus * 100_000)} 100000" if self.cpus else None,
+                "memory.max": self.memory_mb * 1024 * 1024 if self.memory_mb else None,
+                "pids.max": self.pids,
+            }
+            for name, value in settings.items():
+                if value is not None:
+                    with open(os.path.join(cgroup, name), "w") as f:
+                        f.write(str(value))
+            with open(os.path.join(cgroup, "cgroup.procs"), "w") as f:
+                f.write(str(pid))
+            return {"pid": pid, "cgroup": cgroup}
+
+        unenforced = []
+        if self.cpus:
+            unenforced.append("cpus")
+        if self.memory_mb and not self.rlimit_memory:
+            unenforced.append("memory_mb")
+        # Raising the priority of high-weight kernels would need CAP_SYS_NICE
+        if self.cpu_weight > 100:
+            unenforced.append("cpu_weight")
+
+        rlimits = [
+            ("memory_mb", resource.RLIMIT_AS, self.memory_mb * 1024 * 1024 if self.memory_mb and self.rlimit_memory else None),
+            ("pids", resource.RLIMIT_NPROC, self.pids),
+        ]
+        for name, rlimit, limit in rlimits:
+            if limit is None:
+                continue
+            try:
+                resource.prlimit(pid, rlimit, (limit, limit))
+            except (OSError, ValueError):
+                unenforced.append(name)
+        if self.cpu_weight < 100:
+            os.setpriority(os.PRIO_PROCESS, pid, min(19, int(19 * (1 - self.cpu_weight / 100))))
+
+        if unenforced and tuple(unenforced) not in self._warned:
+            self._warned.add(tuple(unenforced))
+            logger.warning("cgroups v2 is not available, kernel limits not enforced: %s", ", ".join(unenforced))
+        return {"pid": pid, "cgroup": None, "unenforced": unenforced}
+
+    def release(self, handle: Dict):
+        """Remove the cgroup of a kernel that has been shut down"""
+        if not handle.get("cgroup"):
+            return
+        for _ in range(10):
+            try:
+                os.rmdir(handle["cgroup"])
+                return
+            except FileNotFoundError:
+                return
+            except OSError:
+                time.sleep(0.2)  # processes are still exiting
+
+
+def _read(path: str) -> Optional[str]:
+    try:
+        with open(path) as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def usage(handle: Dict) -> Dict:
+    """
+    CPU and memory usage of a kernel since it started
+
+    Returns:
+    dict: cpu_seconds, rss_mb and peak_rss_mb (None where unavailable), and the limits
+        that are not enforced on the kernel (`unenforced`)
+    """
+    cpu_seconds = rss_mb = peak_rss_mb = None
+
+    if handle.get("cgroup"):
+        cpu_stat = _read(os.path.join(handle["cgroup"], "cpu.stat")) or ""
+        for line in cpu_stat.splitlines():
+            if line.startswith("usage_usec"):
+                cpu_seconds = int(line.split()[1]) / 1e6
+        current = _read(os.path.join(handle["cgroup"], "memory.current"))
+        peak = _read(os.path.join(handle["cgroup"], "memory.peak"))
+        rss_mb = int(current) / 2**20 if current else None
+        peak_rss_mb = int(peak) / 2**20 if peak else rss_mb
+    else:
+        stat = _read(f"/proc/{handle['pid']}/stat")
+        if stat:
+            # utime, stime, cutime, cstime follow the parenthesized command name
+            fields = stat.rsplit(")", 1)[1].split()
+            cpu_seconds = sum(int(v) for v in fields[11:15]) / os.sysconf("SC_CLK_TCK")
+        status = _read(f"/proc/{handle['pid']}/status") or ""
+        for line in status.splitlines():
+            if line.startswith("VmRSS:"):
+                rss_mb = int(line.split()[1]) / 1024
+            elif line.startswith("VmHWM:"):
+                peak_rss_mb = int(line.split()[1]) / 1024
+
+    return {
+        "cpu_seconds": round(cpu_seconds, 2) if cpu_seconds is not None else None,
+        "rss_mb": round(rss_mb, 1) if rss_mb is not None else None,
+        "peak_rss_mb": round(peak_rss_mb, 1) if peak_rss_mb is not None else None,
+        "unenforced": handle.get("unenforced", []),
+    }
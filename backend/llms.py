@@ -1,73 +1,208 @@
 # All claude models: https://docs.anthropic.com/en/docs/about-claude/models
 from langchain_google_vertexai.model_garden import ChatAnthropicVertex
 from langchain_anthropic import ChatAnthropic
+import os, json, time, hashlib, threading
 
+from func.llm_replay import ReplayChatModel, replay_store_from_env
+from func.llm_scheduler import LLMScheduler, ScheduledChatModel, priority_value
+from func.llm_hedging import HedgedChatModel, LatencyTracker
 
-def load_llm(metadata: dict, **kwargs):
-    model_name = metadata.get("model_name")
-    if not model_name:
-        raise ValueError("metadata.model_name is required")
 
-    api_key = metadata.get("api_key")
-    api_key = api_key if isinstance(api_key, str) else None
+class LLMPool:
+    def __init__(self, idle_ttl: float = 600, maxsize: int = 64):
+        """
+        Pool of chat model clients shared across node calls
 
-    if api_key:
-        anthropic_model_config = {
-            "api_key": api_key,
-            "temperature": 0.0,
-        }
+        Clients are keyed by (provider, model, hashed api key, kwargs), so every call with
+        the same configuration reuses one client and its HTTP connections. Chat model
+        clients hold no per-call state and are safe to use from concurrent requests.
+        Entries idle for more than `idle_ttl` seconds are dropped.
+        """
+        self.idle_ttl = idle_ttl
+        self.maxsize = maxsize
+        self.entries = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
 
-        model_config = {
-            "claude-4.5": {
-                "model_name": "claude-sonnet-4-5-20250929"
-            },
-            "claude-4.0": {
-                "model_name": "claude-sonnet-4-20250514"
-            },
-            "claude-3.7": {
-                "model_name": "claude-3-7-sonnet-20250219"
-            },
-        }
+    @staticmethod
+    def key(provider: str, model_name: str, api_key: str, kwargs: dict) -> tuple:
+        api_key_hash = hashlib.sha256(api_key.encode()).hexdigest()[:16] if api_key else None
+        return (provider, model_name, api_key_hash, json.dumps(kwargs, sort_keys=True, default=repr))
+
+    def get(self, key: tuple, factory):
+        now = time.monotonic()
+        with self.lock:
+            for expired in [k for k, (_, last_used) in self.entries.items() if now - last_used > self.idle_ttl]:
+                del self.entries[expired]
+            if key in self.entries:
+                self.hits += 1
+                llm = self.entries[key][0]
+            else:
+                self.misses += 1
+                if len(self.entries) >= self.maxsize:
+                    del self.entries[min(self.entries, key=lambda k: self.entries[k][1])]
+                llm = factory()
+            self.entries[key] = (llm, now)
+            return llm
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {"clients": len(self.entries), "hits": self.hits, "misses": self.misses}
+
+
+llm_pool = LLMPool(idle_ttl=float(os.getenv("LLM_POOL_IDLE_TTL", 600)))
+llm_scheduler = LLMScheduler.from_env()
+
+# Record/replay of model calls for offline, deterministic runs (LLM_CACHE_MODE: off, record, replay or auto)
+llm_replay_store = replay_store_from_env()
+llm_replay_mode = os.getenv("LLM_CACHE_MODE", "off")
+llm_replay_match = os.getenv("LLM_CACHE_MATCH", "strict")
+
+
+# Hedging between Anthropic and Vertex AI (LLM_HEDGE_THRESHOLD: seconds to the first token, 0: off)
+llm_hedge_threshold = float(os.getenv("LLM_HEDGE_THRESHOLD", 0))
+llm_latency = LatencyTracker()
+
+
+def _hedge(primary, primary_name: str, alternate, alternate_name: str, kwargs: dict) -> HedgedChatModel:
+    return HedgedChatModel(
+        primary=primary,
+        alternate=alternate,
+        primary_name=primary_name,
+        alternate_name=alternate_name,
+        threshold=llm_hedge_threshold,
+        tracker=llm_latency,
+        disable_streaming=kwargs.get("disable_streaming", False),
+    )
+
+
+def _replay(llm, model_name: str, kwargs: dict) -> ReplayChatModel:
+    return ReplayChatModel(
+        llm=llm,
+        store=llm_replay_store,
+        model_name=model_name,
+        mode=llm_replay_mode,
+        match=llm_replay_match,
+        call_options={k: v for k, v in kwargs.items() if k != "disable_streaming"},
+        disable_streaming=kwargs.get("disable_streaming", False),
+    )
 
-        if model_name not in model_config:
-            raise ValueError(f"Unsupported model_name '{model_name}' for Anthropic")
 
-        llm = ChatAnthropic(
+def _load_anthropic(model_name: str, api_key: str, priority: int, kwargs: dict) -> ScheduledChatModel:
+    anthropic_model_config = {
+        "api_key": api_key,
+        "temperature": 0.0,
+        "max_retries": 0,
+    }
+
+    model_config = {
+        "claude-4.5": {
+            "model_name": "claude-sonnet-4-5-20250929"
+        },
+        "claude-4.0": {
+            "model_name": "claude-sonnet-4-20250514"
+        },
+        "claude-3.7": {
+            "model_name": "claude-3-7-sonnet-20250219"
+        },
+    }
+
+    if model_name not in model_config:
+        raise ValueError(f"Unsupported model_name '{model_name}' for Anthropic")
+
+    key = LLMPool.key("anthropic", model_name, api_key, kwargs)
+    llm = llm_pool.get(
+        key,
+        lambda: ChatAnthropic(
             **model_config[model_name], 
             **anthropic_model_config, 
             **kwargs,
         )
+    )
+    return ScheduledChatModel(
+        llm=llm,
+        scheduler=llm_scheduler,
+        scope=f"anthropic:{model_name}:{key[2]}",
+        priority=priority,
+        disable_streaming=kwargs.get("disable_streaming", False),
+    )
 
-    else:
-        # Initialise the Model
-        google_vertexai_model_config = {
-            "project": "ksm-rch-sciscigpt",
-            "location": "us-east5",
-            "temperature": 0.0,
-        }
 
-        model_config = {
-            "claude-4.5": {
-                "model_name": "claude-sonnet-4-5@20250929",
-                "max_output_tokens": 64_000,
-            },
-            "claude-4.0": {
-                "model_name": "claude-sonnet-4@20250514",
-                "max_output_tokens": 64_000,
-            },
-            "claude-3.7": {
-                "model_name": "claude-3-7-sonnet@20250219",
-                "max_output_tokens": 64_000,
-            }
+def _load_vertex(model_name: str, priority: int, kwargs: dict) -> ScheduledChatModel:
+    # Initialise the Model
+    google_vertexai_model_config = {
+        "project": "ksm-rch-sciscigpt",
+        "location": "us-east5",
+        "temperature": 0.0,
+        "max_retries": 0,
+    }
+
+    model_config = {
+        "claude-4.5": {
+            "model_name": "claude-sonnet-4-5@20250929",
+            "max_output_tokens": 64_000,
+        },
+        "claude-4.0": {
+            "model_name": "claude-sonnet-4@20250514",
+            "max_output_tokens": 64_000,
+        },
+        "claude-3.7": {
+            "model_name": "claude-3-7-sonnet@20250219",
+            "max_output_tokens": 64_000,
         }
+    }
 
-        if model_name not in model_config:
-            raise ValueError(f"Unsupported model_name '{model_name}' for Vertex AI")
+    if model_name not in model_config:
+        raise ValueError(f"Unsupported model_name '{model_name}' for Vertex AI")
 
-        llm = ChatAnthropicVertex(
+    llm = llm_pool.get(
+        LLMPool.key("vertex", model_name, None, kwargs),
+        lambda: ChatAnthropicVertex(
             **model_config[model_name],
             **google_vertexai_model_config,
             **kwargs,
         )
+    )
+    return ScheduledChatModel(
+        llm=llm,
+        scheduler=llm_scheduler,
+        scope=f"vertex:{model_name}",
+        priority=priority,
+        disable_streaming=kwargs.get("disable_streaming", False),
+    )
+
+
+def load_llm(metadata: dict, priority: str = "specialist", **kwargs):
+    """
+    Chat model of `metadata.model_name`: Anthropic direct if `metadata.api_key` is set, Vertex AI otherwise
+
+    Calls are admitted by the shared scheduler at `priority` ("manager", "specialist",
+    "literature" or "evaluation") and retried there, so the clients do not retry themselves.
+    If LLM_HEDGE_THRESHOLD is set, calls without a first token after that many seconds
+    are also sent to the other backend (Vertex AI, or Anthropic with ANTHROPIC_API_KEY).
+    """
+    model_name = metadata.get("model_name")
+    if not model_name:
+        raise ValueError("metadata.model_name is required")
+
+    # Replayed sessions need no credentials or live client
+    if llm_replay_store is not None and llm_replay_mode == "replay":
+        return _replay(None, model_name, kwargs)
+
+    api_key = metadata.get("api_key")
+    api_key = api_key if isinstance(api_key, str) else None
+    priority = priority_value(priority)
+
+    if api_key:
+        llm = _load_anthropic(model_name, api_key, priority, kwargs)
+        if llm_hedge_threshold:
+            llm = _hedge(llm, "anthropic", _load_vertex(model_name, priority, kwargs), "vertex", kwargs)
+    else:
+        llm = _load_vertex(model_name, priority, kwargs)
+        if llm_hedge_threshold and os.getenv("ANTHROPIC_API_KEY"):
+            llm = _hedge(llm, "vertex", _load_anthropic(model_name, os.getenv("ANTHROPIC_API_KEY"), priority, kwargs), "anthropic", kwargs)
 
+    if llm_replay_store is not None:
+        llm = _replay(llm, model_name, kwargs)
     return llm
@@ -22,6 +22,7 @@ import Pkg; Pkg.add("GraphDataFrameBridge")  # Bridge between Graphs and DataFra
 # Install data analysis and manipulation packages
 import Pkg; Pkg.add("DataFrames")  # Tabular data manipulation
 import Pkg; Pkg.add("CSV")      # CSV file reading/writing
+import Pkg; Pkg.add("Arrow")    # Arrow IPC files (memory-mapped SQL results)
 import Pkg; Pkg.add("JSON3")    # JSON parsing and generation
 import Pkg; Pkg.add("Statistics")  # Statistical functions
 import Pkg; Pkg.add("Distributions")  # Probability distributions
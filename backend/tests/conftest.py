@@ -0,0 +1,4 @@
+import os, sys
+
+# Modules import each other as top-level packages (`func`, `tools`, `agents`), as when the app runs from backend/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,48 @@
+import pandas as pd
+
+from func.context_packing import MinHashLSH, count_tokens, pack_sections
+
+
+ABSTRACT = ("We find that large teams develop and further existing ideas whereas small teams disrupt "
+            "science and technology with new ideas and opportunities across papers patents and software")
+
+
+def test_minhash_detects_near_duplicates_only():
+    lsh = MinHashLSH(threshold=0.8)
+    assert lsh.add_if_new(ABSTRACT)
+    # The same text with different case and punctuation, and with one word changed at the end
+    assert not lsh.add_if_new(ABSTRACT.upper() + ".")
+    assert not lsh.add_if_new(ABSTRACT.replace("software", "code"))
+    assert lsh.add_if_new("Citation dynamics of scientific papers follow a universal pattern of aging and preferential attachment")
+    assert len(lsh.signatures) == 2
+
+
+def sections(rows: list) -> pd.DataFrame:
+    return pd.DataFrame(rows, columns=["url", "section_id", "text", "relevance", "title"])
+
+
+def test_pack_sections_merges_duplicates_and_keeps_the_most_relevant_copy():
+    df = sections([
+        ("a", 0, ABSTRACT, 0.5, "A"),
+        ("a", 0, ABSTRACT, 0.25, "A"),  # retrieved again by another query
+        ("preprint", 0, ABSTRACT.replace("software", "code"), 0.6, "A (preprint)"),
+        ("b", 1, "Citation dynamics of scientific papers", 0.1, "B"),
+    ])
+    selected, stats = pack_sections(df)
+    # The summed relevance (0.75) beats the preprint (0.6)
+    assert selected["url"].tolist() == ["a", "b"] and "relevance" not in selected
+    assert stats["exact_duplicates"] == 1 and stats["near_duplicates"] == 1 and stats["over_budget"] == 0
+    assert stats["tokens_saved"] == stats["tokens_before"] - stats["tokens_after"] > 0
+
+
+def test_pack_sections_respects_the_token_budget():
+    texts = [f"Section {i} " + " ".join(f"word{i}_{j}" for j in range(40)) for i in range(6)]
+    df = sections([(f"paper{i % 3}", i, text, 1 - i / 10, f"Title {i % 3}") for i, text in enumerate(texts)])
+    budget = 2 * count_tokens(texts[0]) + 40
+    selected, stats = pack_sections(df, token_budget=budget)
+    assert selected["section_id"].tolist() == [0, 1]
+    assert stats["over_budget"] == 4
+    assert sum(count_tokens(t) for t in selected["text"]) <= budget
+
+    selected, stats = pack_sections(df, token_budget=None)
+    assert len(selected) == 6 and stats["over_budget"] == 0
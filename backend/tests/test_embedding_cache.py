@@ -0,0 +1,78 @@
+import asyncio
+
+import numpy as np
+import pytest
+from langchain_core.embeddings import Embeddings
+
+from func.embedding_cache import CachedEmbeddings, cached_embeddings
+
+
+class CountingEmbeddings(Embeddings):
+    def __init__(self, dim: int = 8):
+        self.dim = dim
+        self.calls = []
+
+    def vector(self, text: str) -> list:
+        return np.random.default_rng(sum(text.encode())).normal(size=self.dim).astype(np.float32).tolist()
+
+    def embed_documents(self, texts):
+        self.calls.append(list(texts))
+        return [self.vector(text) for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+def test_vectors_round_trip_and_persist(tmp_path):
+    client = CountingEmbeddings()
+    cache = CachedEmbeddings(client, "model/a", str(tmp_path))
+    texts = ["citation dynamics", "team science", "citation dynamics"]
+    assert cache.embed_documents(texts) == [client.vector(t) for t in texts]
+    assert client.calls == [["citation dynamics", "team science"]]
+
+    assert cache.embed_query("team science") == client.vector("team science")
+    assert asyncio.run(cache.aembed_documents(["citation dynamics"])) == [client.vector("citation dynamics")]
+    assert len(client.calls) == 1 and cache.stats()["hits"] == 2 and cache.stats()["misses"] == 3
+
+    # A new instance (e.g. after a restart) reads the vectors from disk
+    reopened = CachedEmbeddings(CountingEmbeddings(), "model/a", str(tmp_path))
+    assert reopened.embed_documents(texts) == [client.vector(t) for t in texts]
+    assert reopened.embeddings.calls == []
+
+
+def test_least_recently_used_vectors_are_evicted(tmp_path):
+    client = CountingEmbeddings()
+    cache = CachedEmbeddings(client, "model", str(tmp_path), capacity=2)
+    cache.embed_documents(["a", "b"])
+    cache.embed_query("a")
+    cache.embed_query("c")
+    assert cache.stats()["size"] == 2
+    client.calls.clear()
+    assert cache.embed_documents(["a", "c"]) == [client.vector("a"), client.vector("c")] and client.calls == []
+    cache.embed_query("b")
+    assert client.calls == [["b"]]
+
+
+def test_instances_sharing_a_directory_do_not_overwrite_each_other(tmp_path):
+    # Stands in for two server processes with the same cache directory
+    first = CachedEmbeddings(CountingEmbeddings(), "model", str(tmp_path), capacity=4)
+    second = CachedEmbeddings(CountingEmbeddings(), "model", str(tmp_path), capacity=4)
+    first.embed_documents(["a", "b"])
+    second.embed_documents(["c", "d"])
+    for cache in [first, second]:
+        assert cache.embed_documents(["a", "b", "c", "d"]) == [cache.embeddings.vector(t) for t in "abcd"]
+    assert len(first.embeddings.calls) == 1 and len(second.embeddings.calls) == 1
+
+
+def test_caches_are_keyed_by_model_and_dimension(tmp_path, monkeypatch):
+    monkeypatch.setenv("EMBEDDING_CACHE_PATH", str(tmp_path))
+    monkeypatch.setattr("func.embedding_cache.caches", {})
+    small, large = CountingEmbeddings(dim=4), CountingEmbeddings(dim=8)
+    assert cached_embeddings(small, "model", dimensions=4) is not cached_embeddings(large, "model")
+    assert cached_embeddings(small, "model", dimensions=4).path != cached_embeddings(large, "model").path
+
+    cache = CachedEmbeddings(small, "model", str(tmp_path / "mixed"))
+    cache.embed_query("a")
+    cache.embeddings = large
+    with pytest.raises(ValueError):
+        cache.embed_query("b")
@@ -0,0 +1,115 @@
+import os, re, time, threading
+
+import pytest
+
+from func.jupyter import JupyterSandbox
+from func.kernels import KernelProvider
+
+
+class FakeProvider(KernelProvider):
+    def __init__(self):
+        self.running = 0
+
+    def start_kernel(self, kernel_name: str = None, session_id: str = None):
+        self.running += 1
+        return {'kc': None, 'host': 'localhost'}
+
+    def shutdown_kernel(self, kernel):
+        self.running -= 1
+
+
+class FakeSandbox(JupyterSandbox):
+    """Sandbox whose cells sleep for the number of seconds given as code, with fake snapshots"""
+
+    restored = None
+
+    def _run_code(self, kc, code: str, timeout: int = 120, on_output=None) -> list:
+        path = re.search(r"\('(.*)'\)", code)
+        if code.startswith("_sciscigpt_kernel.snapshot_namespace"):
+            os.makedirs(path.group(1))
+            for name, content in [("0.pkl", "state"), ("manifest.json", "{}")]:
+                with open(os.path.join(path.group(1), name), "w") as f:
+                    f.write(content)
+            return []
+        if code.startswith("_sciscigpt_kernel.restore_and_report"):
+            with open(os.path.join(path.group(1), "0.pkl")) as f:
+                self.restored = f.read()
+            return []
+        try:
+            time.sleep(float(code))
+        except ValueError:
+            pass
+        return []
+
+
+def test_reaper_skips_busy_sessions(tmp_path):
+    sandbox = FakeSandbox(str(tmp_path / "workspace"), provider=FakeProvider())
+    sandbox.execute_code("0", session_id="idle", cell_id="1")
+
+    busy = threading.Thread(target=sandbox.execute_code, args=("0.5", "busy", "1"))
+    busy.start()
+    time.sleep(0.1)
+    sandbox.sessions["busy"]['last_used'] = 0
+    sandbox.sessions["idle"]['last_used'] = 0
+
+    sandbox.cleanup_inactive_sessions(max_idle_time=60)
+    assert list(sandbox.sessions) == ["busy"]
+    busy.join()
+    sandbox.cleanup_inactive_sessions(max_idle_time=60)
+    assert list(sandbox.sessions) == ["busy"]
+
+    sandbox.close_all_sessions()
+    assert sandbox.sessions == {} and sandbox.provider.running == 0
+
+
+def test_snapshots_are_kept_outside_the_workspace(tmp_path):
+    with pytest.raises(ValueError):
+        FakeSandbox(str(tmp_path), snapshot_dir=str(tmp_path / ".snapshots"), provider=FakeProvider())
+    FakeSandbox(str(tmp_path / "workspace"), snapshot_dir=str(tmp_path / "snapshots"), provider=FakeProvider())
+
+
+def test_snapshots_are_signed_and_tampered_ones_are_not_restored(tmp_path):
+    sandbox = FakeSandbox(str(tmp_path / "workspace"), snapshot_dir=str(tmp_path / "snapshots"), provider=FakeProvider())
+    for session_id in ["a/b", "a_b"]:
+        sandbox.execute_code("0", session_id=session_id, cell_id="1")
+    sandbox.close_all_sessions(snapshot=True)
+    # Session ids that only differ in special characters have their own snapshots
+    assert sandbox._snapshot_path("a/b") != sandbox._snapshot_path("a_b")
+    assert all(os.path.exists(os.path.join(sandbox._snapshot_path(s), "signature")) for s in ["a/b", "a_b"])
+
+    sandbox.execute_code("0", session_id="a/b", cell_id="2")
+    assert sandbox.restored == "state" and not os.path.exists(sandbox._snapshot_path("a/b"))
+
+    # Another session plants a pickle in the snapshot
+    with open(os.path.join(sandbox._snapshot_path("a_b"), "0.pkl"), "w") as f:
+        f.write("payload")
+    sandbox.restored = None
+    sandbox.execute_code("0", session_id="a_b", cell_id="2")
+    assert sandbox.restored is None and not os.path.exists(sandbox._snapshot_path("a_b"))
+    assert [name for name in os.listdir(sandbox.snapshot_dir)] == []
+
+
+def test_session_locks_are_dropped_when_unused(tmp_path):
+    sandbox = FakeSandbox(str(tmp_path / "workspace"), provider=FakeProvider())
+    for i in range(5):
+        sandbox.execute_code("0", session_id=str(i), cell_id="1")
+    for i in range(5):
+        sandbox.sessions[str(i)]['last_used'] = 0
+    sandbox.cleanup_inactive_sessions(max_idle_time=60)
+    assert sandbox.sessions == {} and sandbox.session_locks == {}
+
+
+def test_outputs_are_streamed_while_the_cell_runs(tmp_path):
+    sandbox = JupyterSandbox(str(tmp_path / "workspace"), snapshot_dir=str(tmp_path / "snapshots"))
+    streamed = []
+    try:
+        outputs = sandbox.execute_code(
+            "import time\nprint('first', flush=True)\ntime.sleep(1)\nprint('second')", session_id="s", cell_id="1",
+            on_output=lambda output: streamed.append((time.time(), output)))
+        finished = time.time()
+    finally:
+        sandbox.close_all_sessions()
+
+    assert "".join(o['text'] for _, o in streamed) == "".join(o['text'] for o in outputs) == "first\nsecond\n"
+    assert finished - streamed[0][0] > 0.5
+    assert all(o['cell_id'] == "1" and o['session_id'] == "s" for _, o in streamed)
@@ -0,0 +1,88 @@
+import os, time, random
+
+import pytest
+
+from func.kernels import KernelProvider, RemoteKernelProvider, LocalMultiProcessKernelProvider
+
+
+def kernel_pid(kernel) -> int:
+    outputs = []
+    kernel['kc'].execute_interactive(
+        "import os; print(os.getpid())", timeout=30,
+        output_hook=lambda msg: outputs.append(msg['content'].get('text', '')))
+    return int("".join(outputs))
+
+
+def running(pid: int) -> bool:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            return "\nState:\tZ" not in f.read()
+    except FileNotFoundError:
+        return False
+
+
+@pytest.fixture
+def provider():
+    provider = LocalMultiProcessKernelProvider(n_workers=2, base_port=random.randint(20000, 30000))
+    yield provider
+    provider.close()
+
+
+def test_sessions_are_placed_on_the_least_loaded_worker_and_keep_it(provider):
+    first = provider.start_kernel(session_id="a")
+    second = provider.start_kernel(session_id="b")
+    assert first['worker'] != second['worker']
+    assert [load["kernels"] for load in provider.load().values()] == [1, 1]
+
+    # A returning session goes back to its worker, even if another one is less loaded
+    provider.shutdown_kernel(second)
+    again = provider.start_kernel(session_id="a")
+    assert again['worker'] == first['worker'] and provider.preferred_host("a") == again['host']
+    third = provider.start_kernel(session_id="c")
+    assert third['worker'] == second['worker']
+
+    for kernel in [first, again, third]:
+        provider.shutdown_kernel(kernel)
+    assert [load["kernels"] for load in provider.load().values()] == [0, 0]
+
+
+def test_kernels_are_released_when_the_workers_shut_down(provider):
+    kernels = [provider.start_kernel(session_id=session_id) for session_id in ["a", "b", "c"]]
+    pids = [kernel_pid(kernel) for kernel in kernels]
+    assert all(running(pid) for pid in pids)
+    for kernel in kernels:
+        kernel['kc'].stop_channels()
+
+    provider.close()
+    deadline = time.time() + 10
+    while any(running(pid) for pid in pids) and time.time() < deadline:
+        time.sleep(0.2)
+    assert not any(running(pid) for pid in pids)
+
+
+def test_providers_must_implement_start_and_shutdown():
+    class Incomplete(KernelProvider):
+        def start_kernel(self, kernel_name: str = None, session_id: str = None):
+            return {}
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+def test_worker_loads_are_polled_at_most_once_per_ttl():
+    class CountingProvider(RemoteKernelProvider):
+        polls = 0
+
+        def _call(self, worker, *request):
+            self.polls += request[0] == "load"
+            return {"kernels": 0, "cpus": 1, "loadavg": 0.0}
+
+    provider = CountingProvider([("a", 1), ("b", 2)], authkey=b"", load_ttl=60, max_affinity=2)
+    workers = [provider._select_worker() for _ in range(3)]
+    assert provider.polls == 2
+    # Kernels started in between are counted locally
+    provider._count_kernel(workers[0], 1)
+    assert provider._select_worker() != workers[0]
+
+    for session_id in ["x", "y", "z"]:
+        provider.bind(session_id, {"worker": ("a", 1)})
+    assert list(provider.affinity) == ["y", "z"] and provider.preferred_host("x") is None
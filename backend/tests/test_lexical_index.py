@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+from langchain_core.documents import Document
+
+from func.lexical_index import BM25Index, reciprocal_rank_fusion, tokenize
+from func.local_index import LocalVectorStore
+
+
+TEXTS = [
+    "Team size and disruption in science",
+    "Large teams develop and small teams disrupt science and technology",
+    "Citation dynamics of scientific papers",
+    "Gender gaps in scientific careers and citation",
+]
+METADATA = [{"url": f"https://doi.org/{i}", "section_id": 0, "year": 2010 + i} for i in range(len(TEXTS))]
+
+
+@pytest.fixture
+def index(tmp_path):
+    BM25Index.build(str(tmp_path), TEXTS, METADATA)
+    return BM25Index(str(tmp_path))
+
+
+def test_bm25_ranks_sections_by_matching_terms(index):
+    assert tokenize("The teams of the science") == ["teams", "science"]
+    rows = [row for row, _ in index.search("small teams disrupt")]
+    assert rows == [1]
+    rows = [row for row, _ in index.search("citation in science")]
+    assert set(rows) == {0, 1, 2, 3}
+    # A term that occurs in one section weighs more than one in two
+    assert index.search("disruption citation", k=1)[0][0] == 0
+    assert index.search("unrelated words") == []
+
+
+def test_bm25_applies_metadata_filters(index):
+    rows = [row for row, _ in index.search("citation", filter={"year": {"$gte": 2013}})]
+    assert rows == [3]
+    docs = index.similarity_search_with_score("citation", k=1, filter={"year": 2012})
+    assert docs[0][0].page_content == TEXTS[2] and docs[0][0].metadata["url"] == "https://doi.org/2"
+
+
+def test_bm25_shares_the_records_of_a_local_replica(tmp_path):
+    LocalVectorStore.build(str(tmp_path / "replica"), np.eye(len(TEXTS), 8), TEXTS, METADATA)
+    store = LocalVectorStore(str(tmp_path / "replica"), embedding=None)
+    BM25Index.build(str(tmp_path / "bm25"), TEXTS, METADATA)
+    index = BM25Index(str(tmp_path / "bm25"), store=store)
+    assert index.texts is store.texts and index.filter is store.filter
+
+    BM25Index.build(str(tmp_path / "other"), TEXTS[:2], METADATA[:2])
+    with pytest.raises(ValueError):
+        BM25Index(str(tmp_path / "other"), store=store)
+
+
+def doc(url: str, section_id: int = 0) -> Document:
+    return Document(page_content=f"{url}/{section_id}", metadata={"url": url, "section_id": section_id})
+
+
+def test_reciprocal_rank_fusion_favours_sections_found_by_several_rankings():
+    vector = [doc("a"), doc("b"), doc("c")]
+    lexical = [doc("c"), doc("d"), doc("a", 1)]
+    fused = reciprocal_rank_fusion([vector, lexical])
+    # c is found by both rankings; (a, 1) is another section than (a, 0)
+    assert [d.page_content for d in fused] == ["c/0", "a/0", "b/0", "d/0", "a/1"]
+    assert [d.page_content for d in reciprocal_rank_fusion([vector, lexical], k=2)] == ["c/0", "a/0"]
+
+    # Documents without a url are identified by their text
+    plain = [Document(page_content="x"), Document(page_content="y")]
+    assert [d.page_content for d in reciprocal_rank_fusion([plain, plain[::-1]])] == ["x", "y"]
@@ -0,0 +1,54 @@
+import time
+
+from func.literature_cache import LiteratureCache
+
+
+SETTINGS = {"k": 10, "hyde": True, "hybrid": False, "context_token_budget": None}
+CONSTRAINTS = {"min_year": 2000, "venue": None}
+
+
+def test_keys_cover_the_query_constraints_and_settings():
+    cache = LiteratureCache()
+    key = cache.summary_key("Team  size and\nDisruption", CONSTRAINTS, SETTINGS, "model")
+    # Whitespace, case and dict order do not matter
+    assert key == cache.summary_key("team size and disruption", dict(reversed(CONSTRAINTS.items())), SETTINGS, "model")
+    for other in [
+        cache.summary_key("team size and disruption", CONSTRAINTS | {"min_year": 2010}, SETTINGS, "model"),
+        cache.summary_key("team size and disruption", CONSTRAINTS, SETTINGS | {"k": 20}, "model"),
+        cache.summary_key("team size and disruption", CONSTRAINTS, SETTINGS | {"context_token_budget": 4000}, "model"),
+        cache.summary_key("team size and disruption", CONSTRAINTS, SETTINGS | {"hybrid": True}, "model"),
+        cache.summary_key("team size and disruption", CONSTRAINTS, SETTINGS, "other model"),
+    ]:
+        assert other != key
+    assert cache.retrieval_key(["A  section"], CONSTRAINTS, SETTINGS) == cache.retrieval_key(["a section"], CONSTRAINTS, SETTINGS)
+    assert cache.retrieval_key(["a section"], CONSTRAINTS, SETTINGS) != cache.retrieval_key(["a section"], CONSTRAINTS, SETTINGS | {"k": 5})
+
+
+def test_entries_expire_and_are_counted():
+    cache = LiteratureCache(retrieval_ttl=0.2, summary_ttl=60)
+    retrieval_key = cache.retrieval_key(["a section"], CONSTRAINTS, SETTINGS)
+    summary_key = cache.summary_key("query", CONSTRAINTS, SETTINGS, "model")
+    cache.put("retrieval", retrieval_key, ("results", {}))
+    cache.put("summary", summary_key, "review")
+    assert cache.get("retrieval", retrieval_key) == ("results", {})
+    time.sleep(0.3)
+    assert cache.get("retrieval", retrieval_key) is None
+    assert cache.get("summary", summary_key) == "review"
+    stats = cache.stats()
+    assert stats["retrieval"] == {"hits": 1, "misses": 1, "size": 0} and stats["summary"]["hits"] == 1
+
+
+def test_invalidation_clears_the_cache_and_changes_the_corpus_version():
+    cache = LiteratureCache(corpus_version="v1")
+    old_key = cache.summary_key("query", CONSTRAINTS, SETTINGS, "model")
+    cache.put("summary", old_key, "review")
+    cache.invalidate()
+    assert cache.get("summary", old_key) is None and cache.corpus_version == "v1"
+
+    cache.put("summary", old_key, "review")
+    cache.invalidate("v2")
+    new_key = cache.summary_key("query", CONSTRAINTS, SETTINGS, "model")
+    assert new_key != old_key and cache.get("summary", new_key) is None
+    # A result computed before the update and stored afterwards is not served under the new version
+    cache.put("summary", old_key, "stale review")
+    assert cache.get("summary", new_key) is None and cache.stats()["corpus_version"] == "v2"
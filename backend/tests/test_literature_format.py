@@ -0,0 +1,52 @@
+import pandas as pd
+from bibtexparser.bibdatabase import BibDatabase
+from bibtexparser.bwriter import BibTexWriter
+
+from func.literature_format import benchmark, dict_to_bibtex, format_output_df_as_prompt, group_sections
+
+
+def legacy_dict_to_bibtex(entry: dict) -> str:
+    db = BibDatabase()
+    db.entries = [{k: ', '.join(v) if type(v) == list else str(v) for k, v in entry.items()}]
+    writer = BibTexWriter()
+    writer.indent = '\t'
+    writer.order_entries_by = None
+    return writer.write(db)
+
+
+ENTRIES = [
+    {"ENTRYTYPE": "article", "ID": "wu2019", "title": "Large teams develop and small teams disrupt science and technology",
+     "authors": ["Lingfei Wu", "Dashun Wang", "James A. Evans"], "year": 2019, "venue": "Nature", "url": "https://doi.org/10.1038/s41586-019-0941-9"},
+    {"ENTRYTYPE": "inproceedings", "ID": "x", "title": "Braces {and} percent % signs", "authors": ["Solo Author"], "section_id": "1, 3"},
+    {"ENTRYTYPE": "misc", "ID": "empty"},
+]
+
+
+def test_dict_to_bibtex_matches_bibtexparser():
+    for entry in ENTRIES:
+        assert dict_to_bibtex(entry) == legacy_dict_to_bibtex(entry)
+    assert dict_to_bibtex(ENTRIES[1]) == (
+        "@inproceedings{x,\n\tauthors = {Solo Author},\n\tsection_id = {1, 3},\n\ttitle = {Braces {and} percent % signs}\n}\n")
+
+
+def test_sections_are_grouped_per_paper_in_section_order():
+    df = pd.DataFrame({
+        "url": ["b", "a", "b", None, "a"],
+        "section_id": [3.0, 2.0, 1.0, 0.0, 1.0],
+        "text": ["b3", "a2", "b1", "orphan", "a1"],
+        "title": ["B", "A", None, "O", "A"],
+    })
+    grouped = group_sections(df)
+    assert grouped.to_dict("records") == [
+        {"text": "a1\na2", "section_id": "1, 2", "url": "a", "title": "A"},
+        {"text": "b1\nb3", "section_id": "1, 3", "url": "b", "title": "B"},
+    ]
+
+    prompt = format_output_df_as_prompt(grouped.assign(ENTRYTYPE="article", ID=["a", "b"]))
+    assert prompt[0]["text"] == "a1\na2"
+    assert prompt[0]["bibtex"] == legacy_dict_to_bibtex({"section_id": "1, 2", "url": "a", "title": "A", "ENTRYTYPE": "article", "ID": "a"})
+
+
+def test_formatter_matches_the_previous_implementation_on_synthetic_results():
+    # benchmark asserts that both implementations return the same prompt
+    assert [result["k"] for result in benchmark(ks=(10, 50), repeat=1)] == [10, 50]
@@ -0,0 +1,78 @@
+import time, asyncio
+
+import pytest
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableLambda
+
+from func.llm_hedging import HedgedChatModel, LatencyTracker
+from func.llm_scheduler import BACKEND_TAG, LLMScheduler, ScheduledChatModel
+
+
+class SlowModel(GenericFakeChatModel):
+    delay: float = 0.0
+
+    def _stream(self, *args, **kwargs):
+        time.sleep(self.delay)
+        yield from super()._stream(*args, **kwargs)
+
+    async def _astream(self, *args, **kwargs):
+        await asyncio.sleep(self.delay)
+        async for chunk in super()._astream(*args, **kwargs):
+            yield chunk
+
+
+def backend(text: str, delay: float = 0.0, scheduler: LLMScheduler = None, scope: str = "primary"):
+    model = SlowModel(messages=iter([AIMessage(text)] * 10), delay=delay)
+    return ScheduledChatModel(llm=model, scheduler=scheduler or LLMScheduler(), scope=scope)
+
+
+def hedged(primary, alternate, threshold: float = 0.1):
+    return HedgedChatModel(
+        primary=primary, alternate=alternate, primary_name="anthropic", alternate_name="vertex",
+        threshold=threshold, tracker=LatencyTracker(),
+    )
+
+
+async def stream_events(runnable, **kwargs):
+    events = [
+        event async for event in runnable.astream_events("hi", version="v2", **kwargs)
+        if event["event"] == "on_chat_model_stream"
+    ]
+    return len(events), "".join(event["data"]["chunk"].content for event in events)
+
+
+@pytest.mark.parametrize("node", ["sync", "async"])
+def test_hedged_model_streams_each_token_once(node):
+    model = hedged(backend("hello world foo"), backend("alternate answer", scope="alternate"))
+    if node == "sync":
+        runnable = RunnableLambda(lambda x: model.invoke(x))
+    else:
+        async def call(x):
+            return await model.ainvoke(x)
+        runnable = RunnableLambda(call)
+
+    assert asyncio.run(stream_events(runnable, exclude_tags=[BACKEND_TAG])) == (5, "hello world foo")
+
+
+@pytest.mark.parametrize("node", ["sync", "async"])
+def test_slow_primary_is_hedged(node):
+    model = hedged(backend("primary", delay=1.0), backend("alternate", scope="alternate"))
+    response = model.invoke("hi") if node == "sync" else asyncio.run(model.ainvoke("hi"))
+    assert response.content == "alternate"
+    stats = model.tracker.stats()
+    assert stats["anthropic"]["hedged"] == 1 and stats["anthropic"]["cancelled"] == 1
+    assert stats["vertex"]["wins"] == 1
+
+
+@pytest.mark.parametrize("node", ["sync", "async"])
+def test_queued_primary_is_not_hedged(node):
+    # The primary scope has no budget left: the threshold only starts once the call is admitted
+    scheduler = LLMScheduler(requests_per_minute=120)
+    for _ in range(120):
+        scheduler.acquire("primary", 0, 1)
+    model = hedged(backend("primary", scheduler=scheduler), backend("alternate", scope="alternate"), threshold=0.2)
+
+    response = model.invoke("hi") if node == "sync" else asyncio.run(model.ainvoke("hi"))
+    assert response.content == "primary"
+    assert model.tracker.stats()["anthropic"]["hedged"] == 0
@@ -0,0 +1,49 @@
+import asyncio
+
+import pytest
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.runnables import RunnableLambda
+
+from func.llm_replay import LLMRecordStore, ReplayChatModel
+from func.llm_scheduler import BACKEND_TAG
+
+
+QUESTION = "what is the disruption index of papers published in nature between 1990 and 2000 by field"
+
+
+def replay(store, match: str, mode: str = "replay"):
+    llm = GenericFakeChatModel(messages=iter([AIMessage("hello world foo")] * 10))
+    return ReplayChatModel(llm=llm, store=store, model_name="fake", mode=mode, match=match)
+
+
+def test_nearest_match_is_opt_in(tmp_path):
+    store = LLMRecordStore(str(tmp_path), similarity=0.8)
+    replay(store, "strict", mode="record").invoke([HumanMessage(QUESTION)])
+
+    similar = [HumanMessage(QUESTION + " please")]
+    with pytest.raises(LookupError):
+        replay(store, "fuzzy").invoke(similar)
+    assert replay(store, "fuzzy").invoke([HumanMessage("  " + QUESTION.replace(" ", "\n"))]).content == "hello world foo"
+    assert replay(store, "nearest").invoke(similar).content == "hello world foo"
+    assert store.stats()["nearest"] == 1 and store.stats()["fuzzy"] == 1
+
+
+@pytest.mark.parametrize("node", ["sync", "async"])
+def test_recording_streams_each_token_once(tmp_path, node):
+    model = replay(LLMRecordStore(str(tmp_path)), "strict", mode="record")
+    if node == "sync":
+        runnable = RunnableLambda(lambda x: model.invoke(x))
+    else:
+        async def call(x):
+            return await model.ainvoke(x)
+        runnable = RunnableLambda(call)
+
+    async def stream_events():
+        events = [
+            event async for event in runnable.astream_events("hi", version="v2", exclude_tags=[BACKEND_TAG])
+            if event["event"] == "on_chat_model_stream"
+        ]
+        return len(events), "".join(event["data"]["chunk"].content for event in events)
+
+    assert asyncio.run(stream_events()) == (5, "hello world foo")
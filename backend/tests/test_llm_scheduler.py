@@ -0,0 +1,114 @@
+import time, asyncio, threading
+
+import pytest
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableLambda
+
+from func.llm_scheduler import BACKEND_TAG, PRIORITIES, LLMScheduler, ScheduledChatModel
+
+
+def fake_model():
+    return GenericFakeChatModel(messages=iter([AIMessage("hello world foo")] * 10))
+
+
+async def stream_events(runnable, **kwargs):
+    events = []
+    async for event in runnable.astream_events("hi", version="v2", **kwargs):
+        if event["event"] == "on_chat_model_stream":
+            events.append(event)
+    return len(events), "".join(event["data"]["chunk"].content for event in events)
+
+
+@pytest.mark.parametrize("node", ["sync", "async"])
+def test_scheduled_model_streams_each_token_once(node):
+    plain = asyncio.run(stream_events(fake_model()))
+
+    model = ScheduledChatModel(llm=fake_model(), scheduler=LLMScheduler(), scope="test")
+    if node == "sync":
+        runnable = RunnableLambda(lambda x: model.invoke(x))
+    else:
+        async def call(x):
+            return await model.ainvoke(x)
+        runnable = RunnableLambda(call)
+
+    assert asyncio.run(stream_events(runnable, exclude_tags=[BACKEND_TAG])) == plain
+    # The wrapped model is still traced, as a tagged child run
+    count, _ = asyncio.run(stream_events(runnable))
+    assert count == 2 * plain[0]
+
+
+def test_queued_calls_are_admitted_by_priority():
+    scheduler = LLMScheduler(requests_per_minute=60)
+    for _ in range(60):
+        scheduler.acquire("test", PRIORITIES["manager"], 1)
+
+    order = []
+    def call(priority):
+        scheduler.acquire("test", PRIORITIES[priority], 1)
+        order.append(priority)
+
+    threads = [threading.Thread(target=call, args=(p,)) for p in ["evaluation", "literature", "specialist", "manager"]]
+    for thread in threads:
+        thread.start()
+        time.sleep(0.05)
+    assert scheduler.stats()["test"]["queue_depth"] == 4
+    for thread in threads:
+        thread.join()
+    assert order == ["manager", "specialist", "literature", "evaluation"]
+
+
+def test_sync_and_async_callers_share_the_queue():
+    scheduler = LLMScheduler(requests_per_minute=120)
+    for _ in range(120):
+        scheduler.acquire("test", PRIORITIES["manager"], 1)
+
+    order = []
+    def sync_call():
+        scheduler.acquire("test", PRIORITIES["evaluation"], 1)
+        order.append("evaluation")
+
+    async def async_call():
+        await asyncio.sleep(0.05)
+        await scheduler.aacquire("test", PRIORITIES["manager"], 1)
+        order.append("manager")
+
+    thread = threading.Thread(target=sync_call)
+    thread.start()
+    asyncio.run(async_call())
+    thread.join()
+    assert order == ["manager", "evaluation"]
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    scheduler = LLMScheduler(requests_per_minute=60)
+    for _ in range(60):
+        scheduler.acquire("test", PRIORITIES["manager"], 1)
+
+    async def cancelled():
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(scheduler.aacquire("test", PRIORITIES["manager"], 1), timeout=0.05)
+
+    asyncio.run(cancelled())
+    assert scheduler.stats()["test"]["queue_depth"] == 0
+    assert scheduler.async_waiters == {}
+
+
+@pytest.mark.parametrize("node", ["sync", "async"])
+def test_only_the_wrapped_model_run_is_tagged(node):
+    model = ScheduledChatModel(llm=fake_model(), scheduler=LLMScheduler(), scope="test")
+    if node == "sync":
+        runnable = RunnableLambda(lambda x: model.invoke(x))
+    else:
+        async def call(x):
+            return await model.ainvoke(x)
+        runnable = RunnableLambda(call)
+
+    async def starts():
+        return [
+            event async for event in runnable.astream_events("hi", version="v2")
+            if event["event"] == "on_chat_model_start"
+        ]
+
+    tagged = [BACKEND_TAG in event["tags"] for event in asyncio.run(starts())]
+    assert sorted(tagged) == [False, True]
@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+from func.local_index import LocalVectorStore, MetadataFilter
+
+
+@pytest.fixture
+def store(tmp_path):
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(2000, 16)).astype(np.float32)
+    metadata = [{"year": 1950 + i % 70, "fields": ["physics" if i % 2 else "biology"]} for i in range(2000)]
+    LocalVectorStore.build(str(tmp_path), vectors, [str(i) for i in range(2000)], metadata, M=8, ef_construction=50)
+    return LocalVectorStore(str(tmp_path), embedding=None, exact_below=0, exact_fraction=0), vectors
+
+
+def test_metadata_filter_masks():
+    metadata = [
+        {"year": 2000, "fields": ["physics", "biology"]},
+        {"year": 2010, "fields": ["biology"]},
+        {"year": 2020},
+    ]
+    masks = MetadataFilter(metadata)
+    assert masks.mask(None) is None
+    assert masks.mask({"year": 2010}).tolist() == [False, True, False]
+    assert masks.mask({"year": {"$gte": 2010, "$lt": 2020}}).tolist() == [False, True, False]
+    assert masks.mask({"year": {"$in": [2000, 2020]}}).tolist() == [True, False, True]
+    # List-valued fields match if any element matches, negations also match rows without the field
+    assert masks.mask({"fields": "physics"}).tolist() == [True, False, False]
+    assert masks.mask({"fields": {"$nin": ["physics"]}}).tolist() == [False, True, True]
+    assert masks.mask({"fields": {"$exists": False}}).tolist() == [False, False, True]
+    assert masks.mask({"$or": [{"year": 2000}, {"fields": {"$eq": "biology"}}]}).tolist() == [True, True, False]
+    assert masks.mask({"$and": [{"year": {"$gt": 2000}}, {"missing": {"$ne": 1}}]}).tolist() == [False, True, True]
+
+
+def test_hnsw_search_matches_exact_search(store):
+    store, vectors = store
+    for filter in [None, {"year": {"$lt": 2000}}]:
+        hnsw = [row for row, _ in store.search(vectors[0], k=10, filter=filter)]
+        exact = [row for row, _ in store.search(vectors[0], k=10, filter=filter, exact=True)]
+        assert len(set(hnsw) & set(exact)) >= 8
+
+
+def test_selective_filters_fall_back_to_exact_search(store):
+    store, vectors = store
+    exact = store.search(vectors[0], k=25, filter={"year": 1953}, exact=True)
+    assert len(exact) == 25
+
+    # hnswlib raises when it finds fewer than k matching rows within ef
+    class FailingIndex:
+        calls = 0
+
+        def knn_query(self, *args, **kwargs):
+            self.calls += 1
+            raise RuntimeError("Cannot return the results in a contiguous 2D array. Probably ef or M is too small")
+    store.hnsw = FailingIndex()
+    assert store.search(vectors[0], k=25, filter={"year": 1953}) == exact
+    assert store.hnsw.calls == 1
+
+    # A filter matching a small share of the index skips the graph
+    store.exact_fraction = 0.05
+    assert store.search(vectors[0], k=5, filter={"year": 1953}) == exact[:5]
+    assert store.hnsw.calls == 1
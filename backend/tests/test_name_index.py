@@ -0,0 +1,61 @@
+import numpy as np
+
+from func.local_index import LocalVectorStore
+from func.name_index import NameIndex, load_name_indexes, normalize_name
+
+
+RECORDS = [
+    {"institution_name": "Northwestern University", "country": "US"},
+    {"institution_name": "Université de Montréal", "country": "CA"},
+    {"institution_name": "The University of Chicago", "country": "US"},
+    {"institution_name": "Texas A&M University", "country": "US"},
+    {"institution_name": "University of Toronto", "country": "CA"},
+]
+
+
+def test_normalize_name():
+    assert normalize_name("The  Université de Montréal!") == "universite de montreal"
+    assert normalize_name("Texas A&M University") == "texas a and m university"
+
+
+def test_exact_matches_ignore_case_accents_and_punctuation():
+    index = NameIndex(RECORDS, "institution_name")
+    records, stage = index.lookup("universite de montreal")
+    assert stage == "exact" and records[0] == RECORDS[1]
+    records, stage = index.lookup("University of Chicago")
+    assert stage == "exact" and records[0] == RECORDS[2]
+    assert index.lookup("University of Toronto", filter={"country": "US"}) is None
+
+
+def test_fuzzy_matches_need_a_confident_score():
+    index = NameIndex(RECORDS, "institution_name")
+    records, stage = index.lookup("Northwestern Univeristy", k=2)
+    assert stage == "fuzzy" and records[0] == RECORDS[0] and len(records) == 2
+    assert index.lookup("Northwestern") is None
+    assert NameIndex(RECORDS, "institution_name", confident_score=0.5).lookup("Northwestern")[0][0] == RECORDS[0]
+
+
+def test_lookups_are_memoized():
+    index = NameIndex(RECORDS, "institution_name", memo_size=2)
+    first = index.lookup("Northwestern University")
+    assert index.lookup("northwestern  university") is first
+    index.lookup("University of Toronto")
+    index.lookup("Texas A&M University")
+    # The least recently used answer was dropped
+    assert len(index.memo) == 2 and index.lookup("Northwestern University") is not first
+    # Misses are not memoized, so a later snapshot or remote answer is not shadowed
+    assert index.lookup("Unknown Institute") is None and len(index.memo) == 2
+
+
+def test_vector_search_and_snapshots(tmp_path):
+    vectors = np.eye(len(RECORDS), 8)
+    LocalVectorStore.build(str(tmp_path / "institution_name"), vectors, [r["institution_name"] for r in RECORDS], RECORDS)
+    indexes = load_name_indexes(str(tmp_path), ["institution_name", "field_name"], embedding=object())
+    assert list(indexes) == ["institution_name"]
+    index = indexes["institution_name"]
+    assert index.has_vectors and index.records == RECORDS
+
+    query = vectors[4] + 0.1 * vectors[1]
+    assert index.vector_search(query, k=2) == [RECORDS[4], RECORDS[1]]
+    assert index.vector_search(query, k=2, filter={"country": "US"})[0] in [RECORDS[0], RECORDS[2], RECORDS[3]]
+    assert not NameIndex(RECORDS, "institution_name").has_vectors
@@ -0,0 +1,62 @@
+import os
+
+from func.jupyter import OutputCapture
+
+
+def text(value: str) -> dict:
+    return {'type': 'text', 'text': value}
+
+
+def image(name: str) -> dict:
+    return {'type': 'image_url', 'image_url': {'url': name}}
+
+
+def texts(outputs: list) -> str:
+    return "".join(o['text'] for o in outputs if o['type'] == 'text')
+
+
+def test_small_output_is_kept_as_is(tmp_path):
+    capture = OutputCapture(100, str(tmp_path))
+    for output in [text("a" * 30), image("plot"), text("b" * 20)]:
+        assert capture.add(output) == [output]
+    assert capture.outputs() == [text("a" * 30), image("plot"), text("b" * 20)]
+    assert os.listdir(tmp_path) == []
+
+
+def test_overflow_keeps_head_and_tail_and_spills_everything(tmp_path):
+    capture = OutputCapture(100, str(tmp_path))
+    chunks = [f"line {i:04d}\n" for i in range(200)]
+    streamed = [o for chunk in chunks for o in capture.add(text(chunk))]
+    outputs = capture.outputs()
+
+    # The live stream gets the head and a single overflow notice
+    assert texts(streamed).startswith("".join(chunks)[:50]) and texts(streamed).count("output exceeds 100 bytes") == 1
+    marker = next(i for i, o in enumerate(outputs) if "omitted" in o['text'])
+    assert texts(outputs[:marker]) == "".join(chunks)[:50] and texts(outputs[marker + 1:]) == "".join(chunks)[-50:]
+    with open(capture.spill_path) as f:
+        assert f.read() == "".join(chunks)
+
+
+def test_cap_is_counted_in_bytes(tmp_path):
+    capture = OutputCapture(20, str(tmp_path))
+    capture.add(text("é" * 30))
+    outputs = capture.outputs()
+    # Two-byte characters: each half keeps 5 of them and nothing is cut in half
+    assert outputs[0]['text'] == "é" * 5 and outputs[-1]['text'] == "é" * 5
+    assert capture.total_size == 60 and "40 bytes omitted" in outputs[1]['text']
+
+
+def test_images_after_the_overflow_stay_in_order(tmp_path):
+    capture = OutputCapture(20, str(tmp_path))
+    capture.add(text("x" * 30))
+    assert capture.add(image("early")) == [image("early")]
+    capture.add(text("y" * 30))
+    capture.add(image("late"))
+    capture.add(text("z" * 5))
+    outputs = capture.outputs()
+
+    # The early image was pushed out with the text around it, the late one is in place
+    assert outputs[0] == text("x" * 10)
+    assert outputs[2:] == [text("y" * 5), image("late"), text("z" * 5)]
+    with open(capture.spill_path) as f:
+        assert f.read() == "x" * 30 + "\n[image_url output]\n" + "y" * 30 + "\n[image_url output]\n" + "z" * 5
@@ -0,0 +1,75 @@
+import os, json, time
+
+import pandas as pd
+import pytest
+
+from func.reference_store import ReferenceStore
+
+
+@pytest.fixture
+def result(tmp_path):
+    path = str(tmp_path / "result.arrow")
+    pd.DataFrame({"field": ["physics", "biology"], "papers": [10, 20]}).to_feather(path, compression="uncompressed")
+    return path
+
+
+def promote(store, result, query="SELECT * FROM fields", db_name="SciSciNet_US_V5"):
+    for _ in range(store.promote_after):
+        name = store.record_query(query, db_name, result)
+    return name
+
+
+def test_popular_queries_are_promoted_per_database(tmp_path, result):
+    store = ReferenceStore(str(tmp_path / "store"), promote_after=3)
+    assert store.record_query("SELECT * FROM fields", "SciSciNet_US_V5", result) is None
+    assert store.lookup("SELECT * FROM fields", "SciSciNet_US_V5") is None
+
+    assert store.record_query("SELECT * FROM fields", "SciSciNet_US_V5", result) is None
+    name = store.record_query("SELECT * FROM fields", "SciSciNet_US_V5", result)
+    assert name is not None
+    # Whitespace and a trailing semicolon do not change the key, the database does
+    cached_name, path, df = store.lookup("SELECT *\n  FROM fields;", "SciSciNet_US_V5")
+    assert cached_name == name and os.path.exists(path) and df["papers"].tolist() == [10, 20]
+    assert store.lookup("SELECT * FROM fields", "SciSciNet_US_V4") is None
+
+
+def test_promoted_results_expire_and_can_be_invalidated(tmp_path, result):
+    store = ReferenceStore(str(tmp_path / "store"), promote_after=1, ttl=0.2)
+    promote(store, result)
+    promote(store, result, db_name="other")
+    assert store.lookup("SELECT * FROM fields", "SciSciNet_US_V5") is not None
+    time.sleep(0.3)
+    assert store.lookup("SELECT * FROM fields", "SciSciNet_US_V5") is None
+
+    # An expired result is replaced once the query is run again
+    promote(store, result)
+    assert store.lookup("SELECT * FROM fields", "SciSciNet_US_V5") is not None
+    store.ttl = 0
+    assert store.invalidate("SciSciNet_US_V5") == 1
+    assert store.lookup("SELECT * FROM fields", "SciSciNet_US_V5") is None
+    assert store.lookup("SELECT * FROM fields", "other") is not None
+
+
+def test_tampered_tables_are_not_served(tmp_path, result):
+    store = ReferenceStore(str(tmp_path / "store"), promote_after=1)
+    name = promote(store, result)
+    _, path, _ = store.lookup("SELECT * FROM fields", "SciSciNet_US_V5")
+
+    # A kernel replaces the published file
+    os.chmod(path, 0o644)
+    pd.DataFrame({"field": ["forged"], "papers": [0]}).to_feather(path, compression="uncompressed")
+    assert store.lookup("SELECT * FROM fields", "SciSciNet_US_V5") is None
+
+    # A kernel rewrites the index to point at its own file
+    name = promote(store, result, query="SELECT 1")
+    with open(store.index_path) as f:
+        index = json.load(f)
+    index[name]["file"] = os.path.relpath(path, store.path)
+    with open(store.index_path, "w") as f:
+        json.dump(index, f)
+    assert store.lookup("SELECT 1", "SciSciNet_US_V5") is None
+
+    # Entries signed by another store (e.g. another secret) are ignored
+    other = ReferenceStore(store.path, promote_after=1)
+    promote(other, result, query="SELECT 2")
+    assert store.lookup("SELECT 2", "SciSciNet_US_V5") is None and other.lookup("SELECT 2", "SciSciNet_US_V5") is not None
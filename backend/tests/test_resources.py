@@ -0,0 +1,28 @@
+import logging, resource, subprocess, sys
+
+import pytest
+
+from func.resources import ResourceLimits, usage
+
+
+@pytest.fixture
+def process():
+    process = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(30)"])
+    yield process
+    process.kill()
+    process.wait()
+
+
+def test_rlimit_fallback_reports_the_limits_it_cannot_enforce(tmp_path, process, caplog):
+    limits = ResourceLimits(cpus=1, memory_mb=512, pids=4096, cgroup_root=str(tmp_path / "missing" / "sciscigpt"))
+    with caplog.at_level(logging.WARNING, logger="func.resources"):
+        handle = limits.apply(process.pid)
+    assert handle["cgroup"] is None and handle["unenforced"] == ["cpus", "memory_mb"]
+    assert "cpus, memory_mb" in caplog.text
+    assert resource.prlimit(process.pid, resource.RLIMIT_NPROC) == (4096, 4096)
+    assert resource.prlimit(process.pid, resource.RLIMIT_AS)[0] == resource.RLIM_INFINITY
+    assert usage(handle)["unenforced"] == ["cpus", "memory_mb"]
+
+    limits = ResourceLimits(memory_mb=4096, rlimit_memory=True, cgroup_root=str(tmp_path / "missing" / "sciscigpt"))
+    assert limits.apply(process.pid)["unenforced"] == []
+    assert resource.prlimit(process.pid, resource.RLIMIT_AS) == (4096 * 2**20, 4096 * 2**20)
@@ -0,0 +1,62 @@
+from func.literature_format import ReviewStreamParser, format_reference
+
+
+RESPONSE = """Here is the review.
+<thinking>Teams are the focus.</thinking>
+<summary>
+Large teams develop science [1].
+Small teams disrupt it [2].
+</summary>
+<references>
+<reference><id>[1]</id><ref>Wu et al. (2019)</ref><url>https://doi.org/10.1038/s41586-019-0941-9</url></reference>
+<reference><id>[2]</id><ref>Wang et al. (2017)</ref></reference>
+<reference><ref>No id</ref></reference>
+</references>"""
+
+
+def parse(chunks: list) -> list:
+    parser, pieces = ReviewStreamParser(), []
+    for chunk in chunks:
+        pieces.extend(parser.feed(chunk))
+    return pieces
+
+
+def joined(pieces: list) -> dict:
+    sections = {}
+    for section, text in pieces:
+        sections[section] = sections.get(section, "") + text
+    return sections
+
+
+def test_format_reference():
+    assert format_reference("<id>[1]</id><ref>Wu (2019)</ref><url>https://doi.org/1</url>") == "1. [Wu (2019)](https://doi.org/1)"
+    assert format_reference("<id>2</id><ref>Wang (2017)</ref>") == "2. Wang (2017)"
+    assert format_reference("<ref>No id</ref>") is None
+
+
+def test_stream_parser_extracts_sections_and_references():
+    assert joined(parse([RESPONSE])) == {
+        "thinking": "Teams are the focus.",
+        "summary": "\nLarge teams develop science [1].\nSmall teams disrupt it [2].\n",
+        "references": "1. [Wu et al. (2019)](https://doi.org/10.1038/s41586-019-0941-9)\n2. Wang et al. (2017)\n",
+    }
+
+
+def test_stream_parser_gives_the_same_result_for_any_chunking():
+    expected = joined(parse([RESPONSE]))
+    for size in [1, 2, 3, 7, 13]:
+        pieces = parse([RESPONSE[i:i + size] for i in range(0, len(RESPONSE), size)])
+        assert joined(pieces) == expected
+        # Tags split across chunks never leak into the text
+        assert not any("<" in text for section, text in pieces if section != "references")
+        # References are sent as soon as they are complete, one piece each
+        assert [text for section, text in pieces if section == "references"] == expected["references"].splitlines(keepends=True)
+
+
+def test_summary_text_streams_before_its_closing_tag():
+    parser = ReviewStreamParser()
+    first = parser.feed("<summary>Large teams develop science")
+    # Only the last characters, which could start the closing tag, are held back
+    assert first == [("summary", "Large teams develo")]
+    rest = parser.feed("</summ") + parser.feed("ary> trailing")
+    assert "".join(text for _, text in first + rest) == "Large teams develop science"
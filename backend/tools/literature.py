@@ -5,8 +5,14 @@ from pydantic import BaseModel, Field
 from typing import Annotated
 from langgraph.prebuilt import InjectedState
 import pandas as pd
-import re, os
+import re, os, time, json, asyncio
+from concurrent.futures import ThreadPoolExecutor
+from func.lexical_index import BM25Index, reciprocal_rank_fusion
+from func.context_packing import pack_sections
+from func.literature_cache import LiteratureCache
+from func.clients import clients
 from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.callbacks.manager import adispatch_custom_event
 from langchain.hub import pull
 HyDE_pre_retrieval_xml = pull("erzhuoshao/sciscigpt_literature_specialist_hyde_pre")
 HyDE_post_retrieval_xml = pull("erzhuoshao/sciscigpt_literature_specialist_hyde_post")
@@ -15,27 +21,18 @@ sciscicorpus_index = os.getenv("SCISCICORPUS_INDEX")
 sciscicorpus_namespace = os.getenv("SCISCICORPUS_NAMESPACE")
 openai_api_key = os.getenv("OPENAI_API_KEY")
 
-import bibtexparser
-from bibtexparser.bwriter import BibTexWriter
-from bibtexparser.bibdatabase import BibDatabase
-
-def __dict_to_bibtex__(entry):
-	entry_2 = {}
-	for k, v in entry.items():
-		if type(v) == list:
-			v = ', '.join(v)
-		entry_2[k] = str(v)
-
-	db = BibDatabase()
-	db.entries = [entry_2]
-	writer = BibTexWriter()
-	writer.indent = '\t'
-	writer.order_entries_by = None
-	return writer.write(db)
+from func.literature_format import dict_to_bibtex as __dict_to_bibtex__
+from func.literature_format import group_sections, format_output_df_as_prompt as __format_output_df_as_prompt__
+from func.literature_format import ReviewStreamParser, format_reference as __format_reference__
 
 
 from langchain_core.output_parsers import JsonOutputParser, XMLOutputParser
 
+def __parse_hyde_sections__(hypo_y):
+    hypo_y = re.findall(r'<section>(.*?)</section>', hypo_y, re.DOTALL)
+    hypo_y = [i.strip() for i in hypo_y]
+    return hypo_y
+
 def pre_retrieval_processing(llm, query):
     parser = XMLOutputParser()
     PreRetrievalChain = HyDE_pre_retrieval_xml | llm
@@ -43,10 +40,16 @@ def pre_retrieval_processing(llm, query):
         "query": query, 
         "format_instructions": parser.get_format_instructions()
     }).text()
+    return __parse_hyde_sections__(hypo_y)
 
-    hypo_y = re.findall(r'<section>(.*?)</section>', hypo_y, re.DOTALL)
-    hypo_y = [i.strip() for i in hypo_y]
-    return hypo_y
+async def apre_retrieval_processing(llm, query):
+    parser = XMLOutputParser()
+    PreRetrievalChain = HyDE_pre_retrieval_xml | llm
+    hypo_y = (await PreRetrievalChain.ainvoke({
+        "query": query, 
+        "format_instructions": parser.get_format_instructions()
+    })).text()
+    return __parse_hyde_sections__(hypo_y)
 
 def post_retrieval_processing_xml(llm, query, search_results):
 	"""Process search results into XML format literature review"""
@@ -58,7 +61,22 @@ def post_retrieval_processing_xml(llm, query, search_results):
 		"query": query,
 		"format_instructions": parser.get_format_instructions()
 	}).text()
-	
+	return __format_literature_review__(response)
+
+async def apost_retrieval_processing_xml(llm, query, search_results):
+	"""Async version of `post_retrieval_processing_xml`"""
+
+	parser = XMLOutputParser()
+	PostRetrievalChain = HyDE_post_retrieval_xml | llm
+	response = (await PostRetrievalChain.ainvoke({
+		"search_results": search_results,
+		"query": query,
+		"format_instructions": parser.get_format_instructions()
+	})).text()
+	return __format_literature_review__(response)
+
+def __format_literature_review__(response):
+	"""Format the XML response of the post-retrieval step as markdown"""
 	references_match = re.search(r'<references>(.*?)</references>', response, re.DOTALL)
 	summary_match = re.search(r'<summary>(.*?)</summary>', response, re.DOTALL)
 	
@@ -75,43 +93,86 @@ def post_retrieval_processing_xml(llm, query, search_results):
 
 	formatted_refs = []
 	for ref_match in re.finditer(r'<reference>(.*?)</reference>', references, re.DOTALL):
-		ref = ref_match.group(1)
-		id_match = re.search(r'<id>(.*?)</id>', ref)
-		ref_text_match = re.search(r'<ref>(.*?)</ref>', ref) 
-		url_match = re.search(r'<url>(.*?)</url>', ref)
-		
-		if id_match and ref_text_match:
-			ref_id = id_match.group(1).strip().replace('[', '').replace(']', '')
-			ref_text = ref_text_match.group(1).strip()
-			ref_url = url_match.group(1).strip() if url_match else ""
-			
-			if ref_url:
-				formatted_refs.append(f"{ref_id}. [{ref_text}]({ref_url})")
-			else:
-				formatted_refs.append(f"{ref_id}. {ref_text}")
+		formatted_ref = __format_reference__(ref_match.group(1))
+		if formatted_ref:
+			formatted_refs.append(formatted_ref)
 
 	summary = [i.strip() for i in summary.split("\n") if i.strip()]
 	# response = "\n\n".join(summary) + "\n\nReferences:\n" + "\n".join(formatted_refs)
 	response = "\n\n".join([thinking, *summary, "**References**", *formatted_refs])
 	return response
 
+async def astream_post_retrieval_processing_xml(llm, query, search_results, on_piece: Callable):
+	"""
+	Streaming version of `post_retrieval_processing_xml`
 
+	Awaits `on_piece(section, text)` for every piece of the review as it is generated;
+	the returned review is the same as the non-streaming one.
+	"""
+	parser = XMLOutputParser()
+	PostRetrievalChain = HyDE_post_retrieval_xml | llm
+	stream_parser, response = ReviewStreamParser(), ""
+	async for chunk in PostRetrievalChain.astream({
+		"search_results": search_results,
+		"query": query,
+		"format_instructions": parser.get_format_instructions()
+	}):
+		text = chunk.text()
+		response += text
+		for section, piece in stream_parser.feed(text):
+			await on_piece(section, piece)
+	return __format_literature_review__(response)
+
+
+def __retrieve__(
+		PVS, search_keywords: list[str], k: int, filter_query: dict, timings: dict, 
+		lexical_index=None
+	) -> list[list]:
+	"""
+	Embed all search keywords in one batch, then run the vector queries concurrently
 
-def __format_output_df_as_prompt__(df):
-	prompt = []
-	for index, row in df.iterrows():
-		row = row.to_dict()
-		text = row.pop('text')
-		prompt.append({
-			"text": text, 
-			"bibtex": __dict_to_bibtex__(row)
-		})
-	return prompt
+	With a lexical index, BM25 searches for the same search keywords (the HyDE sections,
+	whose wording resembles the corpus, unlike the instruction-style user query) run
+	alongside and all rankings are fused with reciprocal-rank fusion into a single list.
+	"""
+	def lexical_search():
+		query_start = time.perf_counter()
+		rankings = [
+			[doc for doc, score in lexical_index.similarity_search_with_score(keywords, k=k, filter=filter_query)]
+			for keywords in search_keywords
+		]
+		return rankings, round(time.perf_counter() - query_start, 3)
+
+	def query(vector):
+		query_start = time.perf_counter()
+		with clients.limit("vector_store"):
+			output = PVS.similarity_search_by_vector_with_score(vector, k=k, filter=filter_query, namespace=sciscicorpus_namespace)
+		return [doc for doc, score in output], round(time.perf_counter() - query_start, 3)
+
+	hybrid = lexical_index is not None
+	with ThreadPoolExecutor(max_workers=len(search_keywords) + 1) as executor:
+		lexical = executor.submit(lexical_search) if hybrid else None
+
+		start = time.perf_counter()
+		vectors = PVS.embeddings.embed_documents(search_keywords)
+		timings["embedding"] = round(time.perf_counter() - start, 3)
+
+		start = time.perf_counter()
+		results = list(executor.map(query, vectors))
+		timings["vector_queries"] = [elapsed for docs, elapsed in results]
+		timings["vector_search"] = round(time.perf_counter() - start, 3)
+		rankings = [docs for docs, elapsed in results]
+
+		if hybrid:
+			lexical_rankings, timings["lexical_search"] = lexical.result()
+			return [reciprocal_rank_fusion(rankings + lexical_rankings, k=k * len(rankings))]
+	return rankings
 
 def __search_and_format__(
 		PVS, search_keywords, k, 
 		section_category=None, min_year=None, max_year=None, url=None, paper_title=None, authors=None, 
-		section_id: int=None, venue=None
+		section_id: int=None, venue=None, timings: dict=None, lexical_index=None, 
+		context_token_budget: int=None, packing: dict=None
 	):
 	filter_conditions = []
 	if authors:
@@ -135,22 +196,26 @@ def __search_and_format__(
 	
 	if type(search_keywords) == str:
 		search_keywords = [search_keywords]
+	if timings is None:
+		timings = {}
+	if packing is None:
+		packing = {}
+	if not search_keywords:
+		return "No search results found."
 
 	df = []
-	for search_keyword in search_keywords:
-		output = PVS.similarity_search(search_keyword, filter=filter_query, k=k, namespace=sciscicorpus_namespace)
+	for output in __retrieve__(PVS, search_keywords, k, filter_query, timings, lexical_index):
 		df_temp = pd.DataFrame([i.metadata | {'text': i.page_content} for i in output])
+		# Reciprocal-rank relevance, summed over the queries that retrieved a section
+		df_temp['relevance'] = [1 / (60 + rank) for rank in range(1, len(df_temp) + 1)]
 		# df_temp.authors = df_temp.authors.apply(lambda x: ', '.join(x[:-1]) + ', and ' + x[-1] if len(x) > 1 else x[0])
 		df.append(df_temp)
 	df = pd.concat(df, ignore_index=True)
 	
 	if df.shape[0] > 0:
-		df = df.sort_values(['url', 'section_id'])
-		df = df.groupby("url").agg({
-			"text": lambda x: "\n".join(x),
-			"section_id": lambda x: ", ".join([str(int(i)) for i in x])
-		} | {k: "first" for k in df.columns if k not in ["text", "section_id"]}).\
-			reset_index(drop=True)
+		df, stats = pack_sections(df, token_budget=context_token_budget)
+		packing.update(stats)
+		df = group_sections(df)
 		formatted_prompt = __format_output_df_as_prompt__(df)
 	else:
 		formatted_prompt = "No search results found."
@@ -197,6 +262,22 @@ def __create_search_constraints__(llm, query):
 	})
 	return search_constraints
 
+async def __acreate_search_constraints__(llm, query):
+	parser = JsonOutputParser(pydantic_object=SearchConstraints)
+	SearchConstraintsChain = ConstraintTemplate | llm | parser
+	search_constraints = await SearchConstraintsChain.ainvoke({
+		"query": query,
+		"format_instructions": parser.get_format_instructions()
+	})
+	return search_constraints
+
+async def __timed__(timings, stage, coroutine):
+	start = time.perf_counter()
+	try:
+		return await coroutine
+	finally:
+		timings[stage] = round(time.perf_counter() - start, 3)
+
 
 query_description = """The assigned requirements to the tool. Needs to include if needed: 
 	1. A detailed requirements of the search query, including the research fields, topics, and questions.
@@ -211,6 +292,18 @@ class SearchLiteratureAdvancedInput(BaseModel):
 		description="The number of search results before summarization. Larger k means more search results.")
 	state: Annotated[dict, InjectedState] = Field(None, description="Agent state")
 
+def _stream_summary(tool_name: str, stages: dict, start: float):
+	"""Forward pieces of the literature review to the client as `literature_summary` custom events"""
+	async def on_piece(section: str, text: str):
+		stages.setdefault("first_token", round(time.perf_counter() - start, 3))
+		try:
+			await adispatch_custom_event("literature_summary", json.dumps({
+				"tool": tool_name, "section": section, "text": text
+			}))
+		except RuntimeError:
+			pass  # Not running inside a traced graph (e.g. direct tool invocation)
+	return on_piece
+
 class SearchLiteratureAdvancedTool(BaseTool):
 	name: str = "search_literature"
 	description: str = """
@@ -223,34 +316,81 @@ class SearchLiteratureAdvancedTool(BaseTool):
 	Note: This tool specializes in Science of Science literature only.
 	"""
 	args_schema: Type[BaseModel] = SearchLiteratureAdvancedInput
+	response_format: str = "content_and_artifact"
 	vs: VectorStore
 	load_llm: Callable
+	lexical_index: Optional[BM25Index] = None
+	context_token_budget: Optional[int] = None
+	cache: Optional[LiteratureCache] = None
+	stream_summary: bool = True
 
 	def _run(
 		self, query: str, k: int, state: Annotated[dict, InjectedState], **kwargs
+	):
+		return asyncio.run(self._arun(query, k, state))
+
+	async def _arun(
+		self, query: str, k: int, state: Annotated[dict, InjectedState], **kwargs
 		# section: str = None, title: str = None, authors: list = None, 
 		# section_id: int = None, venue: str = None
 	):
-		llm = self.load_llm(state["metadata"], disable_streaming=True)
-
-		response = {}
+		"""
+		Literature search as a small DAG: HyDE generation and constraint extraction are
+		independent and run concurrently, retrieval needs both, summarization needs retrieval
+		"""
+		llm = self.load_llm(state["metadata"], priority="literature", disable_streaming=True)
+
+		response, stages, timings, packing, cache_status = {}, {}, {}, {}, {}
+		settings = self.retrieval_settings(k)
+		start = time.perf_counter()
+		# hypo_ys = [ query ]
+		hyde = asyncio.create_task(__timed__(stages, "hyde", apre_retrieval_processing(llm, query)))
 		try:
-			# hypo_ys = [ query ]
-			hypo_ys = pre_retrieval_processing(llm, query)
-
-			search_constraints = __create_search_constraints__(llm, query)
-
-			raw_results = __search_and_format__(
-				self.vs, 
-				hypo_ys, 
-				k, **search_constraints
-			)
+			search_constraints = await __timed__(stages, "constraints", __acreate_search_constraints__(llm, query))
+
+			# The summary depends on the filters extracted from the query, so it is looked up once they
+			# are known; HyDE runs meanwhile and is cancelled on a hit
+			summary_key = self.cache.summary_key(
+				query, search_constraints, settings, state["metadata"].get("model_name")) if self.cache else None
+			cached_summary = self.cache.get("summary", summary_key) if self.cache else None
+			cache_status["summary"] = "hit" if cached_summary is not None else "miss"
+			if cached_summary is not None:
+				response['response'] = cached_summary
+				return
+
+			hypo_ys = await hyde
+
+			retrieval_key = self.cache.retrieval_key(hypo_ys, search_constraints, settings) if self.cache else None
+			cached_retrieval = self.cache.get("retrieval", retrieval_key) if self.cache else None
+			cache_status["retrieval"] = "hit" if cached_retrieval is not None else "miss"
+			if cached_retrieval is not None:
+				raw_results, cached_packing = cached_retrieval
+				packing.update(cached_packing)
+			else:
+				raw_results = await __timed__(stages, "retrieval", asyncio.to_thread(
+					__search_and_format__,
+					self.vs, 
+					hypo_ys, 
+					k, **search_constraints, timings=timings, 
+					lexical_index=self.lexical_index, 
+					context_token_budget=self.context_token_budget, packing=packing
+				))
+				if self.cache:
+					self.cache.put("retrieval", retrieval_key, (raw_results, dict(packing)))
 
 			if raw_results == "No search results found.":
 				response['response'] = raw_results
 			else:
-				response['response'] = post_retrieval_processing_xml(
-					llm, query, raw_results)
+				if self.stream_summary:
+					summary_llm = self.load_llm(state["metadata"], priority="literature", disable_streaming=False).\
+						with_config(tags=["literature_summary"])
+					response['response'] = await __timed__(stages, "summary", astream_post_retrieval_processing_xml(
+						summary_llm, query, raw_results, _stream_summary(self.name, stages, start)))
+				else:
+					response['response'] = await __timed__(stages, "summary", apost_retrieval_processing_xml(
+						llm, query, raw_results))
+				if self.cache:
+					self.cache.put("summary", summary_key, response['response'])
 				# response['response'] = raw_results
 				# response['bibtex'] = [i['bibtex'] for i in raw_results]
 
@@ -258,17 +398,56 @@ class SearchLiteratureAdvancedTool(BaseTool):
 			error_msg = "{}: {}".format(type(e).__name__, str(e))
 			response['response'] = error_msg
 		finally:
-			return response
+			hyde.cancel()
+			stages["total"] = round(time.perf_counter() - start, 3)
+			return response, response | {"latency": stages | {"retrieval_detail": timings}, "context": packing, "cache": cache_status}
+
+	def retrieval_settings(self, k: int) -> dict:
+		"""Settings besides the query that change the retrieved sections (part of the cache keys)"""
+		return {
+			"k": k,
+			"hyde": True,
+			"hybrid": self.lexical_index is not None,
+			"context_token_budget": self.context_token_budget,
+		}
 
 
-from langchain_openai import OpenAIEmbeddings
 from langchain_pinecone import PineconeVectorStore
+from func.embedding_cache import cached_embeddings
 from llms import load_llm
 
-vs = PineconeVectorStore.from_existing_index(
-	embedding = OpenAIEmbeddings(model="text-embedding-3-large", api_key=openai_api_key),
-	index_name = sciscicorpus_index,
-	namespace = sciscicorpus_namespace,
-)
-
-search_literature_advanced_tool = SearchLiteratureAdvancedTool(vs=vs, load_llm=load_llm)
\ No newline at end of file
+literature_embeddings = cached_embeddings(
+	clients.openai_embeddings("text-embedding-3-large", api_key=openai_api_key), "text-embedding-3-large")
+
+# SCISCICORPUS_BACKEND=local serves searches from a local replica (see `python -m func.local_index export`)
+from func.local_index import LocalVectorStore
+if os.getenv("SCISCICORPUS_BACKEND", "pinecone") == "local":
+	vs = LocalVectorStore(os.getenv("SCISCICORPUS_LOCAL_PATH"), embedding=literature_embeddings)
+else:
+	vs = PineconeVectorStore(
+		index = clients.pinecone_index(sciscicorpus_index),
+		embedding = literature_embeddings,
+		namespace = sciscicorpus_namespace,
+	)
+
+# Optional BM25 index over the corpus sections (see `python -m func.lexical_index`), sharing the
+# section records of the local replica it was built from
+lexical_path = os.getenv("SCISCICORPUS_LEXICAL_PATH")
+lexical_index = BM25Index(lexical_path, store=vs if isinstance(vs, LocalVectorStore) else None) if lexical_path else None
+
+context_token_budget = os.getenv("LITERATURE_CONTEXT_TOKENS")
+
+# LITERATURE_CACHE_TTL=0 disables the cache; SCISCICORPUS_VERSION is part of every cache key
+literature_cache_ttl = float(os.getenv("LITERATURE_CACHE_TTL", 24 * 3600))
+literature_cache = LiteratureCache(
+	maxsize=int(os.getenv("LITERATURE_CACHE_SIZE", 1024)),
+	retrieval_ttl=literature_cache_ttl, summary_ttl=literature_cache_ttl,
+	corpus_version=os.getenv("SCISCICORPUS_VERSION", ""),
+) if literature_cache_ttl > 0 else None
+
+search_literature_advanced_tool = SearchLiteratureAdvancedTool(
+	vs=vs, load_llm=load_llm, lexical_index=lexical_index, 
+	context_token_budget=int(context_token_budget) if context_token_budget else None,
+	cache=literature_cache,
+	stream_summary=os.getenv("LITERATURE_STREAM_SUMMARY", "true").lower() == "true"
+)
\ No newline at end of file
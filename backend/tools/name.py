@@ -1,15 +1,17 @@
-from typing import Type
+from typing import Type, Union
 from langchain.tools import BaseTool
 
 from pydantic import BaseModel, Field
 import pandas as pd
 import json
+from concurrent.futures import ThreadPoolExecutor
+from func.clients import clients
 
 import os
 
 class SearchNameInput(BaseModel):
 	column: str = Field(..., description="Specifies the database column to search within. Current valid options only include `field_name` and `institution_name`.")
-	value: str = Field(..., description="Defines the name to search for within the specified column.")
+	value: Union[str, list[str]] = Field(..., description="Defines the name to search for within the specified column, or a list of names to resolve in one call.")
 
 class SearchNameTool(BaseTool):
 	name: str = "search_name"
@@ -17,23 +19,63 @@ class SearchNameTool(BaseTool):
 	Function: Searches for and retrieves the closest matches for institution or field names in the database, for name disambiguation and finding standardized names.
 	Input: 
 	1. column: Specifies which column to search in. Must be either 'field_name' or 'institution_name'.
-	2. value: The search term to look for within the specified column.
-	Output: A markdown-formatted table of the best-matching rows, including relevant metadata.
+	2. value: The search term to look for within the specified column. Pass a list of names to resolve many names at once.
+	Output: A markdown-formatted table of the best-matching rows, including relevant metadata (one table per name for a list).
 	"""
 	args_schema: Type[BaseModel] = SearchNameInput
 
 	vectorstore_dict: dict
 	type_dict: dict
+	name_indexes: dict = {}
+	k: int = 10
 	
 
-	def _run(self, column: str, value: str, search_filter: str="{}"):
+	def _resolve(self, column: str, values: list[str], search_filter: dict) -> list[tuple[list[dict], str]]:
+		"""
+		Best-matching rows of every name: exact/fuzzy matches from the local index first,
+		then one batched embedding call and concurrent vector lookups for the rest
+		"""
+		index = self.name_indexes.get(column)
+		results = [index.lookup(value, k=self.k, filter=search_filter or None) if index else None for value in values]
+
+		pending = [i for i, result in enumerate(results) if result is None]
+		if pending:
+			store = self.vectorstore_dict[column]
+			vectors = store.embeddings.embed_documents([values[i] for i in pending])
+			if index is not None and index.has_vectors:
+				for i, vector in zip(pending, vectors):
+					results[i] = index.vector_search(vector, k=self.k, filter=search_filter or None), "vector"
+			else:
+				# Not in the local snapshot: ask the remote store
+				def remote(vector):
+					with clients.limit("vector_store"):
+						output = store.similarity_search_by_vector(vector, k=self.k, filter=search_filter)
+					return [result.metadata for result in output], "remote"
+				with ThreadPoolExecutor(max_workers=min(len(pending), 8)) as executor:
+					for i, result in zip(pending, executor.map(remote, vectors)):
+						results[i] = result
+		return results
+
+	def _table(self, column: str, value: str, output: list[dict]) -> str:
+		if not output:
+			return f"No match for '{value}' in `{column}`."
+		return pd.DataFrame(output).astype(self.type_dict[column]).to_markdown(floatfmt="")
+
+	def _run(self, column: str, value: Union[str, list[str]], search_filter: str="{}"):
 		response = {}
 		try:
 			search_filter = json.loads(search_filter)
-			output = self.vectorstore_dict[column].similarity_search(value, filter=search_filter, k=10)
-			output = [result.metadata for result in output]
-			output = pd.DataFrame(output)
-			response['response'] = output.astype(self.type_dict[column]).to_markdown(floatfmt="")
+			values = [value] if isinstance(value, str) else list(value)
+			results = self._resolve(column, values, search_filter)
+
+			tables = [self._table(column, name, output) for name, (output, _) in zip(values, results)]
+			matches = [match if output else "none" for output, match in results]
+			if isinstance(value, str):
+				response['response'] = tables[0]
+				response['match'] = matches[0]
+			else:
+				response['response'] = "\n\n".join(f"**{name}**\n\n{table}" for name, table in zip(values, tables))
+				response['match'] = matches
 		except Exception as e:
 			response['response'] = "{}: {}".format(type(e).__name__, str(e))
 		finally:
@@ -60,13 +102,20 @@ type_dict = {
 
 # Initialize tools
 from langchain_pinecone import PineconeVectorStore
-from langchain_openai import OpenAIEmbeddings
+from func.embedding_cache import cached_embeddings
+embeddings = cached_embeddings(clients.openai_embeddings("text-embedding-3-small"), "text-embedding-3-small")
+# Both namespaces share one pooled index client
 vectorstore_dict = {
-	namespace: PineconeVectorStore.from_existing_index(
-		embedding = OpenAIEmbeddings(model="text-embedding-3-small"),
+	namespace: PineconeVectorStore(
+		index = clients.pinecone_index(os.getenv("NAME_SEARCH_INDEX")),
+		embedding = embeddings,
 		namespace = namespace,
-		index_name = os.getenv("NAME_SEARCH_INDEX")
 	) for namespace in ["field_name", "institution_name"]
 }
 
-search_name_tool = SearchNameTool(vectorstore_dict=vectorstore_dict, type_dict=type_dict)
+# Local name indexes loaded from a snapshot (one `func.local_index` replica per namespace)
+from func.name_index import load_name_indexes
+name_search_snapshot = os.getenv("NAME_SEARCH_SNAPSHOT")
+name_indexes = load_name_indexes(name_search_snapshot, list(type_dict), embedding=embeddings) if name_search_snapshot else {}
+
+search_name_tool = SearchNameTool(vectorstore_dict=vectorstore_dict, type_dict=type_dict, name_indexes=name_indexes)
@@ -6,11 +6,21 @@ from typing import Type
 from typing_extensions import Annotated
 
 from func.jupyter import JupyterSandbox
+from func.kernels import LocalKernelProvider, RemoteKernelProvider
+from func.resources import ResourceLimits
 from func.image import upload_image
 
 from langgraph.prebuilt import InjectedState
+from langchain_core.callbacks.manager import dispatch_custom_event
 
 working_dir = os.getenv("LOCAL_STORAGE_PATH")
+snapshot_dir = os.getenv("SANDBOX_SNAPSHOT_PATH", f"{working_dir}-snapshots")  # outside the workspace of the kernels
+prewarm_kernels = int(os.getenv("SANDBOX_PREWARM_KERNELS", "0"))
+max_idle_time = os.getenv("SANDBOX_MAX_IDLE_TIME")
+max_output_bytes = int(os.getenv("SANDBOX_MAX_OUTPUT_BYTES", "50000"))
+reference_dir = os.getenv("SANDBOX_REFERENCE_PATH", f"{working_dir}-reference")  # outside the workspace of the kernels
+snapshot_secret = os.getenv("SANDBOX_SNAPSHOT_SECRET")  # hex; snapshots survive restarts only with a fixed secret
+kernel_workers = os.getenv("SANDBOX_KERNEL_WORKERS")  # e.g. "worker-1:9500,worker-2:9500"
 
 def _parse_jupyter_results(results: list[dict]) -> dict:
 	text_responses = [r for r in results if r['type'] == 'text']
@@ -34,6 +44,20 @@ def _parse_jupyter_results(results: list[dict]) -> dict:
 	return response
 
 
+def _stream_outputs(tool_name: str):
+	"""Forward text outputs to the client as `sandbox_output` custom events while the cell runs"""
+	def on_output(output: dict):
+		if output['type'] != 'text':
+			return
+		try:
+			dispatch_custom_event("sandbox_output", json.dumps({
+				"tool": tool_name, "session_id": output["session_id"], "cell_id": str(output["cell_id"]), "text": output["text"]
+			}))
+		except RuntimeError:
+			pass  # Not running inside a traced graph (e.g. direct tool invocation)
+	return on_output
+
+
 
 class RJupyterInput(BaseModel):
 	query: str = Field(..., description="R code snippet to run")
@@ -52,10 +76,14 @@ class RJupyterTool(BaseTool):
 			session_id = state["metadata"]["session_id"] if state else "test"
 		
 			cell_id = uuid.uuid4()
-			results = self.sandbox.execute_code(f"%%R\n\n{query}", session_id=session_id, cell_id=cell_id, timeout=self.timeout)
+			results = self.sandbox.execute_code(
+				f"%%R\n\n{query}", session_id=session_id, cell_id=cell_id, timeout=self.timeout, on_output=_stream_outputs(self.name))
 			results = [r for r in results if r["session_id"] == session_id and r["cell_id"] == cell_id]
 
 			response = _parse_jupyter_results(results)
+			usage = self.sandbox.cell_usage(session_id)
+			if usage:
+				response["usage"] = usage
 		except Exception as e:
 			response = {"response": "{}: {}".format(type(e).__name__, str(e))}
 		return response
@@ -68,7 +96,7 @@ class PythonJupyterInput(BaseModel):
 
 class PythonJupyterTool(BaseTool):
 	name: str = "python"
-	description: str = """Execute Python code in a persistent Jupyter environment. Input: Any valid Python code snippet to run. Output: Standard output, error messages, and output images. Always prioritize to use matplotlib or seaborn to plot the figure. Note: Don't save output images to disk. Output images will be rendered automatically."""
+	description: str = """Execute Python code in a persistent Jupyter environment. Input: Any valid Python code snippet to run. Output: Standard output, error messages, and output images. Always prioritize to use matplotlib or seaborn to plot the figure. Note: Don't save output images to disk. Output images will be rendered automatically. Use `load_arrow(path)` to load the `arrow_file` of a SQL query result (memory-mapped, no parsing). Shared read-only reference tables: `list_references()`, `load_reference(name)`. Move tables to/from R and Julia with `%to_r df`, `%from_r name`, `%to_julia df`, `%from_julia name` (Arrow-based, much faster than rpy2/juliacall conversion)."""
 	
 	args_schema: Type[BaseModel] = PythonJupyterInput
 
@@ -81,9 +109,13 @@ class PythonJupyterTool(BaseTool):
 			session_id = state["metadata"]["session_id"] if state else "test"
 			
 			cell_id = uuid.uuid4()
-			results = self.sandbox.execute_code(query, session_id=session_id, cell_id=cell_id, timeout=self.timeout)
+			results = self.sandbox.execute_code(
+				query, session_id=session_id, cell_id=cell_id, timeout=self.timeout, on_output=_stream_outputs(self.name))
 			results = [r for r in results if r["session_id"] == session_id and r["cell_id"] == cell_id]
 			response = _parse_jupyter_results(results)
+			usage = self.sandbox.cell_usage(session_id)
+			if usage:
+				response["usage"] = usage
 		except Exception as e:
 			response = {"response": "{}: {}".format(type(e).__name__, str(e))}
 		return response
@@ -108,10 +140,13 @@ class JuliaJupyterTool(BaseTool):
 		
 			cell_id = uuid.uuid4()
 			results = self.sandbox.execute_code(
-				f"%%julia\n\n{query}", session_id=session_id, cell_id=cell_id, timeout=self.timeout)
+				f"%%julia\n\n{query}", session_id=session_id, cell_id=cell_id, timeout=self.timeout, on_output=_stream_outputs(self.name))
 			print(results)
 			results = [r for r in results if r["session_id"] == session_id and r["cell_id"] == cell_id]
 			response = _parse_jupyter_results(results)
+			usage = self.sandbox.cell_usage(session_id)
+			if usage:
+				response["usage"] = usage
 			print(response)
 		except Exception as e:
 			response = {"response": "{}: {}".format(type(e).__name__, str(e))}
@@ -120,7 +155,20 @@ class JuliaJupyterTool(BaseTool):
 
 # from func.env import python_env_setup, python_env_setup_string
 # python_env_setup() # Setup the python environment in system level
-jupyter_sandbox = JupyterSandbox(working_dir=working_dir)
+if kernel_workers:
+	kernel_provider = RemoteKernelProvider(
+		workers=[(w.split(":")[0], int(w.split(":")[1])) for w in kernel_workers.split(",")],
+		authkey=bytes.fromhex(os.getenv("SANDBOX_WORKER_AUTHKEY")),
+	)
+else:
+	kernel_provider = LocalKernelProvider(limits=ResourceLimits.from_env())
+
+jupyter_sandbox = JupyterSandbox(
+	working_dir=working_dir, snapshot_dir=snapshot_dir, prewarm=prewarm_kernels, max_output_bytes=max_output_bytes,
+	provider=kernel_provider, reference_dir=reference_dir,
+	snapshot_secret=bytes.fromhex(snapshot_secret) if snapshot_secret else None)
+if max_idle_time:
+	jupyter_sandbox.start_reaper(max_idle_time=int(max_idle_time))
 python_jupyter_tool = PythonJupyterTool(sandbox=jupyter_sandbox)
 r_jupyter_tool = RJupyterTool(sandbox=jupyter_sandbox)
 julia_jupyter_tool = JuliaJupyterTool(sandbox=jupyter_sandbox)
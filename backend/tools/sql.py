@@ -17,9 +17,13 @@ from typing_extensions import Annotated
 
 from func_timeout import func_timeout
 from func.gcp import upload_file_to_gcp
+from func.reference_store import ReferenceStore
 
 bigquery_uri = os.getenv("GOOGLE_BIGQUERY_URI")
 workspace = os.getenv("LOCAL_STORAGE_PATH")
+reference_path = os.getenv("SANDBOX_REFERENCE_PATH", f"{workspace}-reference")  # outside the workspace of the kernels
+reference_secret = os.getenv("SANDBOX_REFERENCE_SECRET")  # hex, shared by all server processes
+reference_tables = os.getenv("SANDBOX_REFERENCE_TABLES")  # e.g. "fields,institutions"
 
 class BaseSQLDatabaseTool(BaseModel):
 	db_dict: Dict[str, SQLDatabase] = Field(exclude=True)
@@ -194,6 +198,7 @@ class SQLQueryTool(BaseSQLDatabaseTool, BaseTool):
 	timeout: int = 240
 
 	workspace: str = workspace
+	reference_store: Optional[ReferenceStore] = None
 	display_mode: str = "markdown"
 	display_rows_preview: int = 10
 	display_rows_complete: int = 200
@@ -206,8 +211,14 @@ class SQLQueryTool(BaseSQLDatabaseTool, BaseTool):
 			response = {}
 			os.makedirs(self.workspace, exist_ok=True)
 
-			db = self.db_dict[self.db_name]
-			df = read_sql(query, db, self.chunksize, self.timeout)
+			# Popular results are served from the shared reference store instead of BigQuery (until they expire)
+			cached = self.reference_store.lookup(query, self.db_name) if self.reference_store else None
+			if cached:
+				reference_name, arrow_path, df = cached
+			else:
+				reference_name = None
+				db = self.db_dict[self.db_name]
+				df = read_sql(query, db, self.chunksize, self.timeout)
 			
 			df_string = display_dataframe(
 				df, mode=self.display_mode,
@@ -224,6 +235,13 @@ class SQLQueryTool(BaseSQLDatabaseTool, BaseTool):
 
 			df.to_parquet(file_path, index=False)
 
+			# Uncompressed Arrow IPC copy that kernels can memory-map without parsing
+			if not cached:
+				arrow_path = f"{self.workspace}/{os.path.splitext(file_name)[0]}.arrow"
+				df.reset_index(drop=True).to_feather(arrow_path, compression="uncompressed")
+				if self.reference_store:
+					reference_name = self.reference_store.record_query(query, self.db_name, arrow_path)
+
 			response["files"] = [{
 				"name": file_name,
 				"id": file_id,
@@ -232,8 +250,14 @@ class SQLQueryTool(BaseSQLDatabaseTool, BaseTool):
 				"mime_type": "application/parquet",
 			}]
 
+			response["arrow_file"] = arrow_path
+			if reference_name:
+				response["reference_table"] = reference_name
+
 			# response["file"] = file_path
-			response['note'] = "`response`: header of the SQL query result (may not be complete). `files`: the file of complete SQL query results. Load this file to get the complete result."
+			response['note'] = "`response`: header of the SQL query result (may not be complete). `files`: the file of complete SQL query results. Load this file to get the complete result. " \
+				"`arrow_file`: the same result as an uncompressed Arrow file that loads without parsing via `load_arrow(path)` in Python, `arrow::read_feather(path, mmap = TRUE)` in R, or `Arrow.Table(path)` in Julia. " \
+				"`reference_table` (if present): the result is a shared read-only table, load it in Python with `load_reference(name)`."
 
 		except Exception as e:
 			e_str = re.sub(r'\[SQL:\s*.*?\]', '', str(e), flags=re.DOTALL)
@@ -253,8 +277,31 @@ db_dict = {
 	)
 }
 
+reference_store = ReferenceStore(
+	reference_path, ttl=float(os.getenv("SANDBOX_REFERENCE_TTL", 3600)),
+	secret=bytes.fromhex(reference_secret) if reference_secret else None,
+)
+
+def publish_reference_tables(tables: list[str], db: SQLDatabase):
+	"""Publish whole reference tables of the schema (e.g. fields, institutions) to the shared store"""
+	for table in tables:
+		if reference_store.entry(table):
+			continue
+		try:
+			reference_store.publish(table, read_sql(f"SELECT * FROM {table}", db, timeout=3600), source="table")
+		except Exception as e:
+			print(f"Failed to publish reference table {table}: {type(e).__name__}: {e}")
+
+if reference_tables:
+	import threading
+	threading.Thread(
+		target=publish_reference_tables, 
+		args=([t.strip() for t in reference_tables.split(",")], db_dict[db_name]), 
+		daemon=True
+	).start()
+
 sql_list_table_tool = SQLListTableTool(db_dict=db_dict)
 sql_get_schema_tool = SQLGetSchemaTool(db_dict=db_dict)
-sql_query_tool = SQLQueryTool(db_dict=db_dict)
+sql_query_tool = SQLQueryTool(db_dict=db_dict, reference_store=reference_store)
 
 
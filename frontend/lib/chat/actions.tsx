@@ -14,7 +14,7 @@ import {
 	render_tool_response_event, 
 	render_user_message, 
 	render_bot_stream, render_separator, 
-	render_event
+	render_output_stream, render_event
 } from '@/lib/chat/render'
 
 import { Separator } from '@/components/ui/separator'
@@ -66,6 +66,9 @@ export async function submitUserMessage(
 	const clientInfo = await getClientInfo()
 
 	let textStream: undefined | ReturnType<typeof createStreamableValue<string>>
+	let outputStream: undefined | ReturnType<typeof createStreamableValue<string>>
+	let summaryStream: undefined | ReturnType<typeof createStreamableValue<string>>
+	let summarySection: undefined | string
 	let temp_node: undefined | React.ReactNode
 
 	const streamableUI = createStreamableUI();
@@ -87,6 +90,48 @@ export async function submitUserMessage(
 			for await (const event of eventStream) {
 				// console.log(event)
 				const metadata = event.metadata;
+
+				// Runs of models wrapped by the backend's scheduler / replay / hedging layers repeat the wrapper's events
+				if (event.tags?.includes("llm_backend")) {
+					continue;
+				}
+
+				// Incremental sandbox output while a cell is still running (not persisted)
+				if (event.event === "on_custom_event" && event.name === "sandbox_output") {
+					const chunk = JSON.parse(event.data)
+					if (outputStream === undefined) {
+						outputStream = createStreamableValue<string>("");
+						streamableUI.append(render_output_stream(outputStream.value, chunk.tool));
+						outputStream.update("```output\n");
+					}
+					outputStream.update(chunk.text);
+					continue;
+				}
+
+				// Literature review while it is being generated (not persisted)
+				if (event.event === "on_custom_event" && event.name === "literature_summary") {
+					const chunk = JSON.parse(event.data)
+					if (summaryStream === undefined) {
+						summaryStream = createStreamableValue<string>("");
+						summarySection = undefined;
+						streamableUI.append(render_output_stream(summaryStream.value, chunk.tool));
+					}
+					if (chunk.section !== summarySection) {
+						if (chunk.section === "references") {
+							summaryStream.update("\n\n**References**\n\n");
+						} else if (summarySection !== undefined) {
+							summaryStream.update("\n\n");
+						}
+						summarySection = chunk.section;
+					}
+					summaryStream.update(chunk.section === "references" ? chunk.text + "\n" : chunk.text);
+					continue;
+				}
+
+				// Raw tokens of the literature summary are shown through the events above
+				if (event.event === "on_chat_model_stream" && event.tags?.includes("literature_summary")) {
+					continue;
+				}
 				
 				if (event.event === "on_chat_model_stream" || event.event === "on_llm_stream") {
 					const delta = event.data.chunk?.content?.[0]?.text ?? event.data.chunk?.content ?? '';
@@ -112,6 +157,15 @@ export async function submitUserMessage(
 				}
 
 				if (event.event === "on_tool_end") {
+					if (outputStream !== undefined) {
+						outputStream.update("\n```");
+						outputStream.done();
+						outputStream = undefined;
+					}
+					if (summaryStream !== undefined) {
+						summaryStream.done();
+						summaryStream = undefined;
+					}
 					temp_node = render_tool_response_event(event)
 					streamableUI.append(render_separator(event.event));
 					streamableUI.append(temp_node);
@@ -132,6 +186,8 @@ export async function submitUserMessage(
 		
 		try { aiState.done(aiState.get()) } catch (e: any) { console.error(e) }
 		try { if (textStream !== undefined) { textStream.done() } } catch (e: any) { console.error(e) }
+		try { if (outputStream !== undefined) { outputStream.done() } } catch (e: any) { console.error(e) }
+		try { if (summaryStream !== undefined) { summaryStream.done() } } catch (e: any) { console.error(e) }
 		try {
 			streamableUI.done(<DoneMarker />)
 		} catch (e: any) { console.error(e) }